@@ -1,6 +1,7 @@
 """
 BusCar Backend Configuration
 """
+from typing import Dict, Tuple
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -19,6 +20,72 @@ class Settings(BaseSettings):
     # Scraping
     scrape_interval_hours: int = 6
     max_cars_per_scrape: int = 100
+    scrape_max_concurrency: int = 3  # Sources scraped at the same time
+    scrape_source_concurrency: int = 1  # Simultaneous runs of the same source
+    scrape_page_concurrency: int = 3  # Result pages of one source fetched at the same time
+    scrape_time_budget_seconds: int = 300  # A source stops paginating after this long
+    scrape_rate_per_host: float = 2.0  # Starting requests/second per portal, adapted at runtime
+    scrape_rate_min: float = 0.2
+    scrape_rate_max: float = 10.0
+    scrape_rate_increase: float = 0.5  # Added to the rate after each successful request
+    scrape_error_rate_threshold: float = 0.25  # Recent share of failed requests that slows a portal down
+    scrape_rate_burst: float = 5.0
+    scrape_max_retries: int = 4
+    scrape_backoff_base: float = 0.5  # Seconds, doubled on every retry
+    scrape_backoff_max: float = 30.0
+    full_sweep_hours: int = 24  # Runs in between only fetch listings newer than the high-water mark
+    incremental_overlap: int = 10  # Known listings in a row that end an incremental run
+    stale_after_runs: int = 3  # Complete sweeps a listing can be missing from before it's deactivated
+    stale_after_days: int = 7  # ... or days since it was last seen
+    last_seen_granularity_minutes: int = 60  # last_seen_at is only rewritten when older than this
+    detail_enrichment_enabled: bool = True  # Scrape detail pages of new and changed listings
+    detail_concurrency: int = 4  # Detail pages fetched at the same time per scraper
+    detail_max_per_run: int = 500  # Detail pages per source run (0 = no limit)
+    detail_cache_ttl_seconds: int = 3600  # A detail page isn't fetched again within this time
+    detail_cache_size: int = 5000
+    parse_workers: int = 2  # Processes parsing HTML result pages (0 = a thread in the API process)
+    ingest_batch_size: int = 200  # Cars written and committed together
+    ingest_queue_batches: int = 4  # Batches buffered between a scraper and the ingest
+    dedup_enabled: bool = True  # Cluster copies of the same car listed on several portals
+    dedup_price_tolerance: float = 0.03  # Relative price difference between copies
+    dedup_km_tolerance: float = 0.03  # Relative km difference between copies
+    
+    # Scraper HTTP pool (one pooled client per host, shared by all runs)
+    http_connect_timeout: float = 10.0
+    http_read_timeout: float = 30.0
+    http_pool_timeout: float = 30.0  # Wait for a free connection
+    http_max_connections_per_host: int = 10
+    http_max_keepalive_per_host: int = 10
+    http_keepalive_seconds: float = 60.0
+    http2_enabled: bool = True  # Only used if the h2 package is installed
+    
+    # Listing caches
+    count_cache_size: int = 2048
+    count_cache_ttl_seconds: int = 300
+    count_estimate_threshold: int = 10000  # Above this, total_mode=estimate stops counting
+    dataset_version_poll_seconds: float = 1.0  # Re-read the dataset version bumped by other processes
+    listing_index_enabled: bool = False  # Serve /api/cars from the in-memory index (needs numpy)
+    
+    # Image proxy: list responses link to cached thumbnails (needs Pillow)
+    image_proxy_enabled: bool = True
+    image_proxy_key: str = ""  # Signs the image links; the proxy stays off without it
+    image_cache_dir: str = "./image_cache"
+    image_cache_max_mb: int = 500  # Least recently used thumbnails are evicted past this
+    image_workers: int = 2  # Threads resizing originals
+    image_fetch_connections: int = 20  # Connections fetching originals, across all image hosts
+    image_max_source_mb: int = 15  # Larger originals are rejected
+    image_quality: int = 80  # JPEG quality of the thumbnails
+    image_public_url: str = ""  # Public base URL of the API for image links (empty = the request's)
+    
+    # HTTP caching: route -> (max-age, stale-while-revalidate) in seconds
+    http_cache: Dict[str, Tuple[int, int]] = {
+        "cars": (60, 300),
+        "facets": (60, 300),
+        "car_detail": (300, 3600),
+        "brands": (600, 3600),
+        "models": (600, 3600),
+        "stats": (300, 3600),
+    }
     
     # API
     api_prefix: str = "/api"
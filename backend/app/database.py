@@ -1,6 +1,7 @@
 """
 BusCar Database Configuration
 """
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.config import settings
@@ -35,7 +36,49 @@ async def get_db():
             await session.close()
 
 
+# Indexes replaced by the partial listing indexes on cars (dropped on startup)
+OBSOLETE_INDEXES = [
+    "ix_cars_source", "ix_cars_brand", "ix_cars_model", "ix_cars_year", "ix_cars_price",
+    "ix_cars_km", "ix_cars_fuel", "ix_cars_location", "ix_cars_is_active",
+    "ix_cars_brand_model", "ix_cars_price_year", "ix_cars_source_active",
+]
+
+
+# Columns added to existing tables after their creation: (table, column, SQL type)
+ADDED_COLUMNS = [
+    ("cars", "content_hash", "VARCHAR(32)"),
+    ("cars", "changed_fields", "TEXT"),
+    ("cars", "last_seen_at", "DATETIME"),
+    ("cars", "cluster_id", "INTEGER"),
+    ("cars", "image_hash", "VARCHAR(16)"),
+    ("scrape_logs", "cars_deactivated", "INTEGER DEFAULT 0"),
+    ("scrape_logs", "full_sweep", "BOOLEAN DEFAULT 0"),
+]
+
+
+async def add_missing_columns(conn):
+    """ALTER TABLE ... ADD COLUMN for the ADDED_COLUMNS an older database lacks"""
+    for table, column, sql_type in ADDED_COLUMNS:
+        result = await conn.execute(text(f"PRAGMA table_info({table})"))
+        if column not in {row[1] for row in result.all()}:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+
+
+def create_missing_indexes(sync_conn):
+    """Indexes declared on tables that already existed (create_all only creates new tables)"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
 async def init_db():
     """Initialize database tables"""
+    from app.services.search import init_search_index
+    
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await add_missing_columns(conn)
+        await conn.run_sync(create_missing_indexes)
+        for index_name in OBSOLETE_INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        await init_search_index(conn)
@@ -5,8 +5,8 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.database import init_db
-from app.routers import cars, alerts, scraping
+from app.database import init_db, async_session
+from app.routers import cars, alerts, scraping, images
 
 
 @asynccontextmanager
@@ -17,6 +17,24 @@ async def lifespan(app: FastAPI):
     await init_db()
     print("✅ Database initialized")
     
+    from app.services.stats import ensure_stats
+    from app.services.dedup import ensure_clusters
+    async with async_session() as db:
+        await ensure_stats(db)
+        clustered = await ensure_clusters(db)
+    if clustered:
+        print(f"✅ Duplicate clusters built for {clustered} cars")
+    
+    from app.services.listing_index import listing_index
+    if listing_index.enabled:
+        async with async_session() as db:
+            await listing_index.load(db)
+        print(f"✅ Listing index loaded ({len(listing_index.slots)} cars)")
+    
+    from app.services.images import image_proxy
+    if settings.image_proxy_enabled and not image_proxy.enabled:
+        print("⚠️ Image proxy off: it needs Pillow and IMAGE_PROXY_KEY (list responses keep the original URLs)")
+    
     # Start scheduler for periodic scraping
     # from app.services.scheduler import start_scheduler
     # start_scheduler()
@@ -25,6 +43,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down BusCar API...")
+    from app.services.http_pool import http_pool
+    await http_pool.close()
+    from app.scrapers.base import parse_pool
+    parse_pool.shutdown()
+    from app.services.images import image_proxy
+    await image_proxy.close()
 
 
 app = FastAPI(
@@ -50,6 +74,7 @@ app.add_middleware(
 app.include_router(cars.router, prefix=settings.api_prefix, tags=["Cars"])
 app.include_router(alerts.router, prefix=settings.api_prefix, tags=["Alerts"])
 app.include_router(scraping.router, prefix=settings.api_prefix, tags=["Scraping"])
+app.include_router(images.router, prefix=settings.api_prefix, tags=["Images"])
 
 
 @app.get("/")
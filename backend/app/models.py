@@ -3,7 +3,7 @@ BusCar Database Models
 """
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, Integer, Float, Boolean, DateTime, Text, ForeignKey, Index
+from sqlalchemy import BigInteger, String, Integer, Float, Boolean, DateTime, Text, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
@@ -14,19 +14,19 @@ class Car(Base):
     
     id: Mapped[int] = mapped_column(primary_key=True)
     external_id: Mapped[str] = mapped_column(String(255), unique=True, index=True)
-    source: Mapped[str] = mapped_column(String(50), index=True)  # wallapop, coches.net, etc.
+    source: Mapped[str] = mapped_column(String(50))  # wallapop, coches.net, etc.
     url: Mapped[str] = mapped_column(String(500))
     
     # Basic info
-    brand: Mapped[str] = mapped_column(String(100), index=True)
-    model: Mapped[str] = mapped_column(String(100), index=True)
+    brand: Mapped[str] = mapped_column(String(100))
+    model: Mapped[str] = mapped_column(String(100))
     version: Mapped[Optional[str]] = mapped_column(String(200))
-    year: Mapped[int] = mapped_column(Integer, index=True)
-    price: Mapped[float] = mapped_column(Float, index=True)
+    year: Mapped[int] = mapped_column(Integer)
+    price: Mapped[float] = mapped_column(Float)
     
     # Technical specs
-    km: Mapped[int] = mapped_column(Integer, index=True)
-    fuel: Mapped[str] = mapped_column(String(50), index=True)  # gasolina, diesel, electrico, hibrido
+    km: Mapped[int] = mapped_column(Integer)
+    fuel: Mapped[str] = mapped_column(String(50))  # gasolina, diesel, electrico, hibrido
     transmission: Mapped[str] = mapped_column(String(50))  # manual, automatico
     power: Mapped[Optional[int]] = mapped_column(Integer)  # CV
     doors: Mapped[Optional[int]] = mapped_column(Integer)
@@ -36,7 +36,7 @@ class Car(Base):
     body_type: Mapped[Optional[str]] = mapped_column(String(50))  # sedan, suv, hatchback, etc.
     
     # Location
-    location: Mapped[str] = mapped_column(String(100), index=True)
+    location: Mapped[str] = mapped_column(String(100))
     province: Mapped[Optional[str]] = mapped_column(String(100))
     
     # Seller
@@ -60,15 +60,48 @@ class Car(Base):
     scraped_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     published_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime)  # Last scrape that listed it (coarse)
     
     # Status
-    is_active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True)  # False once the listing stops being seen
+    
+    # Change tracking: fingerprint of the scraped fields, and what the last update changed
+    content_hash: Mapped[Optional[str]] = mapped_column(String(32))
+    changed_fields: Mapped[Optional[str]] = mapped_column(Text)  # JSON array of field names
+    
+    # Duplicates: copies of the same car on other portals share a cluster (NULL = no known copies)
+    cluster_id: Mapped[Optional[int]] = mapped_column(Integer)  # Smallest car id of the cluster
+    image_hash: Mapped[Optional[str]] = mapped_column(String(16))  # Perceptual hash of the main image (hex)
+    
+    # Indexes for the listing queries. Every read filters on is_active = 1, so
+    # they are partial (active rows only) and ordered to serve the sorts of
+    # /api/cars directly; SQLite appends the rowid, which matches the id
+    # tie-breaker. See benchmarks/query_plans.py before changing them.
+    __table_args__ = (
+        Index('ix_cars_active_scraped_at', 'scraped_at', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_price', 'price', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_year', 'year', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_km', 'km', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_brand_scraped_at', 'brand', 'scraped_at', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_brand_price', 'brand', 'price', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_brand_year', 'brand', 'year', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_brand_km', 'brand', 'km', sqlite_where=text('is_active = 1')),
+        Index('ix_cars_active_brand_model_scraped_at', 'brand', 'model', 'scraped_at',
+              sqlite_where=text('is_active = 1')),
+        Index('ix_cars_cluster_id', 'cluster_id', sqlite_where=text('cluster_id IS NOT NULL')),
+    )
+
+
+class CarBand(Base):
+    """LSH band keys of a car: cars sharing a key are candidate duplicates"""
+    __tablename__ = "car_bands"
+    
+    band_key: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    car_id: Mapped[int] = mapped_column(ForeignKey("cars.id", ondelete="CASCADE"), primary_key=True)
     
-    # Indexes for common queries
     __table_args__ = (
-        Index('ix_cars_brand_model', 'brand', 'model'),
-        Index('ix_cars_price_year', 'price', 'year'),
-        Index('ix_cars_source_active', 'source', 'is_active'),
+        Index('ix_car_bands_car_id', 'car_id'),
+        {"sqlite_with_rowid": False},
     )
 
 
@@ -130,5 +163,42 @@ class ScrapeLog(Base):
     cars_found: Mapped[int] = mapped_column(Integer, default=0)
     cars_added: Mapped[int] = mapped_column(Integer, default=0)
     cars_updated: Mapped[int] = mapped_column(Integer, default=0)
+    cars_deactivated: Mapped[int] = mapped_column(Integer, default=0)
+    full_sweep: Mapped[bool] = mapped_column(Boolean, default=False)  # Walked the source's whole result set
     errors: Mapped[Optional[str]] = mapped_column(Text)
     status: Mapped[str] = mapped_column(String(20), default="running")  # running, success, failed
+
+
+class InventoryStat(Base):
+    """Materialised counters behind /api/stats, maintained by the ingest as deltas"""
+    __tablename__ = "inventory_stats"
+    
+    dimension: Mapped[str] = mapped_column(String(20), primary_key=True)  # total, source, fuel, price, scraped_at
+    key: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    value: Mapped[Optional[float]] = mapped_column(Float)  # price min/max
+    timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime)  # latest scraped_at
+
+
+class SourceState(Base):
+    """Per-source scraping state: high-water mark for incremental runs"""
+    __tablename__ = "source_states"
+    
+    source: Mapped[str] = mapped_column(String(50), primary_key=True)
+    
+    # Newest listing seen so far (scrapes sorted by newest stop once they reach it)
+    newest_published_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    newest_external_id: Mapped[Optional[str]] = mapped_column(String(255))
+    first_page_etag: Mapped[Optional[str]] = mapped_column(String(255))
+    
+    last_run_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_full_sweep_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class DatasetState(Base):
+    """Version of the car inventory (a single row), shared by every process serving or writing it"""
+    __tablename__ = "dataset_state"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,30 +1,110 @@
 """
 BusCar Cars Router - API endpoints for car listings
 """
-from typing import Optional, List
-from fastapi import APIRouter, Depends, Query, HTTPException
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Optional, List, Any, Dict, Tuple
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, and_, tuple_, case, exists, inspect, literal_column, Select
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy.sql.util import ClauseAdapter
 
+from app.config import settings
 from app.database import get_db
 from app.models import Car, Favorite
+from app.services.cache import count_cache, facet_cache, catalog_cache
+from app.services.http_cache import HttpCache, CacheCheck
+from app.services.images import image_proxy
+from app.services.listing_index import listing_index
+from app.services.search import search_condition, ranked_matches
+from app.services.serialization import dumps
+from app.services.stats import read_stats
 from app.schemas import (
-    CarResponse, CarDetail, CarListResponse, 
+    CarResponse, CarDetail, CarListResponse, CarFilters, FacetBucket, FacetsResponse,
     FavoriteCreate, FavoriteResponse, BrandInfo, StatsResponse
 )
 
 router = APIRouter()
 
+SORT_COLUMNS = {
+    "date": Car.scraped_at,
+    "price": Car.price,
+    "year": Car.year,
+    "km": Car.km
+}
 
-@router.get("/cars", response_model=CarListResponse)
-async def get_cars(
-    # Pagination
-    page: int = Query(1, ge=1),
-    per_page: int = Query(12, ge=1, le=50),
-    # Sorting
-    sort: str = Query("date-desc", regex="^(date|price|year|km)-(asc|desc)$"),
-    # Filters
+# One value per car: the copies listed on several portals share their cluster's
+CLUSTER_KEY = func.coalesce(Car.cluster_id, Car.id)
+
+# Columns needed by CarResponse - list pages skip description/features
+CAR_LIST_COLUMNS = [getattr(Car, name) for name in CarResponse.model_fields]
+CAR_LIST_KEYS = [column.key for column in CAR_LIST_COLUMNS]
+
+# Lower edges of the range facet buckets
+FACET_BUCKETS = {
+    "year": [0, 2005, 2010, 2015, 2018, 2020, 2022, 2024],
+    "price": [0, 5000, 10000, 15000, 20000, 30000, 50000],
+    "km": [0, 25000, 50000, 100000, 150000, 200000],
+}
+
+# Multi-select filters: each one is ignored when counting its own facet
+DISJUNCTIVE_FACETS = {
+    "fuel": "fuel",
+    "transmission": "transmission",
+    "source": "sources",
+}
+
+
+def _encode_cursor(sort: str, value: Any, car_id: int) -> str:
+    """Build an opaque cursor from the last row of a page"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, car_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _is_sql_number(value: Any) -> bool:
+    """A finite int or float SQLite can bind (JSON also allows bools, NaN and huge ints)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return math.isfinite(value)
+
+
+def _decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """Decode a cursor into (sort value, car id), validating it matches the sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, car_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort.startswith("date-") and value is not None:
+            value = datetime.fromisoformat(value)
+        elif value is not None and not _is_sql_number(value):
+            # price, year, km and relevance sort by numbers
+            raise ValueError(value)
+        if not isinstance(car_id, int) or not _is_sql_number(car_id):
+            raise ValueError(car_id)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+    
+    return value, car_id
+
+
+def _split_csv(value: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated parameter into a sorted, de-duplicated list"""
+    if not value:
+        return None
+    items = sorted({item.strip() for item in value.split(",") if item.strip()})
+    return items or None
+
+
+def car_filters(
     brand: Optional[str] = None,
     model: Optional[str] = None,
     min_price: Optional[float] = None,
@@ -40,100 +120,452 @@ async def get_cars(
     body_type: Optional[str] = None,
     seller_type: Optional[str] = None,
     search: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
-):
-    """Get paginated list of cars with filters"""
-    
-    # Base query
-    query = select(Car).where(Car.is_active == True)
-    count_query = select(func.count(Car.id)).where(Car.is_active == True)
-    
-    # Apply filters
-    conditions = []
-    
-    if brand:
-        conditions.append(Car.brand == brand)
-    if model:
-        conditions.append(Car.model == model)
-    if min_price is not None:
-        conditions.append(Car.price >= min_price)
-    if max_price is not None:
-        conditions.append(Car.price <= max_price)
-    if min_year is not None:
-        conditions.append(Car.year >= min_year)
-    if max_year is not None:
-        conditions.append(Car.year <= max_year)
-    if min_km is not None:
-        conditions.append(Car.km >= min_km)
-    if max_km is not None:
-        conditions.append(Car.km <= max_km)
-    if fuel:
-        fuel_list = [f.strip() for f in fuel.split(",")]
-        conditions.append(Car.fuel.in_(fuel_list))
-    if transmission:
-        trans_list = [t.strip() for t in transmission.split(",")]
-        conditions.append(Car.transmission.in_(trans_list))
-    if location:
-        conditions.append(Car.location == location)
-    if sources:
-        source_list = [s.strip() for s in sources.split(",")]
-        conditions.append(Car.source.in_(source_list))
-    if body_type:
-        conditions.append(Car.body_type == body_type)
-    if seller_type:
-        conditions.append(Car.seller_type == seller_type)
-    if search:
-        search_pattern = f"%{search}%"
-        conditions.append(
-            or_(
-                Car.brand.ilike(search_pattern),
-                Car.model.ilike(search_pattern),
-                Car.description.ilike(search_pattern)
-            )
-        )
+) -> CarFilters:
+    """Dependency collecting the listing filters shared by the car endpoints"""
+    return CarFilters(
+        brand=brand or None,
+        model=model or None,
+        min_price=min_price,
+        max_price=max_price,
+        min_year=min_year,
+        max_year=max_year,
+        min_km=min_km,
+        max_km=max_km,
+        fuel=_split_csv(fuel),
+        transmission=_split_csv(transmission),
+        location=location or None,
+        sources=_split_csv(sources),
+        body_type=body_type or None,
+        seller_type=seller_type or None,
+        search=search or None,
+    )
+
+
+def filter_conditions(filters: CarFilters, include_search: bool = True, price_index: bool = True) -> list:
+    """
+    Build the WHERE conditions for a set of filters (active cars only)
     
-    if conditions:
-        query = query.where(and_(*conditions))
-        count_query = count_query.where(and_(*conditions))
+    Without ``price_index`` the price range is written as ``price + 0`` so
+    SQLite can't seek it in ix_cars_active_price: a page sorted by another
+    column then walks that column's index and stops once the page is full,
+    instead of sorting every car in the range.
+    """
+    conditions = [Car.is_active == True]
+    price = Car.price if price_index else Car.price + literal_column("0")
+    
+    if filters.brand:
+        conditions.append(Car.brand == filters.brand)
+    if filters.model:
+        conditions.append(Car.model == filters.model)
+    if filters.min_price is not None:
+        conditions.append(price >= filters.min_price)
+    if filters.max_price is not None:
+        conditions.append(price <= filters.max_price)
+    if filters.min_year is not None:
+        conditions.append(Car.year >= filters.min_year)
+    if filters.max_year is not None:
+        conditions.append(Car.year <= filters.max_year)
+    if filters.min_km is not None:
+        conditions.append(Car.km >= filters.min_km)
+    if filters.max_km is not None:
+        conditions.append(Car.km <= filters.max_km)
+    if filters.fuel:
+        conditions.append(Car.fuel.in_(filters.fuel))
+    if filters.transmission:
+        conditions.append(Car.transmission.in_(filters.transmission))
+    if filters.location:
+        conditions.append(Car.location == filters.location)
+    if filters.sources:
+        conditions.append(Car.source.in_(filters.sources))
+    if filters.body_type:
+        conditions.append(Car.body_type == filters.body_type)
+    if filters.seller_type:
+        conditions.append(Car.seller_type == filters.seller_type)
+    if filters.search and include_search:
+        search_filter = search_condition(filters.search)
+        if search_filter is not None:
+            conditions.append(search_filter)
+    
+    return conditions
+
+
+async def count_cars(db: AsyncSession, filters: CarFilters, estimate: bool = False,
+                     collapse: bool = False) -> Tuple[int, bool]:
+    """
+    Count the cars matching the filters, using the count cache
+    
+    With ``estimate`` the count stops at ``count_estimate_threshold`` rows and
+    the result is flagged as an estimate (a lower bound) when it hits it.
+    With ``collapse`` the copies of a car on several portals count once.
+    
+    Returns:
+        (total, is_estimate)
+    """
+    signature = filters.signature()
+    exact_key, estimate_key = ("exact-collapsed", "estimate-collapsed") if collapse else ("exact", "estimate")
+    
+    total = count_cache.get((exact_key, signature))
+    if total is not None:
+        return total, False
+    
+    conditions = filter_conditions(filters)
+    counted = CLUSTER_KEY if collapse else Car.id
+    
+    if estimate:
+        cached = count_cache.get((estimate_key, signature))
+        if cached is not None:
+            return cached
+        
+        cap = settings.count_estimate_threshold
+        capped = select(counted).where(and_(*conditions))
+        if collapse:
+            capped = capped.distinct()
+        capped = capped.limit(cap + 1).subquery()
+        result = await db.execute(select(func.count()).select_from(capped))
+        total = result.scalar()
+        if total <= cap:
+            count_cache.set((exact_key, signature), total)
+            return total, False
+        
+        count_cache.set((estimate_key, signature), (cap, True))
+        return cap, True
+    
+    count = func.count(func.distinct(counted)) if collapse else func.count(Car.id)
+    result = await db.execute(select(count).where(and_(*conditions)))
+    total = result.scalar()
+    count_cache.set((exact_key, signature), total)
+    return total, False
+
+
+def resolve_sort(filters: CarFilters, sort: str) -> str:
+    """
+    The order a page really uses: relevance needs search words (and the
+    full-text index), otherwise the newest cars come first
+    """
+    if sort == "relevance" and (not filters.search or ranked_matches(filters.search) is None):
+        return "date-desc"
+    return sort
+
+
+def build_page_query(
+    filters: CarFilters,
+    sort: str,
+    offset: int,
+    limit: int,
+    after: Optional[Tuple[Any, int]] = None,
+    collapse: bool = False
+) -> Select:
+    """
+    Build the SELECT for one listing page
+    
+    Only the CarResponse columns are selected, plus the sort key as
+    ``sort_value``. Kept separate from the execution so the query plans can
+    be inspected (see benchmarks/query_plans.py).
+    
+    With ``collapse``, a car listed on several portals appears once: the
+    copy that comes first in the requested order among those matching.
+    """
+    ranked = None
+    if filters.search and sort == "relevance":
+        ranked = ranked_matches(filters.search)
+    
+    # Sorting (id breaks ties so pages are stable and cursors are unique)
+    if ranked is not None:
+        sort_column, sort_dir = ranked.c.rank, "asc"
+    else:
+        sort_field, sort_dir = ("date-desc" if sort == "relevance" else sort).split("-")
+        sort_column = SORT_COLUMNS.get(sort_field, Car.scraped_at)
+    
+    # Base query - with relevance sort, the join to the ranked matches is the search filter
+    query = select(*CAR_LIST_COLUMNS, sort_column.label("sort_value"))
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.rowid == Car.id)
+    # Other sorts walk their own index past the price filter (see filter_conditions)
+    query = query.where(and_(*filter_conditions(filters, include_search=ranked is None,
+                                                price_index=sort_column is Car.price)))
     
-    # Sorting
-    sort_field, sort_dir = sort.split("-")
-    sort_mapping = {
-        "date": Car.scraped_at,
-        "price": Car.price,
-        "year": Car.year,
-        "km": Car.km
-    }
-    sort_column = sort_mapping.get(sort_field, Car.scraped_at)
     if sort_dir == "desc":
-        query = query.order_by(sort_column.desc())
+        query = query.order_by(sort_column.desc(), Car.id.desc())
     else:
-        query = query.order_by(sort_column.asc())
+        query = query.order_by(sort_column.asc(), Car.id.asc())
+    
+    if collapse and ranked is None:
+        # Hide a copy when another matching copy of its cluster comes first in
+        # the page order: one ix_cars_cluster_id seek per clustered row, and
+        # the plan keeps walking the sort index
+        other = aliased(Car, name="other_copy")
+        adapt = ClauseAdapter(inspect(other).selectable).traverse
+        position, other_position = tuple_(sort_column, Car.id), tuple_(getattr(other, sort_column.key), other.id)
+        ahead = other_position > position if sort_dir == "desc" else other_position < position
+        query = query.where(~exists().where(
+            other.cluster_id == Car.cluster_id, ahead, *map(adapt, filter_conditions(filters))
+        ))
+    elif collapse:
+        # Relevance: of each cluster only the best ranked match stays (the
+        # ranking is repeated as its own subquery inside this one)
+        copy_ranked = ranked_matches(filters.search)
+        copies = (
+            select(Car.id, func.row_number().over(partition_by=Car.cluster_id,
+                                                  order_by=(copy_ranked.c.rank.asc(), Car.id.asc()))
+                   .label("copy_rank"))
+            .join(copy_ranked, copy_ranked.c.rowid == Car.id)
+            .where(Car.cluster_id.isnot(None), *filter_conditions(filters, include_search=False))
+            .subquery("copies")
+        )
+        query = query.where(Car.id.not_in(select(copies.c.id).where(copies.c.copy_rank > 1)))
     
-    # Get total count
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
+    # Keyset pagination seeks past the last row; page numbers use OFFSET
+    if after is not None:
+        value, last_id = after
+        position = tuple_(sort_column, Car.id)
+        if sort_dir == "desc":
+            query = query.where(position < tuple_(value, last_id))
+        else:
+            query = query.where(position > tuple_(value, last_id))
     
+    return query.offset(offset).limit(limit)
+
+
+async def query_page_sql(
+    db: AsyncSession,
+    filters: CarFilters,
+    sort: str,
+    offset: int,
+    limit: int,
+    after: Optional[Tuple[Any, int]] = None,
+    collapse: bool = False
+) -> List[Tuple[dict, Any]]:
+    """
+    Fetch one listing page from the database, as plain rows (no ORM objects)
+    
+    Returns:
+        (car fields, sort value) rows in display order
+    """
+    result = await db.execute(build_page_query(filters, sort, offset, limit, after, collapse))
+    return [(dict(zip(CAR_LIST_KEYS, row)), row[-1]) for row in result.all()]
+
+
+async def query_page_index(
+    db: AsyncSession,
+    filters: CarFilters,
+    sort: str,
+    offset: int,
+    limit: int,
+    after: Optional[Tuple[Any, int]] = None
+) -> Tuple[List[Tuple[dict, Any]], int]:
+    """
+    Fetch one listing page using the in-memory listing index
+    
+    Only the cars on the page are loaded from the database.
+    
+    Returns:
+        ((car fields, sort value) rows in display order, total matching cars)
+    """
+    ids, total = listing_index.query(filters, sort, offset=offset, limit=limit, after=after)
+    if not ids:
+        return [], total
+    
+    result = await db.execute(select(*CAR_LIST_COLUMNS).where(Car.id.in_(ids)))
+    cars_by_id = {car["id"]: car for car in (dict(zip(CAR_LIST_KEYS, row)) for row in result.all())}
+    
+    sort_key = SORT_COLUMNS[sort.split("-")[0]].key
+    rows = [
+        (cars_by_id[car_id], cars_by_id[car_id][sort_key])
+        for car_id in ids if car_id in cars_by_id
+    ]
+    return rows, total
+
+
+@router.get("/cars", response_model=CarListResponse)
+async def get_cars(
+    request: Request,
     # Pagination
-    offset = (page - 1) * per_page
-    query = query.offset(offset).limit(per_page)
+    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor"),
+    per_page: int = Query(12, ge=1, le=50),
+    total_mode: str = Query("exact", regex="^(exact|estimate)$"),
+    collapse: bool = Query(False, description="One row per car listed on several portals"),
+    # Sorting
+    sort: str = Query("date-desc", regex="^((date|price|year|km)-(asc|desc)|relevance)$"),
+    # Filters
+    filters: CarFilters = Depends(car_filters),
+    cache: CacheCheck = Depends(HttpCache("cars")),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get paginated list of cars with filters
     
-    # Execute
-    result = await db.execute(query)
-    cars = result.scalars().all()
-    
-    return CarListResponse(
-        cars=[CarResponse.model_validate(car) for car in cars],
-        total=total,
-        page=page,
-        per_page=per_page,
-        pages=(total + per_page - 1) // per_page
+    Pages can be requested by number (``page``) or by keyset (``cursor``).
+    Cursor pages seek directly to (sort value, id) instead of skipping rows,
+    so deep pages cost the same as the first one.
+    
+    ``search`` uses the full-text index (prefix match on every word) and
+    ``sort=relevance`` orders the matches by rank.
+    
+    Totals are cached per filter set until the next scrape changes the data.
+    ``total_mode=estimate`` caps the count for very broad queries and sets
+    ``total_is_estimate`` when the real total is larger.
+    
+    ``collapse=true`` shows each car listed on several portals once (the
+    first of its copies in the requested order) and counts it once.
+    
+    ``image_url`` links to a cached thumbnail (/api/images) when the image
+    proxy is enabled.
+    
+    When the listing index is enabled, it answers filter/sort/page without SQL
+    (collapsed listings always use SQL).
+    
+    Rows are serialised straight to JSON (same shape as CarListResponse)
+    without building ORM objects or validating each car.
+    """
+    if cache.not_modified:
+        return cache.not_modified_response()
+    
+    # Cursors carry the resolved sort, so their values decode by the real column
+    sort = resolve_sort(filters, sort)
+    after = _decode_cursor(cursor, sort) if cursor else None
+    offset = 0 if cursor else (page - 1) * per_page
+    
+    # Reload the index if another process changed the inventory
+    await listing_index.catch_up(db)
+    
+    # Fetch one extra row to know whether there is a next page
+    if not collapse and listing_index.supports(filters, sort):
+        rows, total = await query_page_index(db, filters, sort, offset, per_page + 1, after)
+        total_is_estimate = False
+    else:
+        total, total_is_estimate = await count_cars(db, filters, estimate=total_mode == "estimate",
+                                                    collapse=collapse)
+        rows = await query_page_sql(db, filters, sort, offset, per_page + 1, after, collapse)
+    
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_car, last_value = rows[-1]
+        next_cursor = _encode_cursor(sort, last_value, last_car["id"])
+    
+    if image_proxy.enabled:
+        base_url = settings.image_public_url or str(request.base_url)
+        for car, _ in rows:
+            car["image_url"] = image_proxy.url(car["image_url"], car["id"], base_url)
+    
+    content = {
+        "cars": [row[0] for row in rows],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page,
+        "next_cursor": next_cursor,
+        "total_is_estimate": total_is_estimate
+    }
+    return Response(content=dumps(content), media_type="application/json", headers=cache.headers)
+
+
+def _bucket_index(column, edges: List[int]):
+    """CASE expression mapping a column to the index of its bucket"""
+    return case(
+        *[(column >= edge, i) for i, edge in reversed(list(enumerate(edges))) if i > 0],
+        else_=0
     )
 
 
+@router.get("/cars/facets", response_model=FacetsResponse)
+async def get_facets(
+    filters: CarFilters = Depends(car_filters),
+    cache: CacheCheck = Depends(HttpCache("facets")),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get sidebar counts for the cars matching the filters
+    
+    All facets come from a single grouped scan. Multi-select facets (fuel,
+    transmission, source) ignore their own filter, so unselected options
+    still show how many cars they would add.
+    """
+    if cache.not_modified:
+        return cache.not_modified_response()
+    
+    signature = filters.signature()
+    cached = facet_cache.get(signature)
+    if cached is not None:
+        return cached
+    
+    # The multi-select filters are applied below, per facet
+    scan_filters = filters.model_copy(update={field: None for field in DISJUNCTIVE_FACETS.values()})
+    
+    group_columns = [
+        Car.fuel, Car.transmission, Car.source, Car.body_type, Car.seller_type, Car.brand,
+        _bucket_index(Car.year, FACET_BUCKETS["year"]).label("year_bucket"),
+        _bucket_index(Car.price, FACET_BUCKETS["price"]).label("price_bucket"),
+        _bucket_index(Car.km, FACET_BUCKETS["km"]).label("km_bucket"),
+    ]
+    query = (
+        select(*group_columns, func.count(Car.id))
+        .where(and_(*filter_conditions(scan_filters)))
+        .group_by(*group_columns)
+    )
+    result = await db.execute(query)
+    
+    selected = {
+        facet: set(getattr(filters, field) or [])
+        for facet, field in DISJUNCTIVE_FACETS.items()
+    }
+    counts = {
+        facet: {}
+        for facet in ("fuel", "transmission", "source", "body_type", "seller_type", "brand")
+    }
+    bucket_counts = {facet: [0] * len(edges) for facet, edges in FACET_BUCKETS.items()}
+    total = 0
+    
+    for row in result.all():
+        fuel, transmission, source, body_type, seller_type, brand, year_b, price_b, km_b, count = row
+        values = {"fuel": fuel, "transmission": transmission, "source": source}
+        # Which multi-select filters this group fails
+        failing = {facet for facet, chosen in selected.items() if chosen and values[facet] not in chosen}
+        
+        # Multi-select facets count groups that only fail their own filter
+        for facet, value in values.items():
+            if not failing - {facet}:
+                counts[facet][value] = counts[facet].get(value, 0) + count
+        
+        if failing:
+            continue
+        
+        total += count
+        for facet, value in (("body_type", body_type), ("seller_type", seller_type), ("brand", brand)):
+            if value is not None:
+                counts[facet][value] = counts[facet].get(value, 0) + count
+        bucket_counts["year"][year_b] += count
+        bucket_counts["price"][price_b] += count
+        bucket_counts["km"][km_b] += count
+    
+    buckets = {}
+    for facet, edges in FACET_BUCKETS.items():
+        buckets[facet] = [
+            FacetBucket(
+                min=edge,
+                max=edges[i + 1] if i + 1 < len(edges) else None,
+                count=bucket_counts[facet][i]
+            )
+            for i, edge in enumerate(edges)
+        ]
+    
+    response = FacetsResponse(total=total, **counts, **buckets)
+    facet_cache.set(signature, response)
+    count_cache.set(("exact", signature), total)
+    return response
+
+
 @router.get("/cars/{car_id}", response_model=CarDetail)
-async def get_car(car_id: int, db: AsyncSession = Depends(get_db)):
+async def get_car(
+    car_id: int,
+    cache: CacheCheck = Depends(HttpCache("car_detail")),
+    db: AsyncSession = Depends(get_db)
+):
     """Get detailed information about a specific car"""
+    if cache.not_modified:
+        return cache.not_modified_response()
+    
     result = await db.execute(select(Car).where(Car.id == car_id))
     car = result.scalar_one_or_none()
     
@@ -143,94 +575,79 @@ async def get_car(car_id: int, db: AsyncSession = Depends(get_db)):
     return CarDetail.model_validate(car)
 
 
-@router.get("/brands", response_model=List[BrandInfo])
-async def get_brands(db: AsyncSession = Depends(get_db)):
-    """Get list of all brands with counts and models"""
-    # Get brands with counts
+async def get_brand_catalog(db: AsyncSession) -> Dict[str, Tuple[int, Dict[str, int]]]:
+    """
+    Active inventory as brand -> (count, {model: count})
+    
+    Built with a single grouped query and cached until the next scrape
+    changes the inventory. Brands are ordered by count, models by name.
+    """
+    catalog = catalog_cache.get("brands")
+    if catalog is not None:
+        return catalog
+    
     query = (
-        select(Car.brand, func.count(Car.id).label("count"))
+        select(Car.brand, Car.model, func.count(Car.id))
         .where(Car.is_active == True)
-        .group_by(Car.brand)
-        .order_by(func.count(Car.id).desc())
+        .group_by(Car.brand, Car.model)
+        .order_by(Car.brand, Car.model)
     )
     result = await db.execute(query)
-    brands_data = result.all()
-    
-    brands = []
-    for brand_name, count in brands_data:
-        # Get models for each brand
-        models_query = (
-            select(Car.model)
-            .where(and_(Car.brand == brand_name, Car.is_active == True))
-            .distinct()
-            .order_by(Car.model)
-        )
-        models_result = await db.execute(models_query)
-        models = [row[0] for row in models_result.all()]
-        
-        brands.append(BrandInfo(name=brand_name, count=count, models=models))
     
-    return brands
+    grouped: Dict[str, Dict[str, int]] = {}
+    for brand_name, model_name, count in result.all():
+        grouped.setdefault(brand_name, {})[model_name] = count
+    
+    totals = {brand_name: sum(models.values()) for brand_name, models in grouped.items()}
+    catalog = {
+        brand_name: (totals[brand_name], grouped[brand_name])
+        for brand_name in sorted(grouped, key=lambda name: -totals[name])
+    }
+    catalog_cache.set("brands", catalog)
+    return catalog
+
+
+@router.get("/brands", response_model=List[BrandInfo])
+async def get_brands(
+    cache: CacheCheck = Depends(HttpCache("brands")),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get list of all brands with counts and models"""
+    if cache.not_modified:
+        return cache.not_modified_response()
+    
+    catalog = await get_brand_catalog(db)
+    return [
+        BrandInfo(name=brand_name, count=count, models=list(models))
+        for brand_name, (count, models) in catalog.items()
+    ]
 
 
 @router.get("/brands/{brand}/models")
-async def get_models(brand: str, db: AsyncSession = Depends(get_db)):
+async def get_models(
+    brand: str,
+    cache: CacheCheck = Depends(HttpCache("models")),
+    db: AsyncSession = Depends(get_db)
+):
     """Get models for a specific brand"""
-    query = (
-        select(Car.model, func.count(Car.id).label("count"))
-        .where(and_(Car.brand == brand, Car.is_active == True))
-        .group_by(Car.model)
-        .order_by(Car.model)
-    )
-    result = await db.execute(query)
+    if cache.not_modified:
+        return cache.not_modified_response()
     
-    return [{"name": row[0], "count": row[1]} for row in result.all()]
+    catalog = await get_brand_catalog(db)
+    _, models = catalog.get(brand, (0, {}))
+    return [{"name": model_name, "count": count} for model_name, count in models.items()]
 
 
 @router.get("/stats", response_model=StatsResponse)
-async def get_stats(db: AsyncSession = Depends(get_db)):
-    """Get general statistics"""
-    # Total cars
-    total_query = select(func.count(Car.id)).where(Car.is_active == True)
-    total_result = await db.execute(total_query)
-    total_cars = total_result.scalar()
-    
-    # Cars by source
-    source_query = (
-        select(Car.source, func.count(Car.id))
-        .where(Car.is_active == True)
-        .group_by(Car.source)
-    )
-    source_result = await db.execute(source_query)
-    cars_by_source = dict(source_result.all())
+async def get_stats(
+    cache: CacheCheck = Depends(HttpCache("stats")),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get general statistics (materialised by the scraping ingest)"""
+    if cache.not_modified:
+        return cache.not_modified_response()
     
-    # Cars by fuel
-    fuel_query = (
-        select(Car.fuel, func.count(Car.id))
-        .where(Car.is_active == True)
-        .group_by(Car.fuel)
-    )
-    fuel_result = await db.execute(fuel_query)
-    cars_by_fuel = dict(fuel_result.all())
-    
-    # Price range
-    price_query = select(func.min(Car.price), func.max(Car.price)).where(Car.is_active == True)
-    price_result = await db.execute(price_query)
-    min_price, max_price = price_result.one()
-    
-    # Last update
-    last_query = select(func.max(Car.scraped_at))
-    last_result = await db.execute(last_query)
-    last_update = last_result.scalar()
-    
-    return StatsResponse(
-        total_cars=total_cars,
-        total_sources=len(cars_by_source),
-        last_update=last_update,
-        cars_by_source=cars_by_source,
-        cars_by_fuel=cars_by_fuel,
-        price_range={"min": min_price or 0, "max": max_price or 0}
-    )
+    return await read_stats(db)
 
 
 # ================================
@@ -276,6 +693,7 @@ async def add_favorite(
 
 @router.get("/favorites", response_model=List[FavoriteResponse])
 async def get_favorites(
+    request: Request,
     user_id: str = Query(..., description="User or session ID"),
     db: AsyncSession = Depends(get_db)
 ):
@@ -286,7 +704,13 @@ async def get_favorites(
         .options(selectinload(Favorite.car))
         .order_by(Favorite.created_at.desc())
     )
-    return result.scalars().all()
+    # Copies, so the thumbnail links don't end up in the ORM objects
+    favorites = [FavoriteResponse.model_validate(favorite) for favorite in result.scalars().all()]
+    if image_proxy.enabled:
+        base_url = settings.image_public_url or str(request.base_url)
+        for favorite in favorites:
+            favorite.car.image_url = image_proxy.url(favorite.car.image_url, favorite.car_id, base_url)
+    return favorites
 
 
 @router.delete("/favorites/{car_id}")
@@ -0,0 +1,41 @@
+"""
+BusCar Images Router - Thumbnails of the listing photos (see services/images.py)
+"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+from app.services.images import IMMUTABLE, THUMBNAIL_SIZES, ImageError, image_proxy
+
+router = APIRouter()
+
+
+@router.get("/images/{size}/{signature}")
+async def get_image(
+    size: str,
+    signature: str,
+    request: Request,
+    src: str = Query(..., description="Original image URL"),
+    car: Optional[int] = Query(None, description="Car the image belongs to"),
+):
+    """
+    Get a listing photo resized to ``size`` (large, card or thumb) as JPEG
+    
+    The links come from the list responses and are signed. The original is
+    fetched and resized once, then served from the disk cache; a thumbnail
+    never changes, so it can be cached for good.
+    """
+    if not image_proxy.enabled or size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not image_proxy.verify(signature, src, car):
+        raise HTTPException(status_code=403, detail="Invalid image signature")
+    
+    try:
+        thumbnail = await image_proxy.thumbnail(src, size, car)
+    except ImageError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    headers = {"Cache-Control": IMMUTABLE, "ETag": f'"{thumbnail.digest}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumbnail.path, media_type="image/jpeg", headers=headers)
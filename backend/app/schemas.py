@@ -2,7 +2,7 @@
 BusCar Pydantic Schemas for API validation
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -56,6 +56,7 @@ class CarResponse(CarBase):
     warranty: bool
     scraped_at: datetime
     is_active: bool
+    cluster_id: Optional[int] = None  # Shared by the copies of this car on other portals
     
     class Config:
         from_attributes = True
@@ -80,6 +81,8 @@ class CarListResponse(BaseModel):
     page: int
     per_page: int
     pages: int
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
 
 
 # ================================
@@ -101,6 +104,30 @@ class CarFilters(BaseModel):
     sources: Optional[List[str]] = None
     body_type: Optional[str] = None
     seller_type: Optional[str] = None
+    search: Optional[str] = None
+    
+    def signature(self) -> str:
+        """Normalised, order-independent key for caching results of these filters"""
+        return self.model_dump_json(exclude_none=True)
+
+
+class FacetBucket(BaseModel):
+    min: float
+    max: Optional[float] = None  # Exclusive; None = open-ended
+    count: int
+
+
+class FacetsResponse(BaseModel):
+    total: int
+    fuel: Dict[str, int]
+    transmission: Dict[str, int]
+    source: Dict[str, int]
+    body_type: Dict[str, int]
+    seller_type: Dict[str, int]
+    brand: Dict[str, int]
+    year: List[FacetBucket]
+    price: List[FacetBucket]
+    km: List[FacetBucket]
 
 
 # ================================
@@ -205,6 +232,8 @@ class ScrapeStatus(BaseModel):
     cars_found: int
     cars_added: int
     cars_updated: int
+    cars_deactivated: int = 0
+    full_sweep: bool = False
     errors: Optional[str] = None
     
     class Config:
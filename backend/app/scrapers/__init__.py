@@ -1,29 +1,35 @@
 """
 BusCar Scrapers Module
 """
-from typing import Optional
+from typing import Optional, Set
 from app.scrapers.base import BaseScraper
 
+SCRAPERS = {
+    "wallapop": "app.scrapers.wallapop.WallapopScraper",
+    "coches.net": "app.scrapers.cochesnet.CochesNetScraper",
+    "autoscout24": "app.scrapers.autoscout24.AutoScout24Scraper",
+    "milanuncios": "app.scrapers.milanuncios.MilanunciosScraper",
+    "motor.es": "app.scrapers.motores.MotorEsScraper",
+}
+
+# Sources already reported as unavailable (warned once per process)
+_unavailable: Set[str] = set()
+
 
 def get_scraper(source: str) -> Optional[BaseScraper]:
     """Get scraper instance by source name"""
-    scrapers = {
-        "wallapop": "app.scrapers.wallapop.WallapopScraper",
-        "coches.net": "app.scrapers.cochesnet.CochesNetScraper",
-        "autoscout24": "app.scrapers.autoscout24.AutoScout24Scraper",
-        "milanuncios": "app.scrapers.milanuncios.MilanunciosScraper",
-        "motor.es": "app.scrapers.motores.MotorEsScraper",
-    }
-    
-    if source not in scrapers:
+    if source not in SCRAPERS:
         return None
     
     # Dynamic import
-    module_path, class_name = scrapers[source].rsplit(".", 1)
+    module_path, class_name = SCRAPERS[source].rsplit(".", 1)
     try:
         import importlib
         module = importlib.import_module(module_path)
         scraper_class = getattr(module, class_name)
         return scraper_class()
-    except (ImportError, AttributeError):
+    except (ImportError, AttributeError) as e:
+        if source not in _unavailable:
+            _unavailable.add(source)
+            print(f"⚠️ Scraper for {source} not available ({SCRAPERS[source]}): {e}")
         return None
@@ -1,12 +1,30 @@
 """
 BusCar Base Scraper - Abstract class for all scrapers
+
+HTML portals parse their result pages with ``parse_page`` in a pool of
+worker processes (``parse_in_pool``): html5lib is pure Python, and parsing
+in the API process would stall the event loop serving the routes.
 """
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
+import asyncio
+import multiprocessing
+import random
 import httpx
 
+from app.config import settings
+from app.scrapers import normalize
+from app.scrapers.detail_cache import MISSING, detail_cache
+from app.scrapers.rate_limit import parse_retry_after, rate_limiters
+from app.services.http_pool import client_options, http_pool
+
+# Responses worth retrying: throttling and temporary server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 
 @dataclass
 class ScrapedCar:
@@ -42,14 +60,80 @@ class ScrapedCar:
     published_at: Optional[datetime] = None
 
 
+@dataclass
+class HighWaterMark:
+    """Newest listing of a source seen so far, kept between runs in SourceState"""
+    published_at: Optional[datetime] = None
+    external_id: Optional[str] = None
+    etag: Optional[str] = None  # ETag of the first results page
+
+
+# Scrapers instantiated inside a parse worker, one per class
+_worker_scrapers: Dict[type, "BaseScraper"] = {}
+
+
+def _parse_in_worker(scraper_class: type, body: str, url: str) -> List[ScrapedCar]:
+    """Parse one page with a worker-local instance of ``scraper_class``"""
+    scraper = _worker_scrapers.get(scraper_class)
+    if scraper is None:
+        scraper = _worker_scrapers[scraper_class] = scraper_class()
+    return scraper.parse_page(body, url)
+
+
+class ParsePool:
+    """Worker processes parsing raw pages for all scrapers, started on first use"""
+    
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        """The process pool, or None when ``parse_workers`` is 0"""
+        if self._executor is None and settings.parse_workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.parse_workers,
+                # Forking a process running an event loop and threads is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+    
+    async def parse(self, scraper_class: type, body: str, url: str) -> List[ScrapedCar]:
+        executor = self.executor()
+        if executor is None:
+            # Off the event loop, but still sharing the API process (and its GIL)
+            return await asyncio.to_thread(_parse_in_worker, scraper_class, body, url)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, _parse_in_worker, scraper_class, body, url
+            )
+        except BrokenProcessPool:
+            self.shutdown()  # A worker died; start a fresh pool next time
+            raise
+    
+    def shutdown(self):
+        """Stop the workers (on application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+parse_pool = ParsePool()
+
+
 class BaseScraper(ABC):
     """Abstract base class for scrapers"""
     
     source_name: str = "unknown"
     base_url: str = ""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.http_client: Optional[httpx.AsyncClient] = None
+        # Custom transport, e.g. an httpx.MockTransport serving recorded responses
+        self.transport = transport
+        # Newest listing seen by the last iter_cars() run (saved as the next run's ``since``)
+        self.high_water = HighWaterMark()
+        # Whether the last iter_cars() run walked every result (lets a full sweep deactivate unseen listings)
+        self.reached_end = False
     
     async def __aenter__(self):
         await self.setup()
@@ -59,35 +143,123 @@ class BaseScraper(ABC):
         await self.cleanup()
     
     async def setup(self):
-        """Initialize HTTP client"""
-        self.http_client = httpx.AsyncClient(
-            timeout=30.0,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "application/json, text/html, */*",
-                "Accept-Language": "es-ES,es;q=0.9,en;q=0.8"
-            },
-            follow_redirects=True
-        )
+        """Borrow the shared HTTP client for this source's host (no-op if already set up)"""
+        if self.http_client is not None:
+            return
+        if self.transport is not None:
+            # A custom transport gets a private client, closed in cleanup()
+            self.http_client = httpx.AsyncClient(transport=self.transport, **client_options())
+        else:
+            self.http_client = http_pool.client(self.base_url)
     
     async def cleanup(self):
-        """Cleanup resources"""
-        if self.http_client:
+        """Release the HTTP client (pooled clients stay open for reuse)"""
+        if self.http_client and self.transport is not None:
             await self.http_client.aclose()
+        self.http_client = None
+    
+    async def fetch(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the host's rate limiter, retrying failures
+        
+        429, 5xx and connection errors are retried up to ``scrape_max_retries``
+        times with jittered exponential backoff, or after ``Retry-After`` when
+        the portal sends one. Each outcome adjusts the host's request rate.
+        
+        Returns:
+            The last response (possibly still an error status once retries run out)
+        """
+        limiter = rate_limiters.for_url(url)
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            try:
+                response = await self.http_client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                limiter.record_failure()
+                if attempt >= settings.scrape_max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    limiter.record_success()
+                    return response
+                limiter.record_failure(throttled=response.status_code == 429)
+                if attempt >= settings.scrape_max_retries:
+                    return response
+                
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    delay = min(retry_after, settings.scrape_backoff_max)
+                    limiter.pause(delay)
+                    attempt += 1
+                    continue
+            
+            # Full jitter: a random wait up to the exponential backoff
+            backoff = min(settings.scrape_backoff_max, settings.scrape_backoff_base * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, backoff))
+            attempt += 1
     
     @abstractmethod
-    async def scrape(self, max_cars: int = 100, **filters) -> List[ScrapedCar]:
+    async def iter_cars(self, max_cars: int = 100, since: Optional[HighWaterMark] = None,
+                        **filters) -> AsyncIterator[ScrapedCar]:
         """
         Main scraping method - must be implemented by subclasses
         
+        An async generator yielding cars as each results page is parsed, so
+        the caller can store them while the scrape is still running.
+        
         Args:
             max_cars: Maximum number of cars to scrape
+            since: High-water mark of the previous run; scrapers sorted by
+                newest stop once they reach listings older than it
             **filters: Optional filters (brand, model, max_price, etc.)
         
-        Returns:
-            List of ScrapedCar objects
+        Yields:
+            ScrapedCar objects
         """
-        pass
+        raise NotImplementedError
+        yield  # Makes this an async generator
+    
+    async def scrape(self, max_cars: int = 100, since: Optional[HighWaterMark] = None,
+                     **filters) -> List[ScrapedCar]:
+        """Scrape everything at once and return it as a list"""
+        return [car async for car in self.iter_cars(max_cars=max_cars, since=since, **filters)]
+    
+    def track_newest(self, car: ScrapedCar):
+        """Move this run's high-water mark up to ``car`` if it's the newest so far"""
+        mark = self.high_water
+        if mark.external_id is None or (
+            car.published_at and (mark.published_at is None or car.published_at > mark.published_at)
+        ):
+            mark.published_at = car.published_at
+            mark.external_id = car.external_id
+    
+    @staticmethod
+    def is_known(car: ScrapedCar, since: Optional[HighWaterMark]) -> bool:
+        """Whether ``car`` is at or behind the high-water mark of a previous run"""
+        if since is None:
+            return False
+        if since.external_id and car.external_id == since.external_id:
+            return True
+        return bool(since.published_at and car.published_at and car.published_at <= since.published_at)
+    
+    def parse_page(self, body: str, url: str) -> List[ScrapedCar]:
+        """
+        Parse a raw results page - implemented by the HTML scrapers
+        
+        Runs in a parse worker process, on an instance created there: it may
+        use the parse/normalize helpers and class attributes, but no state of
+        this instance (HTTP client, high-water mark...).
+        
+        Args:
+            body: Page HTML
+            url: URL the page was fetched from (for resolving links)
+        """
+        raise NotImplementedError
+    
+    async def parse_in_pool(self, body: str, url: str) -> List[ScrapedCar]:
+        """Run ``parse_page`` in the parse worker pool, keeping the event loop free"""
+        return await parse_pool.parse(type(self), body, url)
     
     @abstractmethod
     async def scrape_detail(self, url: str) -> Optional[ScrapedCar]:
@@ -102,49 +274,74 @@ class BaseScraper(ABC):
         """
         pass
     
+    async def scrape_details(self, urls: Iterable[str]) -> Dict[str, Optional[ScrapedCar]]:
+        """
+        Scrape the detail pages of several cars
+        
+        Duplicate URLs are fetched once, pages scraped within
+        ``detail_cache_ttl_seconds`` come from the detail cache, and at most
+        ``detail_concurrency`` pages are fetched at a time. A page that fails
+        maps to None (and isn't cached).
+        
+        Returns:
+            url -> ScrapedCar with full details (or None), for every distinct url
+        """
+        results: Dict[str, Optional[ScrapedCar]] = {}
+        to_fetch = []
+        for url in dict.fromkeys(urls):
+            cached = detail_cache.get(url)
+            if cached is MISSING:
+                to_fetch.append(url)
+            else:
+                results[url] = cached
+        if not to_fetch:
+            return results
+        
+        semaphore = asyncio.Semaphore(settings.detail_concurrency)
+        
+        async def fetch_one(url: str):
+            async with semaphore:
+                try:
+                    car = await self.scrape_detail(url)
+                except Exception as e:
+                    print(f"Error scraping detail {url}: {e}")
+                    results[url] = None
+                    return
+            detail_cache.put(url, car)
+            results[url] = car
+        
+        borrowed = self.http_client is None  # Not already set up by ``async with``
+        await self.setup()
+        try:
+            await asyncio.gather(*(fetch_one(url) for url in to_fetch))
+        finally:
+            if borrowed:
+                await self.cleanup()
+        return results
+    
+    # Field helpers, backed by app.scrapers.normalize (compiled patterns,
+    # memoized per distinct value); pages can use its batch functions
+    
     def parse_price(self, price_text: str) -> float:
         """Parse price from text"""
-        # Remove currency symbols, spaces, dots (thousands separator)
-        cleaned = price_text.replace("€", "").replace(".", "").replace(",", ".").strip()
-        try:
-            return float(cleaned)
-        except ValueError:
-            return 0.0
+        return normalize.parse_price(price_text)
     
     def parse_km(self, km_text: str) -> int:
         """Parse kilometers from text"""
-        cleaned = km_text.lower().replace("km", "").replace(".", "").replace(",", "").strip()
-        try:
-            return int(cleaned)
-        except ValueError:
-            return 0
+        return normalize.parse_km(km_text)
     
     def parse_year(self, year_text: str) -> int:
         """Parse year from text"""
-        import re
-        match = re.search(r"(19|20)\d{2}", year_text)
-        if match:
-            return int(match.group())
-        return 0
+        return normalize.parse_year(year_text)
     
     def normalize_fuel(self, fuel_text: str) -> str:
         """Normalize fuel type"""
-        fuel_lower = fuel_text.lower()
-        if "electr" in fuel_lower:
-            return "electrico"
-        elif "hibrid" in fuel_lower:
-            return "hibrido"
-        elif "diesel" in fuel_lower or "diésel" in fuel_lower:
-            return "diesel"
-        elif "gasolina" in fuel_lower or "benzin" in fuel_lower:
-            return "gasolina"
-        elif "gas" in fuel_lower:
-            return "gas"
-        return "otro"
+        return normalize.normalize_fuel(fuel_text)
     
     def normalize_transmission(self, trans_text: str) -> str:
         """Normalize transmission type"""
-        trans_lower = trans_text.lower()
-        if "auto" in trans_lower or "automát" in trans_lower:
-            return "automatico"
-        return "manual"
+        return normalize.normalize_transmission(trans_text)
+    
+    def parse_title(self, title: str) -> Tuple[str, str, Optional[str]]:
+        """Canonical (brand, model, version) from a listing title"""
+        return normalize.parse_title(title)
@@ -0,0 +1,52 @@
+"""
+BusCar Detail Cache - Recently scraped detail pages
+
+``BaseScraper.scrape_details`` looks detail pages up here before fetching
+them, so a listing enriched a moment ago (by another batch, run or source
+overlap) isn't fetched again. Entries expire after
+``detail_cache_ttl_seconds``; the oldest are evicted beyond
+``detail_cache_size``. Process-wide, like the rate limiters.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import settings
+
+# Marks a cache miss (None is a valid cached result: the page had no listing)
+MISSING = object()
+
+
+class DetailCache:
+    """TTL + LRU cache of url -> ScrapedCar (or None)"""
+    
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+    
+    def get(self, url: str):
+        """Cached result for ``url``, or MISSING"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return MISSING
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[url]
+            return MISSING
+        self._entries.move_to_end(url)
+        return value
+    
+    def put(self, url: str, value: Optional[object]):
+        self._entries[url] = (time.monotonic() + settings.detail_cache_ttl_seconds, value)
+        self._entries.move_to_end(url)
+        while len(self._entries) > settings.detail_cache_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Singleton instance
+detail_cache = DetailCache()
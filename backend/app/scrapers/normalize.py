@@ -0,0 +1,317 @@
+"""
+BusCar Normalization - Canonical values for scraped fields
+
+Every scraper turns the raw strings of a portal ("12.500 €", "Diésel",
+"VW Golf 1.6 TDI") into the values the database, facets and indexes use.
+The work is done once per distinct raw string: patterns are compiled at
+import, values are memoized (portals repeat the same fuel, gearbox and
+title strings over and over), and the batch functions (``normalize_fuels``,
+``parse_titles``...) normalize a whole page of values in one call: repeated
+values are cache hits, and kilometers, which rarely repeat, are cleaned in
+one pass over the page's column instead.
+
+Brand and model come from the title, matched token by token against a trie
+of known makes (with their usual spellings: "VW", "Mercedes", "Citroën")
+and a trie of models per make, so "vw golf", "Volkswagen GOLF" and
+"Volkswagen Golf 1.6 TDI" all give ``("Volkswagen", "Golf")``.
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import re
+import unicodedata
+
+# Canonical make -> its models (the spellings stored in the database)
+MAKES: Dict[str, List[str]] = {
+    "Abarth": ["500", "595", "695", "124 Spider"],
+    "Alfa Romeo": ["Giulia", "Giulietta", "Stelvio", "Tonale", "MiTo", "159"],
+    "Audi": ["A1", "A3", "A4", "A5", "A6", "A7", "A8", "Q2", "Q3", "Q4 e-tron", "Q5", "Q7", "Q8", "TT", "e-tron"],
+    "BMW": ["Serie 1", "Serie 2", "Serie 3", "Serie 4", "Serie 5", "Serie 7", "X1", "X2", "X3", "X4", "X5",
+            "X6", "Z4", "i3", "i4", "iX"],
+    "BYD": ["Atto 3", "Dolphin", "Seal", "Han", "Tang"],
+    "Citroen": ["C1", "C3", "C3 Aircross", "C4", "C4 Picasso", "C5", "C5 Aircross", "Berlingo", "Xsara Picasso"],
+    "Cupra": ["Born", "Formentor", "Leon", "Ateca"],
+    "Dacia": ["Sandero", "Duster", "Logan", "Jogger", "Spring", "Lodgy"],
+    "DS": ["DS 3", "DS 4", "DS 7"],
+    "Fiat": ["500", "500X", "500L", "Panda", "Tipo", "Punto", "Doblo"],
+    "Ford": ["Fiesta", "Focus", "Puma", "Kuga", "Mondeo", "C-Max", "S-Max", "EcoSport", "Mustang", "Ranger",
+             "Transit"],
+    "Honda": ["Civic", "Jazz", "CR-V", "HR-V", "Accord"],
+    "Hyundai": ["i10", "i20", "i30", "Tucson", "Kona", "Santa Fe", "Bayon", "Ioniq"],
+    "Jaguar": ["XE", "XF", "F-Pace", "E-Pace", "I-Pace"],
+    "Jeep": ["Renegade", "Compass", "Wrangler", "Grand Cherokee", "Avenger"],
+    "Kia": ["Picanto", "Rio", "Ceed", "Stonic", "Sportage", "Niro", "Sorento", "XCeed", "EV6"],
+    "Land Rover": ["Range Rover Evoque", "Range Rover Sport", "Range Rover Velar", "Range Rover",
+                   "Discovery Sport", "Discovery", "Defender", "Freelander"],
+    "Lexus": ["CT", "IS", "NX", "RX", "UX"],
+    "Mazda": ["Mazda2", "Mazda3", "Mazda6", "CX-3", "CX-30", "CX-5", "MX-5"],
+    "Mercedes-Benz": ["Clase A", "Clase B", "Clase C", "Clase E", "Clase S", "Clase V", "CLA", "CLS", "GLA",
+                      "GLB", "GLC", "GLE", "Vito", "Sprinter"],
+    "MG": ["ZS", "HS", "MG4", "MG3"],
+    "Mini": ["Cooper", "Countryman", "Clubman", "One"],
+    "Mitsubishi": ["ASX", "Eclipse Cross", "Outlander", "Space Star", "L200"],
+    "Nissan": ["Micra", "Juke", "Qashqai", "X-Trail", "Leaf", "Note", "Navara"],
+    "Opel": ["Corsa", "Astra", "Insignia", "Mokka", "Crossland", "Grandland", "Zafira", "Meriva"],
+    "Peugeot": ["107", "108", "206", "207", "208", "307", "308", "508", "2008", "3008", "5008", "Partner",
+                "Rifter"],
+    "Porsche": ["911", "Cayenne", "Macan", "Panamera", "Taycan"],
+    "Renault": ["Twingo", "Clio", "Megane", "Captur", "Kadjar", "Arkana", "Austral", "Scenic", "Kangoo",
+                "Zoe"],
+    "Seat": ["Ibiza", "Leon", "Arona", "Ateca", "Tarraco", "Toledo", "Altea", "Alhambra", "Mii"],
+    "Skoda": ["Fabia", "Octavia", "Superb", "Kamiq", "Karoq", "Kodiaq", "Scala", "Enyaq"],
+    "Smart": ["Fortwo", "Forfour"],
+    "Subaru": ["Impreza", "XV", "Forester", "Outback"],
+    "Suzuki": ["Swift", "Vitara", "S-Cross", "Jimny", "Ignis"],
+    "Tesla": ["Model 3", "Model Y", "Model S", "Model X"],
+    "Toyota": ["Aygo", "Aygo X", "Yaris", "Yaris Cross", "Corolla", "C-HR", "RAV4", "Prius", "Land Cruiser",
+               "Hilux", "Auris"],
+    "Volkswagen": ["Up", "Polo", "Golf", "Passat", "T-Roc", "T-Cross", "Tiguan", "Touran", "Touareg", "Arteon",
+                   "Taigo", "ID.3", "ID.4", "Caddy", "Transporter"],
+    "Volvo": ["XC40", "XC60", "XC90", "V40", "V60", "S60", "V90"],
+}
+
+# Other spellings found in titles -> canonical make
+MAKE_ALIASES = {
+    "VW": "Volkswagen",
+    "Mercedes": "Mercedes-Benz",
+    "Mercedes Benz": "Mercedes-Benz",
+    "Citroën": "Citroen",
+    "Land-Rover": "Land Rover",
+    "Alfa": "Alfa Romeo",
+}
+
+# Other spellings of models -> canonical model, per make
+MODEL_ALIASES = {
+    "Mercedes-Benz": {"A": "Clase A", "B": "Clase B", "C": "Clase C", "E": "Clase E", "S": "Clase S",
+                      "Class A": "Clase A", "Class C": "Clase C", "Class E": "Clase E"},
+    "BMW": {f"Series {n}": f"Serie {n}" for n in (1, 2, 3, 4, 5, 7)},
+    "Mazda": {"2": "Mazda2", "3": "Mazda3", "6": "Mazda6"},
+}
+
+# Models too close to ordinary words to identify a make on their own
+COMMON_WORD_MODELS = {"One", "Up", "Note", "Spring", "Seal", "Born", "Han", "Jazz", "Rio", "Scala", "Superb"}
+
+UNKNOWN = "Desconocido"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_YEAR_RE = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+_NUMBER_CHARS = str.maketrans("", "", "€. \u00a0")  # Currency, thousands separators and spaces
+_KM_CHARS = str.maketrans("", "", "., \u00a0")
+
+# Checked in order: the first pattern found in the folded text wins
+_FUEL_PATTERNS = [
+    (re.compile(r"electr|\bev\b|\bbev\b"), "electrico"),
+    (re.compile(r"hibrid|hybrid|\bphev\b|\bhev\b|enchufable"), "hibrido"),
+    (re.compile(r"diesel|gasoleo|gasoil|\btdi\b|\bhdi\b|\bdci\b"), "diesel"),
+    (re.compile(r"gasolina|benzin|petrol|\btsi\b"), "gasolina"),
+    (re.compile(r"\bgas\b|glp|gnc|lpg|cng"), "gas"),
+]
+_AUTOMATIC_RE = re.compile(r"auto|\bdsg\b|\bcvt\b")
+
+
+def fold(text: str) -> str:
+    """Lowercase without accents ("Diésel" -> "diesel")"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _fold_aligned(text: str) -> str:
+    """fold() keeping one character per character, so token spans map back to ``text``"""
+    if text.isascii():
+        return text.lower()
+    return "".join((fold(c) or " ")[0] for c in text)
+
+
+def tokens(text: str) -> List[str]:
+    """Folded word tokens ("T-Roc 1.5" -> ["t", "roc", "1", "5"])"""
+    return _TOKEN_RE.findall(_fold_aligned(unicodedata.normalize("NFC", text)))
+
+
+class TokenTrie:
+    """Longest match of known token sequences (makes, models) in a title"""
+    
+    _VALUE = object()  # Key of the value stored at the end of a sequence
+    
+    def __init__(self):
+        self.root: dict = {}
+    
+    def add(self, text: str, value):
+        node = self.root
+        for token in tokens(text):
+            node = node.setdefault(token, {})
+        node[self._VALUE] = value
+    
+    def match(self, words: Sequence[str], start: int = 0) -> Tuple[Optional[object], int]:
+        """Longest sequence starting at ``words[start]``: (value, end index) or (None, start)"""
+        node = self.root
+        found, end = None, start
+        for i in range(start, len(words)):
+            node = node.get(words[i])
+            if node is None:
+                break
+            if self._VALUE in node:
+                found, end = node[self._VALUE], i + 1
+        return found, end
+    
+    def search(self, words: Sequence[str], start: int = 0) -> Tuple[Optional[object], int, int]:
+        """First (leftmost, longest) match from ``start``: (value, start, end) or (None, -1, -1)"""
+        for i in range(start, len(words)):
+            if words[i] in self.root:
+                value, end = self.match(words, i)
+                if value is not None:
+                    return value, i, end
+        return None, -1, -1
+
+
+def _build_tries() -> Tuple[TokenTrie, Dict[str, TokenTrie], TokenTrie]:
+    makes = TokenTrie()
+    models: Dict[str, TokenTrie] = {}
+    owners: Dict[str, set] = {}
+    for make, names in MAKES.items():
+        makes.add(make, make)
+        models[make] = TokenTrie()
+        for name in names:
+            models[make].add(name, name)
+            owners.setdefault(" ".join(tokens(name)), set()).add(make)
+        for alias, name in MODEL_ALIASES.get(make, {}).items():
+            models[make].add(alias, name)
+    for alias, make in MAKE_ALIASES.items():
+        makes.add(alias, make)
+    
+    # Models of a single make identify it when the title leaves the make out ("Golf GTI")
+    lone_models = TokenTrie()
+    for make, names in MAKES.items():
+        for name in names:
+            key = " ".join(tokens(name))
+            if len(owners[key]) == 1 and not key.isdigit() and name not in COMMON_WORD_MODELS:
+                lone_models.add(name, (make, name))
+    return makes, models, lone_models
+
+
+_MAKES_TRIE, _MODEL_TRIES, _LONE_MODELS_TRIE = _build_tries()
+
+
+@lru_cache(maxsize=4096)
+def parse_price(price_text: str) -> float:
+    """Price from text ("12.500 €" -> 12500.0, "9.990,50" -> 9990.5); 0.0 if unreadable"""
+    try:
+        return float(price_text.translate(_NUMBER_CHARS).replace(",", "."))
+    except ValueError:
+        return 0.0
+
+
+@lru_cache(maxsize=4096)
+def parse_km(km_text: str) -> int:
+    """Kilometers from text ("120.000 km" -> 120000); 0 if unreadable"""
+    try:
+        return int(km_text.lower().replace("km", "").translate(_KM_CHARS))
+    except ValueError:
+        return 0
+
+
+@lru_cache(maxsize=1024)
+def parse_year(year_text: str) -> int:
+    """First plausible year in the text (19xx/20xx); 0 if none"""
+    match = _YEAR_RE.search(year_text)
+    return int(match.group()) if match else 0
+
+
+@lru_cache(maxsize=1024)
+def normalize_fuel(fuel_text: str) -> str:
+    """Canonical fuel: electrico, hibrido, diesel, gasolina, gas or otro"""
+    folded = fold(fuel_text)
+    for pattern, fuel in _FUEL_PATTERNS:
+        if pattern.search(folded):
+            return fuel
+    return "otro"
+
+
+@lru_cache(maxsize=256)
+def normalize_transmission(trans_text: str) -> str:
+    """Canonical transmission: automatico or manual"""
+    return "automatico" if _AUTOMATIC_RE.search(fold(trans_text)) else "manual"
+
+
+@lru_cache(maxsize=8192)
+def parse_title(title: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Canonical (brand, model, version) from a listing title
+    
+    The make is the first known one in the title (or implied by a model
+    only it has); the model is the longest known one after it. Unknown makes
+    and models fall back to the next word of the title, and whatever
+    follows the model is the version.
+    """
+    title = unicodedata.normalize("NFC", title).strip()
+    matches = list(_TOKEN_RE.finditer(_fold_aligned(title)))
+    words = [m.group() for m in matches]
+    if not words:
+        return UNKNOWN, UNKNOWN, None
+    
+    def rest(index: int) -> Optional[str]:
+        # Original text from the token at ``index`` on
+        if index >= len(words):
+            return None
+        return title[matches[index].start():].strip(" -,") or None
+    
+    make, _, end = _MAKES_TRIE.search(words)
+    if make is None:
+        found, _, end = _LONE_MODELS_TRIE.search(words)
+        if found is not None:
+            make, model = found
+            return make, model, rest(end)
+        # Unknown make: first word, then the next one as the model
+        raw_words = title.split()
+        model = raw_words[1] if len(raw_words) > 1 else UNKNOWN
+        return raw_words[0], model, " ".join(raw_words[2:]) or None
+    
+    trie = _MODEL_TRIES[make]
+    model, model_end = trie.match(words, end)
+    if model is None:
+        model, _, model_end = trie.search(words, end)
+    if model is None:
+        if end >= len(words):
+            return make, UNKNOWN, None
+        model, model_end = title[matches[end].start():matches[end].end()], end + 1
+    return make, model, rest(model_end)
+
+
+def _joined(values: List[str]) -> Optional[str]:
+    """The page's values one per line, or None if a value spans lines"""
+    text = "\n".join(values)
+    return text if text.count("\n") == len(values) - 1 else None
+
+
+def parse_kms(values: Iterable[str]) -> List[int]:
+    # Kilometers rarely repeat, so cleaning the whole column in one pass beats
+    # memoizing; an unreadable value sends the page through parse_km
+    values = list(values)
+    text = _joined(values)
+    if text:
+        try:
+            return list(map(int, text.lower().replace("km", "").translate(_KM_CHARS).split("\n")))
+        except ValueError:
+            pass
+    return list(map(parse_km, values))
+
+
+# Titles, prices, years, fuels and gearboxes repeat across pages: each
+# distinct value is normalized once and every other one is a cache hit
+
+def parse_prices(values: Iterable[str]) -> List[float]:
+    return list(map(parse_price, values))
+
+
+def parse_years(values: Iterable[str]) -> List[int]:
+    return list(map(parse_year, values))
+
+
+def normalize_fuels(values: Iterable[str]) -> List[str]:
+    return list(map(normalize_fuel, values))
+
+
+def normalize_transmissions(values: Iterable[str]) -> List[str]:
+    return list(map(normalize_transmission, values))
+
+
+def parse_titles(values: Iterable[str]) -> List[Tuple[str, str, Optional[str]]]:
+    return list(map(parse_title, values))
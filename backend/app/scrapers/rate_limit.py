@@ -0,0 +1,111 @@
+"""
+BusCar Rate Limiting - Per-host token buckets with adaptive rate (AIMD)
+
+Every request a scraper sends through ``BaseScraper.fetch`` first takes a
+token from its host's bucket. The bucket's rate grows a little after each
+success and is halved when the portal throttles (429) or its recent error
+rate climbs - at most once per second, so a burst of errors counts as one -
+within configured bounds. A ``Retry-After`` pauses the whole host, not just
+the request that got it.
+
+Limiters are process-wide, so concurrent runs against the same portal share
+its budget.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from app.config import settings
+
+# Weight of the latest request in the moving error rate
+ERROR_RATE_WEIGHT = 0.1
+
+
+class HostLimiter:
+    """Token bucket for one host whose rate adapts to the responses"""
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.error_rate = 0.0  # Moving average of failed requests
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        """Wait for a token (tokens are reserved, so waiters queue up fairly)"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            await asyncio.sleep(self.paused_until - now)
+            now = time.monotonic()
+        
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+    
+    def pause(self, seconds: float):
+        """Hold every request to this host for ``seconds`` (Retry-After)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+    
+    def record_success(self):
+        """Additive increase while the error rate is low"""
+        self.error_rate *= 1 - ERROR_RATE_WEIGHT
+        if self.error_rate < settings.scrape_error_rate_threshold:
+            self.rate = min(settings.scrape_rate_max, self.rate + settings.scrape_rate_increase)
+    
+    def record_failure(self, throttled: bool = False):
+        """
+        Multiplicative decrease on throttling or a high error rate, once per
+        second at most (a burst of failures counts as one)
+        """
+        self.error_rate = self.error_rate * (1 - ERROR_RATE_WEIGHT) + ERROR_RATE_WEIGHT
+        if not throttled and self.error_rate < settings.scrape_error_rate_threshold:
+            return
+        now = time.monotonic()
+        if now - self.last_decrease >= 1.0:
+            self.rate = max(settings.scrape_rate_min, self.rate / 2)
+            self.last_decrease = now
+
+
+class RateLimiters:
+    """Registry of the per-host limiters"""
+    
+    def __init__(self):
+        self._hosts: Dict[str, HostLimiter] = {}
+    
+    def for_url(self, url: str) -> HostLimiter:
+        host = urlsplit(url).netloc or url
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = HostLimiter(settings.scrape_rate_per_host, settings.scrape_rate_burst)
+            self._hosts[host] = limiter
+        return limiter
+
+
+# Singleton instance
+rate_limiters = RateLimiters()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
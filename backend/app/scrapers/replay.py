@@ -0,0 +1,131 @@
+"""
+BusCar Scraper Replay - Recorded HTTP fixtures for offline scraper runs
+
+A cassette is a JSON file of recorded request/response pairs (API JSON or
+HTML pages alike). ``RecordingTransport`` wraps a real transport and records
+what a scraper fetches; ``ReplayTransport`` serves the cassette back through
+httpx, so any ``BaseScraper`` subclass can run without network:
+
+    scraper = WallapopScraper(transport=Cassette.load(path).replay())
+
+Requests match on method, path and query string (not the host), so a
+cassette recorded against a portal also serves a scraper pointed elsewhere.
+Unmatched requests get a 404 and are listed in ``ReplayTransport.misses``.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+import httpx
+
+# Response headers worth keeping (the rest describe the original connection)
+RECORDED_HEADERS = {"content-type", "etag", "x-nextpage", "retry-after"}
+
+
+def request_key(method: str, url: httpx.URL) -> Tuple[str, str, str]:
+    """Match key of a request: method, path and normalised query"""
+    query = urlencode(sorted(parse_qsl(url.query.decode(), keep_blank_values=True)))
+    return method.upper(), url.path, query
+
+
+class Cassette:
+    """Recorded request/response pairs"""
+    
+    def __init__(self, interactions: Optional[List[dict]] = None):
+        self.interactions = interactions or []
+    
+    @classmethod
+    def load(cls, path) -> "Cassette":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["interactions"])
+    
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"interactions": self.interactions}, f, ensure_ascii=False, indent=1)
+    
+    def add(self, method: str, url: str, status: int = 200, body: str = "",
+            headers: Optional[Dict[str, str]] = None):
+        """Add an interaction by hand (e.g. to build a fixture)"""
+        self.interactions.append({
+            "request": {"method": method.upper(), "url": url},
+            "response": {"status": status, "headers": headers or {}, "body": body},
+        })
+    
+    def replay(self) -> "ReplayTransport":
+        return ReplayTransport(self)
+    
+    def record(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> "RecordingTransport":
+        return RecordingTransport(self, transport)
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves a cassette; the same request can be replayed any number of times"""
+    
+    def __init__(self, cassette: Cassette):
+        self.responses: Dict[Tuple[str, str, str], dict] = {}
+        for interaction in cassette.interactions:
+            request = interaction["request"]
+            key = request_key(request["method"], httpx.URL(request["url"]))
+            self.responses.setdefault(key, interaction["response"])
+        self.requests = 0
+        self.misses: List[str] = []
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        response = self.responses.get(request_key(request.method, request.url))
+        if response is None:
+            self.misses.append(f"{request.method} {request.url}")
+            return httpx.Response(404, text="Not in cassette", request=request)
+        return httpx.Response(
+            response["status"],
+            headers=response["headers"],
+            content=response["body"].encode("utf-8"),
+            request=request,
+        )
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards requests to a real transport and adds each exchange to a cassette"""
+    
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.AsyncHTTPTransport()
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        body = await response.aread()
+        await response.aclose()
+        
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() in RECORDED_HEADERS}
+        self.cassette.add(request.method, str(request.url), response.status_code,
+                          body.decode(response.encoding or "utf-8", errors="replace"), headers)
+        # aread() undid any gzip/br encoding, so the header isn't passed on
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+    
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+async def record_source(source: str, path, max_cars: int = 200) -> int:
+    """
+    Scrape a live source once and save everything it fetched as a cassette
+    
+    Returns:
+        Number of cars the recorded run produced
+    """
+    from app.scrapers import get_scraper
+    
+    scraper = get_scraper(source)
+    if scraper is None:
+        raise ValueError(f"No scraper available for {source}")
+    
+    cassette = Cassette()
+    scraper.transport = cassette.record()
+    count = 0
+    async with scraper:
+        async for _ in scraper.iter_cars(max_cars=max_cars):
+            count += 1
+    cassette.save(path)
+    return count
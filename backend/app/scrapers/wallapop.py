@@ -2,9 +2,22 @@
 BusCar Wallapop Scraper
 Note: Wallapop uses an API, so we can scrape it without browser
 """
-from typing import List, Optional
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+from collections import deque
+from urllib.parse import parse_qsl
+from datetime import datetime
+import asyncio
 import json
-from app.scrapers.base import BaseScraper, ScrapedCar
+import re
+from app.config import settings
+from app.scrapers import normalize
+from app.scrapers.base import BaseScraper, HighWaterMark, ScrapedCar
+
+
+def _first_int(value) -> Optional[int]:
+    """First whole number in an attribute value ("150 CV" -> 150)"""
+    match = re.search(r"\d+", str(value or ""))
+    return int(match.group()) if match else None
 
 
 class WallapopScraper(BaseScraper):
@@ -16,117 +29,270 @@ class WallapopScraper(BaseScraper):
     # Wallapop category ID for cars
     CARS_CATEGORY_ID = "100"
     
-    async def scrape(self, max_cars: int = 100, **filters) -> List[ScrapedCar]:
+    # Pages of the current run that came back with an error status
+    failed_pages = 0
+    
+    async def iter_cars(self, max_cars: int = 100, since: Optional[HighWaterMark] = None,
+                        **filters) -> AsyncIterator[ScrapedCar]:
         """
-        Scrape car listings from Wallapop
+        Scrape car listings from Wallapop, following the result pages
+        
+        The next page comes from the ``X-NextPage`` header or ``meta.next_page``
+        token when the API sends one (then the following page is fetched while
+        the current one is consumed). Otherwise pages are requested by
+        ``step``, up to ``scrape_page_concurrency`` at a time. Stops at
+        ``max_cars``, at the last page or when ``scrape_time_budget_seconds``
+        runs out.
+        
+        Results are sorted by newest, so with ``since`` (incremental run) the
+        first page is requested with the previous ETag - a 304 means nothing
+        changed - and the scrape stops after ``incremental_overlap`` listings
+        in a row that are already known.
         
         Note: This is a simplified example. Wallapop's API may require
         authentication or have anti-scraping measures.
         """
+        borrowed = self.http_client is None  # Not already set up by ``async with``
         await self.setup()
-        cars = []
+        self.high_water = HighWaterMark()
+        self.reached_end = False
+        self.failed_pages = 0
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.scrape_time_budget_seconds
+        pending: Deque[asyncio.Task] = deque()
+        yielded = 0
+        known_in_a_row = 0
         
         try:
-            # Build search URL
-            params = {
-                "category_ids": self.CARS_CATEGORY_ID,
-                "filters_source": "search_box",
-                "latitude": 40.4168,  # Madrid
-                "longitude": -3.7038,
-                "order_by": "newest",
-                "step": 0,
-            }
-            
-            # Apply filters
-            if filters.get("brand"):
-                params["keywords"] = filters["brand"]
-            if filters.get("max_price"):
-                params["max_sale_price"] = filters["max_price"]
-            if filters.get("min_price"):
-                params["min_sale_price"] = filters["min_price"]
+            params = self._search_params(filters)
+            etag = since.etag if since else None
+            pending.append(asyncio.create_task(self._fetch_page(params, first_page=True, etag=etag)))
+            by_token = False
+            next_step = 1
+            exhausted = False
             
-            # Make request
-            url = f"{self.base_url}/api/v3/general/search"
-            response = await self.http_client.get(url, params=params)
-            
-            if response.status_code != 200:
-                print(f"Wallapop API error: {response.status_code}")
-                return cars
-            
-            data = response.json()
-            items = data.get("search_objects", [])[:max_cars]
-            
-            for item in items:
+            while pending and yielded < max_cars:
+                remaining = deadline - loop.time()
                 try:
-                    car = self._parse_item(item)
-                    if car:
-                        cars.append(car)
-                except Exception as e:
-                    print(f"Error parsing Wallapop item: {e}")
+                    items, next_params = await asyncio.wait_for(pending.popleft(), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    print(f"Wallapop: time budget reached after {yielded} cars")
+                    break
+                
+                if items is None:
+                    print("Wallapop: first page not modified, no new listings")
+                    break
+                if not items:
+                    # Step pages come back in order, so every earlier listing was handed out
+                    exhausted = self.reached_end = True
                     continue
-            
+                
+                cars = self._parse_items(items)
+                reached_known = any(self.is_known(car, since) for car in cars)
+                
+                # Queue the following pages before handing out this one's cars
+                by_token = by_token or next_params is not None
+                still_needed = max_cars - yielded - len(items)
+                if still_needed <= 0 or reached_known:
+                    pass
+                elif by_token:
+                    # Without a token this was the last page
+                    if next_params is not None and not pending:
+                        pending.append(asyncio.create_task(self._fetch_page(next_params)))
+                elif not exhausted:
+                    pages_left = -(-still_needed // len(items))
+                    while len(pending) < min(settings.scrape_page_concurrency, pages_left):
+                        step_params = {**params, "step": next_step}
+                        pending.append(asyncio.create_task(self._fetch_page(step_params)))
+                        next_step += 1
+                
+                for car in cars:
+                    if yielded >= max_cars:
+                        break
+                    if self.is_known(car, since):
+                        known_in_a_row += 1
+                        if known_in_a_row > settings.incremental_overlap:
+                            print(f"Wallapop: reached known listings after {yielded} cars")
+                            return
+                    else:
+                        known_in_a_row = 0
+                    self.track_newest(car)
+                    yielded += 1
+                    yield car
+                
+                if by_token and next_params is None and yielded < max_cars:
+                    self.reached_end = True  # Last page, handed out in full
+        
         except Exception as e:
             print(f"Wallapop scraping error: {e}")
+            self.reached_end = False
         finally:
-            await self.cleanup()
+            if self.failed_pages:
+                self.reached_end = False  # An empty page may have been an error
+            for task in pending:
+                task.cancel()
+            if borrowed:
+                await self.cleanup()
+    
+    def _search_params(self, filters: dict) -> dict:
+        """Query parameters of the first search page"""
+        params = {
+            "category_ids": self.CARS_CATEGORY_ID,
+            "filters_source": "search_box",
+            "latitude": 40.4168,  # Madrid
+            "longitude": -3.7038,
+            "order_by": "newest",
+            "step": 0,
+        }
         
-        return cars
+        # Apply filters
+        if filters.get("brand"):
+            params["keywords"] = filters["brand"]
+        if filters.get("max_price"):
+            params["max_sale_price"] = filters["max_price"]
+        if filters.get("min_price"):
+            params["min_sale_price"] = filters["min_price"]
+        
+        return params
+    
+    async def _fetch_page(self, params: dict, first_page: bool = False,
+                          etag: Optional[str] = None) -> Tuple[Optional[List[dict]], Optional[dict]]:
+        """
+        Fetch one search page
+        
+        The first page is sent as a conditional request when ``etag`` is
+        given, and its ETag is kept in the high-water mark.
+        
+        Returns:
+            (items, params of the next page if the API sent a next-page token);
+            items is None if the first page wasn't modified
+        """
+        url = f"{self.base_url}/api/v3/general/search"
+        headers = {"If-None-Match": etag} if etag else None
+        response = await self.fetch("GET", url, params=params, headers=headers)
+        
+        if first_page:
+            self.high_water.etag = response.headers.get("ETag") or etag
+            if response.status_code == 304:
+                return None, None
+        
+        if response.status_code != 200:
+            print(f"Wallapop API error: {response.status_code}")
+            self.failed_pages += 1
+            return [], None
+        
+        data = response.json()
+        return data.get("search_objects", []), self._next_page_params(response, data)
+    
+    def _next_page_params(self, response, data: dict) -> Optional[dict]:
+        """Next-page token from the X-NextPage header or the body's meta"""
+        next_page = response.headers.get("X-NextPage")
+        if next_page:
+            # The header is the complete query string of the next page
+            return dict(parse_qsl(next_page))
+        
+        token = (data.get("meta") or {}).get("next_page")
+        if token:
+            return {"next_page": token}
+        return None
     
     def _parse_item(self, item: dict) -> Optional[ScrapedCar]:
         """Parse a Wallapop item into ScrapedCar"""
-        try:
-            # Extract basic info
-            item_id = item.get("id", "")
-            title = item.get("title", "")
-            price = float(item.get("price", 0))
-            
-            # Parse brand and model from title
-            # This is simplified - real implementation would need better parsing
-            parts = title.split(" ", 1)
-            brand = parts[0] if parts else "Desconocido"
-            model = parts[1] if len(parts) > 1 else "Desconocido"
-            
-            # Get attributes
-            attrs = {a.get("title", ""): a.get("value", "") for a in item.get("attributes", [])}
-            
-            # Extract car details from attributes
-            year = self.parse_year(attrs.get("year", "2020"))
-            km = self.parse_km(attrs.get("km", "0"))
-            fuel = self.normalize_fuel(attrs.get("fuel", "gasolina"))
-            transmission = self.normalize_transmission(attrs.get("gearbox", "manual"))
-            
-            # Location
-            location = item.get("location", {})
-            city = location.get("city", "España")
-            
-            # Image
-            images = item.get("images", [])
-            image_url = images[0].get("medium") if images else None
-            
-            return ScrapedCar(
-                external_id=f"wallapop-{item_id}",
-                source="wallapop",
-                url=f"https://es.wallapop.com/item/{item_id}",
-                brand=brand,
-                model=model,
-                year=year,
-                price=price,
-                km=km,
-                fuel=fuel,
-                transmission=transmission,
-                location=city,
-                image_url=image_url,
-                images=json.dumps([img.get("original") for img in images]) if images else None,
-                seller_type="particular",
-                negotiable=item.get("flags", {}).get("negotiable", False)
-            )
-            
-        except Exception as e:
-            print(f"Error parsing Wallapop item: {e}")
-            return None
+        cars = self._parse_items([item])
+        return cars[0] if cars else None
+    
+    def _parse_items(self, items: List[dict]) -> List[ScrapedCar]:
+        """
+        Parse a page of Wallapop items into ScrapedCars
+        
+        The raw strings of the whole page are normalized together (see
+        app.scrapers.normalize); brand, model and version come from the title.
+        Items that can't be parsed are skipped.
+        """
+        raw = []
+        for item in items:
+            try:
+                attrs = {a.get("title", ""): str(a.get("value", "")) for a in item.get("attributes", [])}
+                raw.append((item, attrs))
+            except Exception as e:
+                print(f"Error parsing Wallapop item: {e}")
+        
+        # Normalize each field for the whole page at once
+        titles = normalize.parse_titles(str(item.get("title", "")) for item, _ in raw)
+        years = normalize.parse_years(attrs.get("year", "2020") for _, attrs in raw)
+        kms = normalize.parse_kms(attrs.get("km", "0") for _, attrs in raw)
+        fuels = normalize.normalize_fuels(attrs.get("fuel", "gasolina") for _, attrs in raw)
+        transmissions = normalize.normalize_transmissions(attrs.get("gearbox", "manual") for _, attrs in raw)
+        
+        cars = []
+        for (item, attrs), (brand, model, version), year, km, fuel, transmission in zip(
+            raw, titles, years, kms, fuels, transmissions
+        ):
+            try:
+                item_id = item.get("id", "")
+                
+                # Publication time (epoch milliseconds)
+                created = item.get("creation_date") or item.get("created_at")
+                published_at = datetime.utcfromtimestamp(created / 1000) if created else None
+                
+                # Image
+                images = item.get("images", [])
+                image_url = images[0].get("medium") if images else None
+                
+                cars.append(ScrapedCar(
+                    external_id=f"wallapop-{item_id}",
+                    source="wallapop",
+                    url=f"https://es.wallapop.com/item/{item_id}",
+                    brand=brand,
+                    model=model,
+                    version=version,
+                    year=year,
+                    price=float(item.get("price", 0)),
+                    km=km,
+                    fuel=fuel,
+                    transmission=transmission,
+                    location=item.get("location", {}).get("city", "España"),
+                    image_url=image_url,
+                    images=json.dumps([img.get("original") for img in images]) if images else None,
+                    seller_type="particular",
+                    negotiable=item.get("flags", {}).get("negotiable", False),
+                    published_at=published_at
+                ))
+            except Exception as e:
+                print(f"Error parsing Wallapop item: {e}")
+        return cars
     
     async def scrape_detail(self, url: str) -> Optional[ScrapedCar]:
-        """Scrape detailed information from a Wallapop listing"""
+        """
+        Scrape detailed information from a Wallapop listing
+        
+        The item endpoint returns the search fields plus the description,
+        extras and the attributes missing from search results (power,
+        doors, colour, body type, version).
+        
+        Returns:
+            The car, or None if the listing no longer exists. Other errors raise
+            (so they aren't cached as "no listing").
+        """
         # Extract item ID from URL
-        # Real implementation would fetch full details
-        return None
+        item_id = url.rstrip("/").rsplit("/", 1)[-1]
+        response = await self.fetch("GET", f"{self.base_url}/api/v3/items/{item_id}")
+        if response.status_code in (404, 410):
+            return None
+        response.raise_for_status()
+        
+        item = response.json()
+        car = self._parse_item(item)
+        if car is None:
+            return None
+        
+        attrs = {a.get("title", ""): a.get("value", "") for a in item.get("attributes", [])}
+        car.description = item.get("description") or None
+        car.features = json.dumps(item["extras"], ensure_ascii=False) if item.get("extras") else None
+        car.version = attrs.get("version") or car.version
+        car.power = _first_int(attrs.get("horse_power"))
+        car.doors = _first_int(attrs.get("num_doors"))
+        car.color = attrs.get("color") or None
+        car.body_type = attrs.get("body_type") or None
+        car.seller_name = (item.get("user") or {}).get("micro_name") or None
+        return car
@@ -0,0 +1,13 @@
+"""
+BusCar Batching - Splitting bulk statements into chunks
+"""
+from typing import Iterator, List, Sequence
+
+# Rows per statement, keeps every statement under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def chunks(items: Sequence, size: int = CHUNK_SIZE) -> Iterator[List]:
+    """Consecutive slices of ``items`` with at most ``size`` elements"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
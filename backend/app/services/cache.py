@@ -0,0 +1,65 @@
+"""
+BusCar Result Cache - Small LRU caches bound to the dataset version
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.config import settings
+from app.services.dataset import dataset_version
+
+
+class VersionedCache:
+    """
+    LRU cache whose entries are dropped when the dataset version changes
+    
+    The version is re-read from the database by the HTTP cache check of the
+    same request, so bumps from other processes drop the entries too.
+    Entries also expire after ``ttl`` seconds, which bounds staleness for
+    writes that don't bump the version.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._version = dataset_version.value
+    
+    def _check_version(self):
+        if self._version != dataset_version.value:
+            self._entries.clear()
+            self._version = dataset_version.value
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        self._check_version()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any):
+        self._check_version()
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+
+
+# Result counts for /api/cars keyed by the normalised filter signature
+count_cache = VersionedCache(settings.count_cache_size, settings.count_cache_ttl_seconds)
+
+# Sidebar facet counts for /api/cars/facets keyed by the same signature
+facet_cache = VersionedCache(settings.count_cache_size, settings.count_cache_ttl_seconds)
+
+# Active brand -> models catalogue for /api/brands (a single entry)
+catalog_cache = VersionedCache(1, settings.count_cache_ttl_seconds)
@@ -0,0 +1,91 @@
+"""
+BusCar Dataset Version - Tracks changes to the active car inventory
+
+The scraping ingest bumps the version whenever cars are added, updated or
+deactivated. Caches derived from the inventory are keyed on it, so they are
+invalidated by a bump instead of by scanning for changes.
+
+The version lives in the ``dataset_state`` row, so a bump made by another
+worker or process (the scheduler, ``seed.py``) reaches every worker: each
+one re-reads the row at most every ``dataset_version_poll_seconds``.
+"""
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models import DatasetState
+
+
+class DatasetVersion:
+    """This process's copy of the inventory version stored in ``dataset_state``"""
+    
+    def __init__(self):
+        self.counter = 0
+        self.updated_at = datetime.utcnow()
+        self._checked_at: Optional[float] = None  # Last read of the row (monotonic)
+    
+    @property
+    def value(self) -> str:
+        # The timestamp keeps versions of a recreated database distinct
+        return f"{self.counter}.{self.updated_at.isoformat()}"
+    
+    def _set(self, counter: int, updated_at: datetime):
+        self.counter, self.updated_at = counter, updated_at
+        self._checked_at = time.monotonic()
+    
+    async def bump(self, db: AsyncSession) -> str:
+        """Mark the inventory as changed (committed with the caller's transaction)"""
+        now = datetime.utcnow()
+        stmt = insert(DatasetState).values(id=1, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DatasetState.id],
+            set_={"version": DatasetState.version + 1, "updated_at": now},
+        ).returning(DatasetState.version)
+        self._set((await db.execute(stmt)).scalar(), now)
+        return self.value
+    
+    async def refresh(self) -> str:
+        """Pick up bumps made by other processes (reads the row at most every poll interval)"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < settings.dataset_version_poll_seconds:
+            return self.value
+        self._checked_at = now  # Concurrent requests don't read it again
+        
+        async with async_session() as db:
+            row = (await db.execute(
+                select(DatasetState.version, DatasetState.updated_at).where(DatasetState.id == 1)
+            )).first()
+            if row is None:
+                # First start: every worker must agree on version 0
+                await db.execute(insert(DatasetState).values(
+                    id=1, version=0, updated_at=self.updated_at
+                ).on_conflict_do_nothing())
+                await db.commit()
+                row = (await db.execute(
+                    select(DatasetState.version, DatasetState.updated_at).where(DatasetState.id == 1)
+                )).first()
+        self._set(row.version, row.updated_at)
+        return self.value
+
+
+# Singleton instance
+dataset_version = DatasetVersion()
+
+
+async def inventory_changed(db: AsyncSession, car_ids: Iterable[int]):
+    """
+    Publish committed changes to the given cars
+    
+    Bumps the dataset version and patches the in-memory listing index.
+    """
+    from app.services.listing_index import listing_index
+    
+    version = await dataset_version.bump(db)
+    counter = dataset_version.counter
+    await db.commit()
+    await listing_index.apply_changes(db, car_ids, counter, version)
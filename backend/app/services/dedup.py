@@ -0,0 +1,300 @@
+"""
+BusCar Dedup Service - Clusters of the same car listed on several portals
+
+The same car is often listed on wallapop, coches.net and milanuncios. Each
+copy stays a separate ``Car`` row; copies share a ``cluster_id`` (the
+smallest car id of the cluster, NULL for a car without known copies) so
+/api/cars can show one row per car (``collapse=true``).
+
+Candidates come from locality-sensitive hashing instead of comparing pairs:
+each car is hashed into a few band keys, stored in ``car_bands``:
+
+- one key of make, model and year with the km and price bands (two
+  tolerances wide, log scale); a lookup probes the car's bands and, in
+  each, the neighbour on the side its value is nearer, so two values within
+  tolerance always meet with a single stored row per car
+- the four 16-bit quarters of the image perceptual hash, when known (the
+  image proxy sets it when it first fetches a car's photo; hashes up to 3
+  bits apart share a quarter)
+
+A candidate is a copy when it's active, comes from another source, has the
+same make, model and year, price and km within tolerance, and the same
+location or a similar image. Copies are merged with union-find.
+
+``cluster_cars`` runs on the cars each ingest batch added or changed: it
+only reads the band buckets they fall in and the clusters those touch, so
+the work grows with the batch, not with the inventory. Only the band rows
+that differ are rewritten, so a price change within its band writes none. A
+car that changes is checked again on its own; the rest of its former
+cluster stays together.
+A cluster holds at most one listing per portal.
+"""
+import hashlib
+import math
+from typing import Dict, Iterable, List, Set, Tuple
+from sqlalchemy import select, delete, insert, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Car, CarBand
+from app.scrapers.normalize import fold
+from app.services.batching import chunks
+
+# Offsets keeping the log scales finite for 0 km / unknown prices
+KM_OFFSET = 5000
+PRICE_OFFSET = 500
+
+# Image hashes further apart than this are different cars
+IMAGE_MAX_DISTANCE = 6
+
+_FEATURE_COLUMNS = [Car.id, Car.source, Car.brand, Car.model, Car.year, Car.km, Car.price,
+                    Car.location, Car.image_hash, Car.cluster_id, Car.is_active]
+
+
+def _key(*parts) -> int:
+    """Stable signed 64-bit key of a band"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _bands(value: float, offset: float, tolerance: float):
+    """
+    Band of a value (log scale, two tolerances wide) and the neighbour band a
+    value within tolerance can fall in: the one on the nearer side
+    """
+    position = math.log(max(value or 0, 0) + offset) / (2 * math.log1p(tolerance))
+    band = math.floor(position)
+    return band, band + 1 if position - band >= 0.5 else band - 1
+
+
+def _image_keys(car: dict) -> List[int]:
+    if not car["image_hash"]:
+        return []
+    return [_key("image", i, car["image_hash"][i * 4:(i + 1) * 4]) for i in range(4)]
+
+
+def band_keys(car: dict) -> Tuple[List[int], List[int]]:
+    """
+    LSH band keys of a car (see the module docstring)
+    
+    Returns:
+        (keys stored for the car, keys a copy of it may be stored under)
+    """
+    brand, model = fold(car["brand"] or ""), fold(car["model"] or "")
+    km_bands = _bands(car["km"], KM_OFFSET, settings.dedup_km_tolerance)
+    price_bands = _bands(car["price"], PRICE_OFFSET, settings.dedup_price_tolerance)
+    # The car's own bands come first
+    probes = [_key("car", brand, model, car["year"], k, p) for k in km_bands for p in price_bands]
+    image_keys = _image_keys(car)
+    return [probes[0], *image_keys], probes + image_keys
+
+
+def _close(a: float, b: float, offset: float, tolerance: float) -> bool:
+    return abs(math.log(max(a or 0, 0) + offset) - math.log(max(b or 0, 0) + offset)) <= math.log1p(tolerance)
+
+
+def image_distance(a: str, b: str) -> int:
+    """Hamming distance of two hex image hashes"""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def is_duplicate(a: dict, b: dict) -> bool:
+    """Whether two listings are the same car on different portals"""
+    if a["source"] == b["source"] or not (a["is_active"] and b["is_active"]):
+        return False
+    if (fold(a["brand"] or ""), fold(a["model"] or ""), a["year"]) != \
+            (fold(b["brand"] or ""), fold(b["model"] or ""), b["year"]):
+        return False
+    if not _close(a["km"], b["km"], KM_OFFSET, settings.dedup_km_tolerance):
+        return False
+    if not _close(a["price"], b["price"], PRICE_OFFSET, settings.dedup_price_tolerance):
+        return False
+    
+    if a["image_hash"] and b["image_hash"]:
+        return image_distance(a["image_hash"], b["image_hash"]) <= IMAGE_MAX_DISTANCE
+    return bool(a["location"]) and fold(a["location"]) == fold(b["location"] or "")
+
+
+class UnionFind:
+    """Disjoint sets of car ids, each represented by its smallest id, with the sources they span"""
+    
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+        self.sources: Dict[int, Set[str]] = {}
+    
+    def add(self, item: int, source: str):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.sources[item] = {source}
+    
+    def find(self, item: int) -> int:
+        parent = self.parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent  # Path halving
+            item, parent = grandparent, self.parent[grandparent]
+        return item
+    
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            root, child = min(root_a, root_b), max(root_a, root_b)
+            self.parent[child] = root
+            self.sources[root] |= self.sources.pop(child)
+    
+    def can_join(self, a: int, b: int) -> bool:
+        """Whether a and b are in different sets with no source in common"""
+        root_a, root_b = self.find(a), self.find(b)
+        return root_a != root_b and not (self.sources[root_a] & self.sources[root_b])
+
+
+async def _features(db: AsyncSession, condition_column, values: list) -> Dict[int, dict]:
+    features = {}
+    for chunk in chunks(values):
+        result = await db.execute(select(*_FEATURE_COLUMNS).where(condition_column.in_(chunk)))
+        for row in result.mappings():
+            features[row["id"]] = dict(row)
+    return features
+
+
+async def cluster_cars(db: AsyncSession, car_ids: Iterable[int]) -> List[int]:
+    """
+    (Re)cluster the given cars against the inventory (without committing)
+    
+    Their band keys are updated, the cars stored under their probe keys are
+    checked with ``is_duplicate``, and the clusters are merged.
+    
+    Returns:
+        Ids of the cars whose cluster_id changed (publish them with ``inventory_changed``)
+    """
+    batch = await _features(db, Car.id, list(dict.fromkeys(car_ids)))
+    if not batch:
+        return []
+    batch_ids = list(batch)
+    
+    # Rewrite only the band rows that changed (none for a new car yet)
+    conn = await db.connection()
+    stored_rows = set()
+    for chunk in chunks(batch_ids):
+        result = await conn.execute(
+            select(CarBand.band_key, CarBand.car_id).where(CarBand.car_id.in_(chunk))
+        )
+        stored_rows.update(result.all())
+    keys = {car_id: band_keys(car) for car_id, car in batch.items()}
+    band_rows = {(key, car_id) for car_id, (stored, _) in keys.items() for key in stored}
+    
+    table = CarBand.__table__
+    removed = [{"key": key, "car": car_id} for key, car_id in stored_rows - band_rows]
+    stmt = delete(table).where(table.c.band_key == bindparam("key"), table.c.car_id == bindparam("car"))
+    for chunk in chunks(removed):
+        await conn.execute(stmt, chunk)
+    added = [{"band_key": key, "car_id": car_id} for key, car_id in band_rows - stored_rows]
+    for chunk in chunks(added):
+        await conn.execute(insert(table), chunk)
+    
+    # Cars stored under the batch's probe keys (including the batch itself)
+    buckets: Dict[int, Set[int]] = {}
+    all_keys = list({key for _, probes in keys.values() for key in probes})
+    for chunk in chunks(all_keys):
+        result = await db.execute(select(CarBand.band_key, CarBand.car_id).where(CarBand.band_key.in_(chunk)))
+        for key, car_id in result.all():
+            buckets.setdefault(key, set()).add(car_id)
+    
+    candidates = {car_id for bucket in buckets.values() for car_id in bucket} - set(batch_ids)
+    features = dict(batch)
+    features.update(await _features(db, Car.id, list(candidates)))
+    
+    # Members of every cluster involved, to relabel them consistently
+    labels = [car["cluster_id"] for car in features.values() if car["cluster_id"] is not None]
+    stored = {car_id: car["cluster_id"] for car_id, car in features.items()}
+    members = await _features(db, Car.cluster_id, list(set(labels)))
+    for car_id, car in members.items():
+        stored.setdefault(car_id, car["cluster_id"])
+        features.setdefault(car_id, car)
+    
+    # The batch cars leave their clusters; the other members stay together
+    sets = UnionFind()
+    first_member: Dict[int, int] = {}
+    for car_id, label in stored.items():
+        sets.add(car_id, features[car_id]["source"])
+        if label is None or car_id in batch:
+            continue
+        if label in first_member:
+            sets.union(car_id, first_member[label])
+        else:
+            first_member[label] = car_id
+    
+    # Link each batch car to the verified copies in its buckets (a cluster
+    # holds one listing per portal: identical cars of one dealer stay apart)
+    for car_id in batch_ids:
+        car = batch[car_id]
+        for key in keys[car_id][1]:
+            for other_id in buckets.get(key, ()):
+                if sets.can_join(car_id, other_id) and is_duplicate(car, features[other_id]):
+                    sets.union(car_id, other_id)
+    
+    # Label = smallest id of the cluster, NULL for a car on its own
+    sizes: Dict[int, int] = {}
+    for car_id in stored:
+        root = sets.find(car_id)
+        sizes[root] = sizes.get(root, 0) + 1
+    changes = []
+    for car_id, label in stored.items():
+        root = sets.find(car_id)
+        new_label = root if sizes[root] > 1 else None
+        if new_label != label:
+            changes.append({"car_id": car_id, "cluster_id": new_label})
+    
+    stmt = (
+        update(Car.__table__)
+        .where(Car.__table__.c.id == bindparam("car_id"))
+        .values(cluster_id=bindparam("cluster_id"))
+    )
+    for chunk in chunks(changes):
+        await conn.execute(stmt, chunk)
+    return [change["car_id"] for change in changes]
+
+
+async def set_image_hash(db: AsyncSession, car_id: int, image_hash: str) -> List[int]:
+    """
+    Store the perceptual hash of a car's main photo and recluster it (without committing)
+    
+    Returns:
+        Ids of the cars whose cluster_id changed
+    """
+    result = await db.execute(
+        update(Car).where(Car.id == car_id, Car.image_hash.is_distinct_from(image_hash))
+        .values(image_hash=image_hash)
+    )
+    if not result.rowcount or not settings.dedup_enabled:
+        return []
+    return await cluster_cars(db, [car_id])
+
+
+async def ensure_clusters(db: AsyncSession, chunk_size: int = 2000) -> int:
+    """
+    Cluster the active cars that have no band keys yet (e.g. an existing database)
+    
+    Returns:
+        Number of cars clustered
+    """
+    if not settings.dedup_enabled:
+        return 0
+    
+    done = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Car.id)
+            .where(Car.is_active == True, Car.id > last_id,
+                   ~select(CarBand.car_id).where(CarBand.car_id == Car.id).exists())
+            .order_by(Car.id)
+            .limit(chunk_size)
+        )
+        ids = list(result.scalars())
+        if not ids:
+            return done
+        await cluster_cars(db, ids)
+        await db.commit()
+        done += len(ids)
+        last_id = ids[-1]
@@ -0,0 +1,57 @@
+"""
+BusCar Enrichment Service - Detail pages for new and changed listings
+
+Search results lack the description, extras and some specs (power, doors,
+colour...). After each ingest batch is committed, the cars it added or
+changed get their detail pages scraped with one ``scrape_details`` call
+(concurrent, de-duplicated, cached) and the fields the details add are
+written back (ENRICH_FIELDS; enrichment never erases a stored value, and
+later search results don't overwrite them). Unchanged listings are never fetched again, so the cost
+follows the market's churn rather than the size of the inventory.
+"""
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Car
+from app.services.batching import chunks
+from app.services.ingest import ENRICH_FIELDS, update_rows
+
+if TYPE_CHECKING:
+    from app.scrapers.base import BaseScraper
+
+
+async def enrich_cars(db: AsyncSession, scraper: "BaseScraper", car_ids: List[int]) -> List[int]:
+    """
+    Scrape the detail pages of the given cars and store what they add (without committing)
+    
+    Returns:
+        Ids of the cars that got new values (publish them with ``inventory_changed``)
+    """
+    columns = [Car.__table__.c[name] for name in ENRICH_FIELDS]
+    rows = []
+    for chunk in chunks(car_ids):
+        result = await db.execute(select(Car.id, Car.url, *columns).where(Car.id.in_(chunk)))
+        rows += result.all()
+    if not rows:
+        return []
+    
+    details = await scraper.scrape_details(row.url for row in rows)
+    
+    updates: Dict[tuple, List[dict]] = defaultdict(list)
+    enriched = []
+    for row in rows:
+        detail = details.get(row.url)
+        if detail is None:
+            continue
+        values = {
+            name: getattr(detail, name) for name in ENRICH_FIELDS
+            if getattr(detail, name) is not None and getattr(detail, name) != getattr(row, name)
+        }
+        if values:
+            updates[tuple(sorted(values))].append({"car_id": row.id, **values})
+            enriched.append(row.id)
+    
+    await update_rows(db, updates)
+    return enriched
@@ -0,0 +1,90 @@
+"""
+BusCar HTTP Cache - Conditional requests and Cache-Control for read endpoints
+
+Validators come from the dataset version (shared through the database by
+all workers), so they only change when the scraping ingest changes the
+inventory. A request whose validator still
+matches gets a 304 before the endpoint touches the database.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+from fastapi import Request, Response
+
+from app.config import settings
+from app.services.dataset import dataset_version
+
+
+class CacheCheck:
+    """Result of checking a request's validators"""
+    
+    def __init__(self, headers: Dict[str, str], not_modified: bool):
+        self.headers = headers
+        self.not_modified = not_modified
+    
+    def not_modified_response(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+
+class HttpCache:
+    """
+    Dependency adding ETag, Last-Modified and Cache-Control to a route
+    
+    Usage:
+        cache: CacheCheck = Depends(HttpCache("cars"))
+        if cache.not_modified:
+            return cache.not_modified_response()
+    
+    ``route`` selects the max-age/stale-while-revalidate pair in
+    ``settings.http_cache``.
+    """
+    
+    def __init__(self, route: str):
+        self.route = route
+    
+    async def __call__(self, request: Request, response: Response) -> CacheCheck:
+        max_age, stale = settings.http_cache.get(self.route, (0, 0))
+        version = await dataset_version.refresh()
+        
+        # One validator per dataset version and URL (base URL, which the
+        # image links embed, + path + normalised query)
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        digest = hashlib.blake2b(
+            f"{version}|{request.base_url}|{request.url.path}?{query}".encode(), digest_size=12
+        ).hexdigest()
+        etag = f'W/"{digest}"'
+        last_modified = dataset_version.updated_at.replace(microsecond=0)
+        
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True),
+            "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={stale}",
+        }
+        response.headers.update(headers)
+        
+        return CacheCheck(headers, _not_modified(request, etag, last_modified))
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence; compare weakly
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in candidates or etag.removeprefix("W/") in candidates
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and last_modified <= since
+    
+    return False
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    """Parse an HTTP date into a naive UTC datetime"""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
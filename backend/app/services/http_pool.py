@@ -0,0 +1,79 @@
+"""
+BusCar HTTP Pool - Process-wide pooled HTTP clients for the scrapers
+
+Scrapers borrow a long-lived ``httpx.AsyncClient`` per host instead of
+opening and closing their own, so connections (and TLS sessions) are kept
+alive and reused across pages, sources and scheduled runs. Limits and
+timeouts come from Settings; HTTP/2 is used when enabled and the ``h2``
+package is installed. The app lifespan closes the pool on shutdown.
+"""
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+
+from app.config import settings
+
+try:
+    import h2  # noqa: F401 - needed by httpx for HTTP/2
+except ImportError:  # Optional dependency
+    h2 = None
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/html, */*",
+    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8"
+}
+
+
+def client_options() -> dict:
+    """Keyword arguments for an AsyncClient configured from Settings"""
+    return {
+        "timeout": httpx.Timeout(
+            settings.http_read_timeout,
+            connect=settings.http_connect_timeout,
+            pool=settings.http_pool_timeout,
+        ),
+        "limits": httpx.Limits(
+            max_connections=settings.http_max_connections_per_host,
+            max_keepalive_connections=settings.http_max_keepalive_per_host,
+            keepalive_expiry=settings.http_keepalive_seconds,
+        ),
+        "http2": settings.http2_enabled and h2 is not None,
+        "headers": DEFAULT_HEADERS,
+        "follow_redirects": True,
+    }
+
+
+class HttpPool:
+    """One pooled AsyncClient per host, created on first use"""
+    
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def client(self, url: str) -> httpx.AsyncClient:
+        """Shared client for the host of ``url`` (don't close it)"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Connections belong to an event loop; a new loop (e.g. another
+            # asyncio.run in a script) starts a new pool
+            self._clients = {}
+            self._loop = loop
+        
+        host = urlsplit(url).netloc or url
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**client_options())
+            self._clients[host] = client
+        return client
+    
+    async def close(self):
+        """Close every client (on application shutdown)"""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+# Singleton instance
+http_pool = HttpPool()
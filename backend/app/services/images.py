@@ -0,0 +1,354 @@
+"""
+BusCar Image Proxy - Listing photos as cached thumbnails
+
+List pages used to load every photo full size from the portal (or
+Unsplash) hosting it. List responses now link to ``/api/images``, which
+fetches an original once, resizes it to every THUMBNAIL_SIZES entry in a
+thread pool and keeps the JPEGs in a disk cache under ``image_cache_dir``:
+
+- ``objects/`` holds the thumbnails named by the hash of their bytes
+  (content-addressed: the same photo under two URLs is stored once, and a
+  file never changes, so it's served as ``immutable``)
+- ``refs/`` maps each original URL to its thumbnails
+- past ``image_cache_max_mb`` the least recently used files are evicted
+  (a missing file is fetched and resized again)
+
+The cache's disk I/O runs in threads, never on the event loop, and the
+originals are fetched with one client shared by all image hosts (at most
+``image_fetch_connections`` connections).
+
+Proxy links are signed with ``image_proxy_key``, so the endpoint only
+fetches the photos of our own listings; without a key of its own (never
+the public default ``secret_key``) the proxy stays off, as it would fetch
+any URL for anyone. While resizing, the perceptual hash of the
+photo is stored on its car, which lets the dedup service match copies of
+the car on other portals by their photo.
+
+Needs Pillow; without it (or the key, or with ``image_proxy_enabled=false``)
+list responses keep the original URLs.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+import httpx
+
+from app.config import settings
+from app.database import async_session
+from app.services.dataset import inventory_changed
+from app.services.dedup import set_image_hash
+from app.services.http_pool import client_options
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional dependency
+    Image = ImageOps = None
+
+# Name -> bounding box (the aspect ratio is kept). Largest first: each size
+# is resized from the previous one
+THUMBNAIL_SIZES: Dict[str, Tuple[int, int]] = {
+    "large": (1280, 960),  # Detail gallery
+    "card": (640, 400),  # Listing cards (200 px high, 2x screens)
+    "thumb": (160, 120),
+}
+LIST_SIZE = "card"
+
+# Thumbnail files never change, browsers and CDNs can keep them for good
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class ImageError(Exception):
+    """The original couldn't be fetched or isn't an image"""
+
+
+@dataclass
+class Thumbnail:
+    path: Path
+    digest: str  # Hash of the JPEG bytes (file name and ETag)
+
+
+def difference_hash(image) -> str:
+    """64-bit dHash (hex): whether each pixel of a 9x8 grayscale copy is brighter than the next one"""
+    pixels = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def render(data: bytes, quality: int) -> Tuple[Dict[str, bytes], str]:
+    """
+    Resize an original to every thumbnail size (runs in the thread pool)
+    
+    Returns:
+        (size name -> JPEG bytes, perceptual hash)
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            # JPEG originals are decoded straight at a reduced scale (still
+            # larger than the largest size)
+            original.draft("RGB", next(iter(THUMBNAIL_SIZES.values())))
+            image = ImageOps.exif_transpose(original).convert("RGB")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(f"Not an image: {e}")
+    
+    thumbnails = {}
+    for name, box in THUMBNAIL_SIZES.items():
+        image.thumbnail(box)  # Never upscales
+        buffer = io.BytesIO()
+        # Progressive JPEGs get optimized Huffman tables too
+        image.save(buffer, "JPEG", quality=quality, progressive=True)
+        thumbnails[name] = buffer.getvalue()
+    # From the smallest thumbnail, a few pixels are all the hash needs
+    return thumbnails, difference_hash(image)
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ImageCache:
+    """
+    Thumbnails and URL refs on disk, evicted least recently used
+    
+    A file's mtime is its last use, so the order survives restarts; the
+    files are indexed on first use. The methods do blocking disk I/O: call
+    them from threads (the index is shared under a lock).
+    """
+    
+    def __init__(self, directory: str, max_bytes: int):
+        self.root = Path(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._files: Optional["OrderedDict[Path, int]"] = None  # Least recently used first
+        self._lock = threading.Lock()
+    
+    def _index(self) -> "OrderedDict[Path, int]":
+        """The index, read from disk the first time (call with the lock held)"""
+        if self._files is None:
+            found = []
+            for path in self.root.glob("*/*/*"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+            found.sort()
+            self._files = OrderedDict((path, size) for _, path, size in found)
+            self.size = sum(self._files.values())
+        return self._files
+    
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.jpg"
+    
+    def ref_path(self, url: str) -> Path:
+        key = _hash(url.encode())
+        return self.root / "refs" / key[:2] / f"{key}.json"
+    
+    def _touch(self, path: Path) -> bool:
+        """Mark a file as just used; False if it's gone"""
+        try:
+            os.utime(path)
+            with self._lock:
+                files = self._index()
+                if path in files:
+                    files.move_to_end(path)
+                    return True
+            # Written by another process
+            self.added([(path, path.stat().st_size)])
+            return True
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._index().pop(path, 0)
+            return False
+    
+    def lookup(self, url: str, size: str) -> Optional[Thumbnail]:
+        """Cached thumbnail of ``url``, None on a miss"""
+        ref = self.ref_path(url)
+        if not self._touch(ref):
+            return None
+        try:
+            digest = json.loads(ref.read_bytes())[size]
+        except (OSError, ValueError, KeyError):
+            return None
+        path = self.object_path(digest)
+        return Thumbnail(path, digest) if self._touch(path) else None
+    
+    def store(self, url: str, thumbnails: Dict[str, bytes]) -> Dict[str, str]:
+        """
+        Write the thumbnails of ``url`` and its ref, and index them
+        
+        Returns:
+            size name -> digest
+        """
+        digests, files = {}, []
+        for name, data in thumbnails.items():
+            digest = digests[name] = _hash(data)
+            path = self.object_path(digest)
+            if not path.exists():
+                self._write(path, data)
+            files.append((path, len(data)))
+        ref = json.dumps(digests).encode()
+        self._write(self.ref_path(url), ref)
+        files.append((self.ref_path(url), len(ref)))
+        self.added(files)
+        return digests
+    
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    
+    def added(self, files: Iterable[Tuple[Path, int]]):
+        """Index new files, then evict the least recently used past ``max_bytes``"""
+        evicted = []
+        with self._lock:
+            index = self._index()
+            new = set()
+            for path, size in files:
+                self.size += size - index.pop(path, 0)
+                index[path] = size
+                new.add(path)
+            while self.size > self.max_bytes and index:
+                path = next(iter(index))
+                if path in new:
+                    break
+                self.size -= index.pop(path)
+                evicted.append(path)
+        for path in evicted:
+            path.unlink(missing_ok=True)
+
+
+class ImageProxy:
+    """Signed thumbnail links and the thumbnails behind them (see the module docstring)"""
+    
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        # Custom transport, e.g. an httpx.MockTransport standing in for the image hosts
+        self.transport = transport
+        self.cache = ImageCache(settings.image_cache_dir, settings.image_cache_max_mb * 1024 * 1024)
+        self.fetches = 0  # Originals downloaded
+        self._client: Optional[httpx.AsyncClient] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loading: Dict[str, asyncio.Task] = {}
+    
+    @property
+    def enabled(self) -> bool:
+        return settings.image_proxy_enabled and bool(settings.image_proxy_key) and Image is not None
+    
+    def signature(self, src: str, car_id: Optional[int]) -> str:
+        message = f"{src}|{'' if car_id is None else car_id}".encode()
+        digest = hmac.new(settings.image_proxy_key.encode(), message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:12]).decode()
+    
+    def verify(self, signature: str, src: str, car_id: Optional[int]) -> bool:
+        return hmac.compare_digest(signature, self.signature(src, car_id))
+    
+    def url(self, src: Optional[str], car_id: Optional[int], base_url: str, size: str = LIST_SIZE) -> Optional[str]:
+        """Proxy link for an original image URL (returned unchanged if it isn't http(s) or the proxy is off)"""
+        if not self.enabled or not src or not src.startswith(("http://", "https://")):
+            return src
+        query = f"src={quote(src, safe='')}" + ("" if car_id is None else f"&car={car_id}")
+        return f"{base_url.rstrip('/')}{settings.api_prefix}/images/{size}/{self.signature(src, car_id)}?{query}"
+    
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=settings.image_workers, thread_name_prefix="images")
+        return self._executor
+    
+    async def thumbnail(self, src: str, size: str, car_id: Optional[int] = None) -> Thumbnail:
+        """
+        Thumbnail of ``src`` at ``size``, from the cache or fetched and resized
+        
+        Concurrent misses for the same original share one fetch.
+        """
+        cached = await asyncio.to_thread(self.cache.lookup, src, size)
+        if cached is not None:
+            return cached
+        
+        task = self._loading.get(src)
+        if task is None:
+            task = self._loading[src] = asyncio.ensure_future(self._load(src, car_id))
+            task.add_done_callback(lambda _: self._loading.pop(src, None))
+        # Shielded: a client going away doesn't cancel the load for the others
+        digests = await asyncio.shield(task)
+        return Thumbnail(self.cache.object_path(digests[size]), digests[size])
+    
+    async def _load(self, src: str, car_id: Optional[int]) -> Dict[str, str]:
+        data = await self._fetch(src)
+        thumbnails, image_hash = await asyncio.get_running_loop().run_in_executor(
+            self.executor(), render, data, settings.image_quality
+        )
+        digests = await asyncio.get_running_loop().run_in_executor(
+            self.executor(), self.cache.store, src, thumbnails
+        )
+        if car_id is not None:
+            await self._record_hash(car_id, image_hash)
+        return digests
+    
+    def client(self) -> httpx.AsyncClient:
+        """The client fetching originals from every image host"""
+        if self._client is None or self._client.is_closed:
+            options = client_options()
+            options["limits"] = httpx.Limits(
+                max_connections=settings.image_fetch_connections,
+                max_keepalive_connections=settings.image_fetch_connections,
+                keepalive_expiry=settings.http_keepalive_seconds,
+            )
+            self._client = httpx.AsyncClient(transport=self.transport, **options)
+        return self._client
+    
+    async def _fetch(self, src: str) -> bytes:
+        """Download an original, up to ``image_max_source_mb``"""
+        client = self.client()
+        
+        limit = settings.image_max_source_mb * 1024 * 1024
+        chunks, received = [], 0
+        try:
+            async with client.stream("GET", src, headers={"Accept": "image/*"}) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > limit:
+                        raise ImageError(f"Image larger than {settings.image_max_source_mb} MB")
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            raise ImageError(f"Could not fetch image: {e}")
+        self.fetches += 1
+        return b"".join(chunks)
+    
+    async def _record_hash(self, car_id: int, image_hash: str):
+        """Store the photo's hash on its car; only cluster changes are published"""
+        try:
+            async with async_session() as db:
+                relabelled = await set_image_hash(db, car_id, image_hash)
+                await db.commit()
+                if relabelled:
+                    await inventory_changed(db, relabelled)
+        except Exception as e:
+            print(f"  - Image hash of car {car_id} not stored: {e}")
+    
+    async def close(self):
+        """Stop the resize threads and close the client (on application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Singleton instance
+image_proxy = ImageProxy()
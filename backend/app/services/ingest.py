@@ -0,0 +1,398 @@
+"""
+BusCar Ingest Service - Batched writes of scraped cars
+
+A batch of scraped cars is written with a few set-based statements instead
+of several round trips per listing:
+
+1. one ``IN`` query looks up which external ids already exist, with the
+   content fingerprint stored for each
+2. one ``INSERT ... ON CONFLICT(external_id) DO UPDATE ... RETURNING``
+   inserts the new cars and returns their ids
+3. known cars whose fingerprint matches are left alone; the others are
+   compared field by field and only the changed fields are updated
+4. one bulk insert writes the price-history rows
+
+A re-scrape of unchanged listings therefore writes nothing beyond a coarse
+``last_seen_at`` refresh, and ``updated_at``/``changed_fields`` only move on
+real changes. Known cars that had been deactivated become active again.
+
+After a complete sweep of a source, ``deactivate_stale_cars`` deactivates
+its listings that weren't seen recently with a single UPDATE.
+
+New cars, and known cars whose make, model, year, km, price or location
+changed, are clustered with their copies on other portals (app.services.dedup).
+
+The stats delta is applied in the same transaction; the caller commits and
+then publishes the changed ids with ``inventory_changed``.
+
+``ingest_stream`` feeds a scraper's ``iter_cars()`` through a bounded queue
+into fixed-size batches, committing and publishing each one, so memory stays
+flat and listings appear while a long scrape is still running.
+"""
+import asyncio
+import hashlib
+import json
+from collections import defaultdict
+from contextlib import suppress
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import select, insert, update, bindparam, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Car, PriceHistory
+from app.scrapers.base import ScrapedCar
+from app.services.batching import chunks
+from app.services.dataset import inventory_changed
+from app.services.dedup import cluster_cars
+from app.services.stats import StatsDelta, apply_stats_delta
+
+# ScrapedCar fields stored as-is on new cars
+CAR_FIELDS = [f.name for f in fields(ScrapedCar) if f.name in Car.__table__.columns]
+
+# Scraped content covered by the fingerprint and refreshed when it changes
+FINGERPRINT_FIELDS = [name for name in CAR_FIELDS if name not in ("external_id", "source")]
+
+# Fields the detail pages own (app.services.enrichment): once stored, search
+# results no longer overwrite them, or each list scrape would revert them
+ENRICH_FIELDS = ["version", "description", "features", "power", "doors", "color",
+                 "body_type", "province", "seller_name"]
+
+# Changes that send a known car back through duplicate clustering
+DEDUP_FIELDS = {"brand", "model", "year", "km", "price", "location", "image_hash", "is_active"}
+
+
+@dataclass
+class IngestResult:
+    """Outcome of writing one batch"""
+    found: int = 0
+    added: int = 0
+    updated: int = 0
+    car_ids: List[int] = field(default_factory=list)
+    relabelled: List[int] = field(default_factory=list)  # Other cars whose cluster changed
+    
+    def __iadd__(self, other: "IngestResult") -> "IngestResult":
+        self.found += other.found
+        self.added += other.added
+        self.updated += other.updated
+        self.car_ids += other.car_ids
+        self.relabelled += other.relabelled
+        return self
+
+
+def content_fingerprint(car: ScrapedCar) -> str:
+    """Compact hash of a scraped car's content (FINGERPRINT_FIELDS)"""
+    values = [getattr(car, name) for name in FINGERPRINT_FIELDS]
+    payload = json.dumps(values, default=str, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+async def _existing_cars(db: AsyncSession, external_ids: List[str]) -> Dict[str, tuple]:
+    """external_id -> (id, content_hash, is_active) for the cars already stored"""
+    existing = {}
+    for chunk in chunks(external_ids):
+        result = await db.execute(
+            select(Car.external_id, Car.id, Car.content_hash, Car.is_active)
+            .where(Car.external_id.in_(chunk))
+        )
+        existing.update({
+            row.external_id: (row.id, row.content_hash, row.is_active) for row in result.all()
+        })
+    return existing
+
+
+async def _stored_content(db: AsyncSession, car_ids: List[int]) -> Dict[int, dict]:
+    """id -> stored FINGERPRINT_FIELDS (plus source and is_active) of the given cars"""
+    columns = [Car.__table__.c[name] for name in FINGERPRINT_FIELDS]
+    stored = {}
+    for chunk in chunks(car_ids):
+        result = await db.execute(
+            select(Car.id, Car.source, Car.is_active, *columns).where(Car.id.in_(chunk))
+        )
+        stored.update({row.id: row._asdict() for row in result.all()})
+    return stored
+
+
+def _changed_fields(car: ScrapedCar, stored: dict) -> List[str]:
+    """
+    Fields whose scraped value differs from the stored one
+    
+    Empty values don't erase, and stored ENRICH_FIELDS are kept (the detail
+    page's value wins over the search result's).
+    """
+    return [
+        name for name in FINGERPRINT_FIELDS
+        if getattr(car, name) is not None and getattr(car, name) != stored[name]
+        and not (name in ENRICH_FIELDS and stored[name] is not None)
+    ]
+
+
+async def update_rows(db: AsyncSession, updates: Dict[tuple, List[dict]]):
+    """
+    Update cars by id, one executemany UPDATE per set of columns
+    
+    Args:
+        updates: {(column, ...): [{"car_id": id, column: value, ...}, ...]}
+    """
+    conn = await db.connection()
+    for columns, rows in updates.items():
+        stmt = (
+            update(Car.__table__)
+            .where(Car.__table__.c.id == bindparam("car_id"))
+            .values({name: bindparam(name) for name in columns})
+        )
+        for chunk in chunks(rows):
+            await conn.execute(stmt, chunk)
+
+
+async def _touch_seen(db: AsyncSession, car_ids: List[int], now: datetime):
+    """Set last_seen_at on the given cars, skipping those refreshed recently"""
+    threshold = now - timedelta(minutes=settings.last_seen_granularity_minutes)
+    for chunk in chunks(car_ids):
+        await db.execute(
+            update(Car)
+            .where(Car.id.in_(chunk), or_(Car.last_seen_at.is_(None), Car.last_seen_at < threshold))
+            .values(last_seen_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def _upsert_cars(db: AsyncSession, rows: List[dict]) -> Dict[str, int]:
+    """Insert the cars (refreshing any a concurrent run stored first), returning external_id -> id"""
+    stmt = sqlite_insert(Car.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Car.external_id],
+        set_={name: stmt.excluded[name]
+          for name in FINGERPRINT_FIELDS + ["content_hash", "updated_at", "last_seen_at", "is_active"]}
+    ).returning(Car.external_id, Car.id)
+    
+    # Core executemany: the rows are sent as multi-row VALUES batches
+    conn = await db.connection()
+    ids = {}
+    for chunk in chunks(rows):
+        result = await conn.execute(stmt, chunk)
+        ids.update({external_id: car_id for external_id, car_id in result.all()})
+    return ids
+
+
+async def ingest_batch(
+    db: AsyncSession,
+    scraped_cars: List[ScrapedCar],
+    now: Optional[datetime] = None
+) -> IngestResult:
+    """
+    Write a batch of scraped cars (without committing)
+    
+    New cars are inserted with all their fields and an initial price-history
+    row. Known cars are only written when their content fingerprint changed
+    or they were inactive: then the changed fields are updated and listed in
+    ``changed_fields``, with a price-history row when the price changed.
+    ``updated`` and ``car_ids`` count the cars actually added or changed.
+    Every known car gets its ``last_seen_at`` refreshed (coarsely).
+    
+    The added cars and those whose dedup fields changed are clustered;
+    ``relabelled`` lists the other cars whose cluster changed as a result.
+    """
+    now = now or datetime.utcnow()
+    
+    # The last occurrence of a listing in the batch wins
+    batch = list({car.external_id: car for car in scraped_cars}.values())
+    result = IngestResult(found=len(scraped_cars))
+    if not batch:
+        return result
+    
+    existing = await _existing_cars(db, [car.external_id for car in batch])
+    fingerprints = {car.external_id: content_fingerprint(car) for car in batch}
+    
+    new_cars = [car for car in batch if car.external_id not in existing]
+    modified = [
+        car for car in batch
+        if car.external_id in existing and (
+            existing[car.external_id][1] != fingerprints[car.external_id] or not existing[car.external_id][2]
+        )
+    ]
+    
+    stats_delta = StatsDelta()
+    price_rows = []
+    to_cluster = []
+    
+    if new_cars:
+        rows = []
+        for car in new_cars:
+            row = {name: getattr(car, name) for name in CAR_FIELDS}
+            row.update(scraped_at=now, updated_at=now, last_seen_at=now, is_active=True,
+                       content_hash=fingerprints[car.external_id])
+            rows.append(row)
+        ids = await _upsert_cars(db, rows)
+        
+        for car in new_cars:
+            car_id = ids[car.external_id]
+            price_rows.append({"car_id": car_id, "price": car.price, "recorded_at": now})
+            stats_delta.add_car(car.source, car.fuel, car.price, now)
+            result.added += 1
+            result.car_ids.append(car_id)
+            to_cluster.append(car_id)
+    
+    if modified:
+        stored = await _stored_content(db, [existing[car.external_id][0] for car in modified])
+        updates: Dict[tuple, List[dict]] = defaultdict(list)
+        for car in modified:
+            car_id = existing[car.external_id][0]
+            old = stored[car_id]
+            changed = _changed_fields(car, old)
+            row = {"car_id": car_id, "content_hash": fingerprints[car.external_id]}
+            row.update({name: getattr(car, name) for name in changed})
+            if not old["is_active"]:
+                changed.append("is_active")
+                row["is_active"] = True
+            if changed:
+                row.update(changed_fields=json.dumps(changed), updated_at=now)
+            updates[tuple(sorted(row.keys() - {"car_id"}))].append(row)
+            if not changed:
+                continue  # Only the fingerprint was outdated (e.g. a field left empty)
+            
+            if "price" in changed:
+                price_rows.append({"car_id": car_id, "price": car.price, "recorded_at": now})
+            if not old["is_active"]:
+                # Listed again: back into the active inventory with its current values
+                stats_delta.add_car(old["source"], row.get("fuel", old["fuel"]), row.get("price", old["price"]))
+            else:
+                if "fuel" in changed:
+                    stats_delta.remove_car(old["source"], old["fuel"], old["price"])
+                    stats_delta.add_car(old["source"], car.fuel, car.price)
+                elif "price" in changed:
+                    stats_delta.change_price(old["price"], car.price)
+            result.updated += 1
+            result.car_ids.append(car_id)
+            if DEDUP_FIELDS.intersection(changed):
+                to_cluster.append(car_id)
+        await update_rows(db, updates)
+    
+    if settings.dedup_enabled and to_cluster:
+        changed_ids = set(result.car_ids)
+        result.relabelled = [car_id for car_id in await cluster_cars(db, to_cluster)
+                             if car_id not in changed_ids]
+    
+    await _touch_seen(db, [existing[car.external_id][0] for car in batch if car.external_id in existing], now)
+    
+    for chunk in chunks(price_rows):
+        await db.execute(insert(PriceHistory), chunk)
+    
+    await apply_stats_delta(db, stats_delta)
+    return result
+
+
+async def deactivate_stale_cars(db: AsyncSession, source: str, seen_since: datetime,
+                                now: Optional[datetime] = None) -> List[int]:
+    """
+    Deactivate the source's active cars not seen since ``seen_since`` (without committing)
+    
+    One set-based UPDATE ... RETURNING; the stats delta is applied in the same
+    transaction. Only call it after a sweep that walked all of the source's
+    listings, otherwise unvisited pages would count as gone.
+    
+    Returns:
+        Ids of the deactivated cars (publish them with ``inventory_changed``)
+    """
+    now = now or datetime.utcnow()
+    # Allow for the coarse last_seen_at refresh
+    cutoff = seen_since - timedelta(minutes=settings.last_seen_granularity_minutes)
+    result = await db.execute(
+        update(Car)
+        .where(
+            Car.source == source,
+            Car.is_active == True,
+            func.coalesce(Car.last_seen_at, Car.scraped_at) < cutoff,
+        )
+        .values(is_active=False, updated_at=now, changed_fields=json.dumps(["is_active"]))
+        .returning(Car.id, Car.fuel, Car.price)
+        .execution_options(synchronize_session=False)
+    )
+    
+    stats_delta = StatsDelta()
+    car_ids = []
+    for car_id, fuel, price in result.all():
+        stats_delta.remove_car(source, fuel, price)
+        car_ids.append(car_id)
+    await apply_stats_delta(db, stats_delta)
+    return car_ids
+
+
+async def ingest_stream(
+    db: AsyncSession,
+    cars: AsyncIterator[ScrapedCar],
+    batch_size: Optional[int] = None,
+    on_batch: Optional[Callable[[IngestResult], None]] = None,
+    on_commit: Optional[Callable[[IngestResult], Awaitable[None]]] = None
+) -> IngestResult:
+    """
+    Write cars from an async iterator in batches, committing each batch
+    
+    The scraper runs as a producer task filling a bounded queue of batches;
+    when the database falls behind, the queue fills up and the scraper waits.
+    
+    Args:
+        on_batch: Called with the running totals before each commit (e.g. to
+            update the ScrapeLog in the same transaction)
+        on_commit: Awaited with each batch's own result once it's committed
+            and published (e.g. to enrich the new and changed cars)
+    
+    Returns:
+        Totals over all batches. If the scraper fails, the batches written so
+        far stay committed and its exception is raised.
+    """
+    batch_size = batch_size or settings.ingest_batch_size
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ingest_queue_batches)
+    
+    async def produce():
+        batch = []
+        try:
+            async for car in cars:
+                batch.append(car)
+                if len(batch) >= batch_size:
+                    await queue.put(batch)
+                    batch = []
+            if batch:
+                await queue.put(batch)
+        except Exception:
+            await queue.put(None)  # End of stream; ``await producer`` re-raises the error
+            raise
+        finally:
+            # Also when cancelled mid-page, so the scraper closes its responses
+            aclose = getattr(cars, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        await queue.put(None)  # End of stream
+    
+    producer = asyncio.create_task(produce())
+    total = IngestResult()
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            
+            result = await ingest_batch(db, batch)
+            # Only the counts are kept across batches
+            total += IngestResult(found=result.found, added=result.added, updated=result.updated)
+            if on_batch:
+                on_batch(total)
+            await db.commit()
+            
+            # Invalidate inventory-derived caches and patch the listing index
+            if result.car_ids or result.relabelled:
+                await inventory_changed(db, result.car_ids + result.relabelled)
+            if on_commit:
+                await on_commit(result)
+    except BaseException:
+        # A cancelled producer sends no end of stream (nobody reads it); wait
+        # for the scraper to close, without its errors masking this one
+        producer.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await producer
+        raise
+    
+    await producer  # Re-raises a scraper error
+    return total
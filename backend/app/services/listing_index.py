@@ -0,0 +1,316 @@
+"""
+BusCar Listing Index - In-memory columnar index for /api/cars
+
+Keeps the active cars as NumPy columns (strings dictionary-encoded) with a
+pre-sorted permutation per sort key. Filter + sort + page requests are
+answered with vectorised masks and return car ids; only the rows of the
+requested page are then loaded from the database.
+
+The index is patched in place after each scrape commit of this process
+(``apply_changes``) instead of being reloaded. It remembers the dataset
+version it reflects: once a bump made elsewhere (another worker, the
+scheduler, ``seed.py``) shows up, requests fall back to SQL until
+``catch_up`` has reloaded it. Enable it with ``LISTING_INDEX_ENABLED=true``;
+it needs numpy, and requests it can't answer (full-text search, relevance
+sort) fall back to SQL.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Car
+from app.schemas import CarFilters
+from app.services.dataset import dataset_version
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+
+# Dictionary-encoded columns and the CarFilters field that filters them
+STRING_COLUMNS = {
+    "brand": "brand",
+    "model": "model",
+    "fuel": "fuel",
+    "transmission": "transmission",
+    "source": "sources",
+    "location": "location",
+    "body_type": "body_type",
+    "seller_type": "seller_type",
+}
+
+# Numeric columns: (name, dtype); scraped_at is stored as microseconds
+NUMERIC_COLUMNS = (("price", "float64"), ("year", "int64"), ("km", "int64"), ("scraped_at", "int64"))
+
+# Range filters: CarFilters field -> (column, is lower bound)
+RANGE_FILTERS = {
+    "min_price": ("price", True),
+    "max_price": ("price", False),
+    "min_year": ("year", True),
+    "max_year": ("year", False),
+    "min_km": ("km", True),
+    "max_km": ("km", False),
+}
+
+SORT_KEYS = {"date": "scraped_at", "price": "price", "year": "year", "km": "km"}
+
+_EPOCH = datetime(1970, 1, 1)
+
+_LOAD_COLUMNS = [Car.id, Car.is_active, *[getattr(Car, name) for name in STRING_COLUMNS],
+                 *[getattr(Car, name) for name, _ in NUMERIC_COLUMNS]]
+
+
+def _to_micros(value: Optional[datetime]) -> int:
+    if value is None:
+        return 0
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class _Dictionary:
+    """String <-> integer code mapping for one column (None is -1)"""
+    
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+    
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+    
+    def lookup(self, values: Iterable[str]) -> List[int]:
+        """Codes of known values; unknown values can't match any row"""
+        return [self.codes[v] for v in values if v in self.codes]
+
+
+class ListingIndex:
+    """Columnar copy of the active inventory answering listing queries"""
+    
+    def __init__(self):
+        self.ready = False
+        self.counter: Optional[int] = None  # Dataset version the index reflects
+        self.version: Optional[str] = None
+        self._loading = False
+        self.slots: Dict[int, int] = {}  # car id -> row slot
+        self.ids = None
+        self.active = None
+        self.columns: Dict[str, "np.ndarray"] = {}
+        self.dictionaries: Dict[str, _Dictionary] = {}
+        self.orders: Dict[str, "np.ndarray"] = {}  # slots sorted by (key, id)
+    
+    @property
+    def enabled(self) -> bool:
+        return settings.listing_index_enabled and np is not None
+    
+    # ----------------------------------------------------------------
+    # Building and patching
+    # ----------------------------------------------------------------
+    
+    def _encode_rows(self, rows) -> dict:
+        """Turn DB rows into column arrays"""
+        data = {
+            "id": np.fromiter((row.id for row in rows), dtype="int64", count=len(rows)),
+            "active": np.fromiter((bool(row.is_active) for row in rows), dtype=bool, count=len(rows)),
+        }
+        for name in STRING_COLUMNS:
+            encode = self.dictionaries[name].encode
+            data[name] = np.fromiter((encode(getattr(row, name)) for row in rows), dtype="int32", count=len(rows))
+        for name, dtype in NUMERIC_COLUMNS:
+            if name == "scraped_at":
+                values = (_to_micros(row.scraped_at) for row in rows)
+            else:
+                values = (getattr(row, name) or 0 for row in rows)
+            data[name] = np.fromiter(values, dtype=dtype, count=len(rows))
+        return data
+    
+    def _sort_order(self, key: str, slots) -> "np.ndarray":
+        """Slots ordered by (key, id) ascending"""
+        return slots[np.lexsort((self.ids[slots], self.columns[key][slots]))]
+    
+    async def load(self, db: AsyncSession):
+        """Build the index from all active cars"""
+        if not self.enabled:
+            return
+        
+        # Read before the rows: a bump landing during the load makes it stale
+        await dataset_version.refresh()
+        counter, version = dataset_version.counter, dataset_version.value
+        
+        result = await db.execute(select(*_LOAD_COLUMNS).where(Car.is_active == True))
+        rows = result.all()
+        
+        self.dictionaries = {name: _Dictionary() for name in STRING_COLUMNS}
+        data = self._encode_rows(rows)
+        self.ids = data.pop("id")
+        self.active = data.pop("active")
+        self.columns = data
+        self.slots = {int(car_id): slot for slot, car_id in enumerate(self.ids)}
+        
+        all_slots = np.arange(len(self.ids), dtype="int64")
+        self.orders = {key: self._sort_order(key, all_slots) for key in SORT_KEYS.values()}
+        self.counter, self.version = counter, version
+        self.ready = True
+    
+    async def catch_up(self, db: AsyncSession):
+        """Reload the index if the dataset moved through a bump it didn't see"""
+        if not self.ready or self._loading or self.version == dataset_version.value:
+            return
+        
+        self._loading = True  # Other requests use SQL meanwhile
+        try:
+            await self.load(db)
+        finally:
+            self._loading = False
+        print(f"🔄 Listing index reloaded at dataset version {self.counter} ({len(self.slots)} cars)")
+    
+    async def apply_changes(self, db: AsyncSession, car_ids: Iterable[int], counter: int, version: str):
+        """
+        Patch the index with the current state of the given cars
+        
+        Args:
+            counter, version: dataset version of the bump that published the
+                changes; the index only follows it from the version just before,
+                any other bump in between needs a reload
+        """
+        if not self.ready:
+            return
+        
+        car_ids = list(set(car_ids))
+        if car_ids:
+            result = await db.execute(select(*_LOAD_COLUMNS).where(Car.id.in_(car_ids)))
+            rows = result.all()
+            if rows:
+                self._patch(rows)
+        
+        if self.counter is not None and counter == self.counter + 1:
+            self.counter, self.version = counter, version
+    
+    def _patch(self, rows):
+        """Overwrite or append the given rows and fix the sort orders"""
+        data = self._encode_rows(rows)
+        existing = np.array([self.slots.get(int(car_id), -1) for car_id in data["id"]], dtype="int64")
+        is_new = existing < 0
+        
+        # Overwrite rows already in the index
+        updated_slots = existing[~is_new]
+        for name in ("active", *self.columns):
+            target = self.active if name == "active" else self.columns[name]
+            target[updated_slots] = data[name][~is_new]
+        
+        # Append new rows
+        new_count = int(is_new.sum())
+        first_new = len(self.ids)
+        new_slots = np.arange(first_new, first_new + new_count, dtype="int64")
+        if new_count:
+            self.ids = np.concatenate([self.ids, data["id"][is_new]])
+            self.active = np.concatenate([self.active, data["active"][is_new]])
+            for name in self.columns:
+                self.columns[name] = np.concatenate([self.columns[name], data[name][is_new]])
+            for slot, car_id in zip(new_slots, data["id"][is_new]):
+                self.slots[int(car_id)] = int(slot)
+        
+        # Move the changed rows to their new place in each sort order
+        changed = np.concatenate([updated_slots, new_slots])
+        for key in SORT_KEYS.values():
+            self.orders[key] = self._reposition(self.orders[key], key, changed)
+    
+    def _reposition(self, order, key: str, changed) -> "np.ndarray":
+        """Remove ``changed`` slots from a sort order and merge them back in"""
+        order = order[~np.isin(order, changed)]
+        keys = self.columns[key][order]
+        ids = self.ids[order]
+        
+        moved = self._sort_order(key, changed)
+        moved_keys = self.columns[key][moved]
+        low = np.searchsorted(keys, moved_keys, side="left")
+        high = np.searchsorted(keys, moved_keys, side="right")
+        
+        # Within a run of equal keys, rows are ordered by id
+        positions = low.copy()
+        for i in np.nonzero(high > low)[0]:
+            positions[i] += np.searchsorted(ids[low[i]:high[i]], self.ids[moved[i]])
+        
+        return np.insert(order, positions, moved)
+    
+    # ----------------------------------------------------------------
+    # Querying
+    # ----------------------------------------------------------------
+    
+    def supports(self, filters: CarFilters, sort: str) -> bool:
+        """Whether this request can be answered without SQL"""
+        return (self.ready and self.version == dataset_version.value
+                and not filters.search and sort != "relevance")
+    
+    def _mask(self, filters: CarFilters) -> "np.ndarray":
+        mask = self.active.copy()
+        
+        for name, field in STRING_COLUMNS.items():
+            value = getattr(filters, field)
+            if not value:
+                continue
+            codes = self.dictionaries[name].lookup(value if isinstance(value, list) else [value])
+            mask &= np.isin(self.columns[name], codes)
+        
+        for field, (name, is_lower) in RANGE_FILTERS.items():
+            value = getattr(filters, field)
+            if value is None:
+                continue
+            if is_lower:
+                mask &= self.columns[name] >= value
+            else:
+                mask &= self.columns[name] <= value
+        
+        return mask
+    
+    def query(
+        self,
+        filters: CarFilters,
+        sort: str,
+        offset: int = 0,
+        limit: int = 12,
+        after: Optional[Tuple[object, int]] = None,
+    ) -> Tuple[List[int], int]:
+        """
+        Page of car ids for a listing request
+        
+        Args:
+            after: (sort value, car id) of the last row seen, for cursor paging
+        
+        Returns:
+            (car ids in display order, total matching cars)
+        """
+        sort_field, sort_dir = sort.split("-")
+        key = SORT_KEYS[sort_field]
+        
+        mask = self._mask(filters)
+        total = int(mask.sum())
+        
+        if after is not None:
+            value, last_id = after
+            if key == "scraped_at":
+                value = _to_micros(value)
+            column = self.columns[key]
+            if sort_dir == "desc":
+                mask &= (column < value) | ((column == value) & (self.ids < last_id))
+            else:
+                mask &= (column > value) | ((column == value) & (self.ids > last_id))
+        
+        order = self.orders[key]
+        if sort_dir == "desc":
+            order = order[::-1]
+        
+        page = order[mask[order]][offset:offset + limit]
+        return self.ids[page].tolist(), total
+
+
+# Singleton instance
+listing_index = ListingIndex()
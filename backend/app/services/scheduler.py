@@ -5,13 +5,12 @@ from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy import select, and_
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.database import async_session
 from app.models import Car, Alert
-from app.scrapers import get_scraper
 from app.services.notification import notification_service
+from app.services.scraping import DEFAULT_SOURCES, run_scraping
 
 
 scheduler = AsyncIOScheduler()
@@ -21,19 +20,7 @@ async def run_scheduled_scraping():
     """Run scraping for all sources"""
     print(f"[{datetime.now()}] Starting scheduled scraping...")
     
-    sources = ["wallapop", "coches.net", "autoscout24", "milanuncios", "motor.es"]
-    
-    async with async_session() as db:
-        for source in sources:
-            try:
-                scraper = get_scraper(source)
-                if scraper:
-                    async with scraper:
-                        cars = await scraper.scrape(max_cars=settings.max_cars_per_scrape)
-                        print(f"  - {source}: Found {len(cars)} cars")
-                        # TODO: Save/update cars in database
-            except Exception as e:
-                print(f"  - {source}: Error - {e}")
+    await run_scraping(DEFAULT_SOURCES, settings.max_cars_per_scrape)
     
     print(f"[{datetime.now()}] Scraping completed")
 
@@ -99,7 +86,7 @@ async def check_alerts():
                         alert.last_notified = datetime.utcnow()
                         await db.commit()
                         print(f"  - Alert {alert.id}: Sent notification for {len(matching_cars)} cars")
-                
+            
             except Exception as e:
                 print(f"  - Alert {alert.id}: Error - {e}")
     
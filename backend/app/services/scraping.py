@@ -0,0 +1,251 @@
+"""
+BusCar Scraping Service - Runs the scrapers and ingests their results
+
+Each scraper streams its cars into the ingest, which commits them in
+batches as they arrive. Sources are scraped concurrently, up to
+``scrape_max_concurrency`` at a time across all runs (manual and
+scheduled), and at most ``scrape_source_concurrency`` runs of the same
+source at once. Every source gets its own database session and ScrapeLog,
+so a slow or failing portal doesn't hold back or roll back the others.
+
+Runs are incremental: each source keeps a high-water mark (SourceState) and
+its scraper stops once it reaches listings already seen. Every
+``full_sweep_hours`` a run ignores the mark and walks the whole result set
+again, picking up price changes on older listings. When such a sweep gets
+through all of the source's results, listings missing from the last
+``stale_after_runs`` complete sweeps (or unseen for ``stale_after_days``)
+are deactivated.
+
+New and changed listings are enriched from their detail pages as each
+batch is committed (see app.services.enrichment).
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models import ScrapeLog, SourceState
+from app.scrapers.base import HighWaterMark
+from app.services.dataset import inventory_changed
+from app.services.enrichment import enrich_cars
+from app.services.ingest import IngestResult, deactivate_stale_cars, ingest_stream
+
+if TYPE_CHECKING:
+    from app.scrapers.base import BaseScraper
+
+DEFAULT_SOURCES = ["wallapop", "coches.net", "autoscout24", "milanuncios", "motor.es"]
+
+
+class ScrapeLimiter:
+    """Global and per-source concurrency limits shared by all scraping runs"""
+    
+    def __init__(self):
+        self._global: Optional[asyncio.Semaphore] = None
+        self._sources: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _check_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Semaphores belong to an event loop; a new loop (e.g. another
+            # asyncio.run in a script) starts with fresh limits
+            self._global, self._sources = None, {}
+            self._loop = loop
+    
+    def global_slot(self) -> asyncio.Semaphore:
+        self._check_loop()
+        if self._global is None:
+            self._global = asyncio.Semaphore(settings.scrape_max_concurrency)
+        return self._global
+    
+    def source_slot(self, source: str) -> asyncio.Semaphore:
+        self._check_loop()
+        if source not in self._sources:
+            self._sources[source] = asyncio.Semaphore(settings.scrape_source_concurrency)
+        return self._sources[source]
+
+
+# Singleton instance
+scrape_limiter = ScrapeLimiter()
+
+
+def is_full_sweep_due(state: SourceState, now: datetime) -> bool:
+    """Whether the next run of a source should ignore its high-water mark"""
+    if state.last_full_sweep_at is None:
+        return True
+    return now - state.last_full_sweep_at >= timedelta(hours=settings.full_sweep_hours)
+
+
+def advance_high_water(state: SourceState, mark: HighWaterMark):
+    """Store the newest listing a run saw, never moving the mark backwards"""
+    if mark.external_id and (
+        state.newest_published_at is None
+        or mark.published_at is None
+        or mark.published_at >= state.newest_published_at
+    ):
+        # An undated listing only moves the id; the previous date still bounds the next run
+        if mark.published_at is not None:
+            state.newest_published_at = mark.published_at
+        state.newest_external_id = mark.external_id
+    if mark.etag:
+        state.first_page_etag = mark.etag
+
+
+async def stale_cutoff(db: AsyncSession, source: str, started_at: datetime) -> datetime:
+    """
+    Listings of a source not seen since this time are stale
+    
+    That is the start of the oldest of the last ``stale_after_runs`` complete
+    sweeps (the current one, started at ``started_at``, included), or
+    ``stale_after_days`` ago if that is later.
+    """
+    cutoff = started_at - timedelta(days=settings.stale_after_days)
+    
+    previous_runs = settings.stale_after_runs - 1
+    if previous_runs <= 0:
+        return started_at
+    result = await db.execute(
+        select(ScrapeLog.started_at)
+        .where(ScrapeLog.source == source, ScrapeLog.status == "success", ScrapeLog.full_sweep == True)
+        .order_by(ScrapeLog.started_at.desc())
+        .limit(previous_runs)
+    )
+    sweeps = result.scalars().all()
+    if len(sweeps) == previous_runs:
+        cutoff = max(cutoff, sweeps[-1])
+    return cutoff
+
+
+async def scrape_source(
+    source: str,
+    max_cars: int,
+    scraper: Optional["BaseScraper"] = None,
+) -> Optional[int]:
+    """
+    Scrape one source and ingest its cars in a session of its own
+    
+    Args:
+        source: Source name
+        max_cars: Maximum number of cars to scrape
+        scraper: Scraper to use instead of the registered one (e.g. with a mock transport)
+    
+    Returns:
+        The ScrapeLog id, or None if there is no scraper for the source
+    """
+    from app.scrapers import get_scraper
+    
+    scraper = scraper or get_scraper(source)
+    if not scraper:
+        print(f"  - {source}: No scraper available, skipped")
+        return None
+    
+    async with scrape_limiter.source_slot(source), scrape_limiter.global_slot():
+        async with async_session() as db:
+            state = await db.get(SourceState, source)
+            if state is None:
+                state = SourceState(source=source)
+                db.add(state)
+            
+            now = datetime.utcnow()
+            full_sweep = is_full_sweep_due(state, now)
+            since = None if full_sweep else HighWaterMark(
+                published_at=state.newest_published_at,
+                external_id=state.newest_external_id,
+                etag=state.first_page_etag,
+            )
+            
+            log = ScrapeLog(source=source, status="running")
+            db.add(log)
+            await db.commit()  # Use commit to get log.id and persist initial status
+            log_id = log.id
+            
+            def record_progress(total: IngestResult):
+                # Committed together with each batch
+                log.cars_found = total.found
+                log.cars_added = total.added
+                log.cars_updated = total.updated
+            
+            detail_pages = 0
+            
+            async def enrich_batch(result: IngestResult):
+                # Detail pages only for the cars this batch added or changed
+                nonlocal detail_pages
+                car_ids = result.car_ids
+                if settings.detail_max_per_run:
+                    car_ids = car_ids[:max(settings.detail_max_per_run - detail_pages, 0)]
+                if not car_ids:
+                    return
+                detail_pages += len(car_ids)
+                enriched = await enrich_cars(db, scraper, car_ids)
+                await db.commit()
+                if enriched:
+                    await inventory_changed(db, enriched)
+            
+            try:
+                async with scraper:
+                    # Cars are written in batches while the scraper is still fetching
+                    result = await ingest_stream(
+                        db, scraper.iter_cars(max_cars=max_cars, since=since),
+                        on_batch=record_progress,
+                        on_commit=enrich_batch if settings.detail_enrichment_enabled else None,
+                    )
+                advance_high_water(state, scraper.high_water)
+                state.last_run_at = now
+                if full_sweep:
+                    state.last_full_sweep_at = now
+                
+                # Only a sweep that saw every listing can tell which ones are gone
+                deactivated = []
+                if full_sweep and scraper.reached_end:
+                    cutoff = await stale_cutoff(db, source, now)
+                    deactivated = await deactivate_stale_cars(db, source, cutoff)
+                    log.full_sweep = True
+                    log.cars_deactivated = len(deactivated)
+                
+                log.status = "success"
+                await db.commit()
+                if deactivated:
+                    await inventory_changed(db, deactivated)
+                mode = "full sweep" if full_sweep else "incremental"
+                print(f"  - {source}: {result.found} cars ({result.added} new, {result.updated} updated, "
+                      f"{len(deactivated)} deactivated, {mode})")
+            except Exception as e:
+                await db.rollback()
+                log.status = "failed"
+                log.errors = str(e)
+                print(f"  - {source}: Error - {e}")
+            finally:
+                log.finished_at = datetime.utcnow()
+                db.add(log)
+                await db.commit()
+            
+            return log_id
+
+
+async def run_scraping(sources: Optional[List[str]] = None, max_cars: Optional[int] = None) -> List[Optional[int]]:
+    """
+    Scrape several sources concurrently
+    
+    Returns:
+        The ScrapeLog id of each source, in the order given
+    """
+    sources = sources or DEFAULT_SOURCES
+    max_cars = max_cars or settings.max_cars_per_scrape
+    
+    results = await asyncio.gather(
+        *(scrape_source(source, max_cars) for source in sources),
+        return_exceptions=True
+    )
+    
+    log_ids = []
+    for source, result in zip(sources, results):
+        if isinstance(result, Exception):
+            # Only reachable if the log itself couldn't be written
+            print(f"  - {source}: Error - {result}")
+            result = None
+        log_ids.append(result)
+    return log_ids
@@ -0,0 +1,135 @@
+"""
+BusCar Search Service - Full-text index over car listings (SQLite FTS5)
+
+The ``cars_fts`` virtual table is an external-content FTS5 index on
+``cars`` (brand, model, version, description). Triggers keep it in sync
+with every insert/update/delete, so the scraping ingest and ``seed.py``
+update it just by writing ``Car`` rows.
+"""
+import re
+from typing import Optional
+from sqlalchemy import select, table, column, text, func, literal_column, or_
+from sqlalchemy.sql import ColumnElement, Subquery
+
+from app.database import engine
+from app.models import Car
+
+
+FTS_TABLE = "cars_fts"
+
+# Relative weights for bm25() - brand/model hits count more than description hits
+BM25_WEIGHTS = (10.0, 8.0, 4.0, 1.0)
+
+cars_fts = table(FTS_TABLE, column("rowid"))
+
+_CREATE_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        brand, model, version, description,
+        content='cars', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cars_fts_ai AFTER INSERT ON cars BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, brand, model, version, description)
+        VALUES (new.id, new.brand, new.model, new.version, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cars_fts_ad AFTER DELETE ON cars BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, brand, model, version, description)
+        VALUES ('delete', old.id, old.brand, old.model, old.version, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cars_fts_au AFTER UPDATE OF brand, model, version, description ON cars BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, brand, model, version, description)
+        VALUES ('delete', old.id, old.brand, old.model, old.version, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, brand, model, version, description)
+        VALUES (new.id, new.brand, new.model, new.version, new.description);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_enabled() -> bool:
+    """FTS5 is only available on SQLite; other backends fall back to LIKE"""
+    return engine.dialect.name == "sqlite"
+
+
+async def init_search_index(conn):
+    """Create the FTS table and sync triggers, backfilling existing rows"""
+    if conn.dialect.name != "sqlite":
+        return
+    
+    result = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    )
+    existed = result.scalar() is not None
+    
+    for statement in _CREATE_STATEMENTS:
+        await conn.execute(text(statement))
+    
+    if not existed:
+        await rebuild_search_index(conn)
+
+
+async def rebuild_search_index(conn):
+    """Rebuild the whole index from the cars table"""
+    await conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix
+    
+    "golf gti" -> '"golf"* "gti"*'
+    """
+    tokens = _TOKEN_RE.findall(search)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _match(match_query: str) -> ColumnElement:
+    return text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=match_query)
+
+
+def search_condition(search: str) -> Optional[ColumnElement]:
+    """Filter condition for the ``search`` parameter, or None if it has no words"""
+    if not fts_enabled():
+        pattern = f"%{search}%"
+        return or_(
+            Car.brand.ilike(pattern),
+            Car.model.ilike(pattern),
+            Car.version.ilike(pattern),
+            Car.description.ilike(pattern)
+        )
+    
+    match_query = build_match_query(search)
+    if match_query is None:
+        return None
+    
+    return Car.id.in_(
+        select(cars_fts.c.rowid).select_from(cars_fts).where(_match(match_query))
+    )
+
+
+def ranked_matches(search: str) -> Optional[Subquery]:
+    """Subquery of (rowid, rank) for the search, best matches have the lowest rank"""
+    match_query = build_match_query(search)
+    if match_query is None or not fts_enabled():
+        return None
+    
+    rank = func.bm25(literal_column(FTS_TABLE), *BM25_WEIGHTS)
+    return (
+        select(cars_fts.c.rowid, rank.label("rank"))
+        .select_from(cars_fts)
+        .where(_match(match_query))
+        .subquery("ranked")
+    )
@@ -0,0 +1,27 @@
+"""
+BusCar Serialization - Fast JSON encoding for hot read paths
+
+Uses orjson when installed (it handles datetimes natively and is several
+times faster than the stdlib encoder) and falls back to ``json``.
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain Python data (dicts, lists, scalars, datetimes) to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
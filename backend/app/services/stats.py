@@ -0,0 +1,212 @@
+"""
+BusCar Stats Service - Materialised inventory statistics
+
+``inventory_stats`` holds the counters behind /api/stats. The ingest records
+what it changes in a ``StatsDelta`` and applies it in the same transaction
+as the car writes, so reading the stats is a single small table read.
+``rebuild_stats`` recomputes everything from ``cars`` and reports drift.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Car, InventoryStat
+from app.schemas import StatsResponse
+
+
+class StatsDelta:
+    """Changes to the active inventory made by one ingest transaction"""
+    
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.added_prices: List[float] = []
+        self.removed_prices: List[float] = []
+        self.last_scraped: Optional[datetime] = None
+    
+    def __bool__(self) -> bool:
+        return bool(+self.counts or self.added_prices or self.removed_prices or self.last_scraped)
+    
+    def add_car(self, source: str, fuel: str, price: float, scraped_at: Optional[datetime] = None):
+        """A car became active"""
+        self.counts[("total", "")] += 1
+        self.counts[("source", source)] += 1
+        self.counts[("fuel", fuel)] += 1
+        self.added_prices.append(price)
+        if scraped_at and (self.last_scraped is None or scraped_at > self.last_scraped):
+            self.last_scraped = scraped_at
+    
+    def remove_car(self, source: str, fuel: str, price: float):
+        """A car stopped being active"""
+        self.counts[("total", "")] -= 1
+        self.counts[("source", source)] -= 1
+        self.counts[("fuel", fuel)] -= 1
+        self.removed_prices.append(price)
+    
+    def change_price(self, old_price: float, new_price: float):
+        """An active car changed price"""
+        self.removed_prices.append(old_price)
+        self.added_prices.append(new_price)
+
+
+async def apply_stats_delta(db: AsyncSession, delta: StatsDelta):
+    """Apply a delta to the stored stats (call before committing the car writes)"""
+    if not delta:
+        return
+    
+    for (dimension, key), count in delta.counts.items():
+        if not count:
+            continue
+        stmt = insert(InventoryStat).values(dimension=dimension, key=key, count=count)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[InventoryStat.dimension, InventoryStat.key],
+            set_={"count": InventoryStat.count + stmt.excluded.count}
+        ))
+    
+    if delta.last_scraped:
+        stmt = insert(InventoryStat).values(dimension="scraped_at", key="max", timestamp=delta.last_scraped)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[InventoryStat.dimension, InventoryStat.key],
+            set_={"timestamp": func.max(func.coalesce(InventoryStat.timestamp, stmt.excluded.timestamp),
+                                        stmt.excluded.timestamp)}
+        ))
+    
+    if delta.added_prices:
+        for key, bound, aggregate in (("min", min(delta.added_prices), func.min),
+                                      ("max", max(delta.added_prices), func.max)):
+            stmt = insert(InventoryStat).values(dimension="price", key=key, value=bound)
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=[InventoryStat.dimension, InventoryStat.key],
+                set_={"value": aggregate(func.coalesce(InventoryStat.value, stmt.excluded.value),
+                                         stmt.excluded.value)}
+            ))
+    
+    if delta.removed_prices:
+        # A removed price may have been the bound; recompute it from the (indexed) cars table
+        low, high = await _stored_price_range(db)
+        if (low is not None and min(delta.removed_prices) <= low) or \
+                (high is not None and max(delta.removed_prices) >= high):
+            result = await db.execute(
+                select(func.min(Car.price), func.max(Car.price)).where(Car.is_active == True)
+            )
+            new_low, new_high = result.one()
+            await _set_value(db, "price", "min", new_low)
+            await _set_value(db, "price", "max", new_high)
+
+
+async def _stored_price_range(db: AsyncSession) -> Tuple[Optional[float], Optional[float]]:
+    result = await db.execute(
+        select(InventoryStat.key, InventoryStat.value).where(InventoryStat.dimension == "price")
+    )
+    bounds = dict(result.all())
+    return bounds.get("min"), bounds.get("max")
+
+
+async def _set_value(db: AsyncSession, dimension: str, key: str, value: Optional[float]):
+    stmt = insert(InventoryStat).values(dimension=dimension, key=key, value=value)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[InventoryStat.dimension, InventoryStat.key],
+        set_={"value": stmt.excluded.value}
+    ))
+
+
+async def read_stats(db: AsyncSession) -> StatsResponse:
+    """Build the /api/stats response from the stored counters"""
+    result = await db.execute(select(InventoryStat))
+    rows = result.scalars().all()
+    
+    cars_by_source = {}
+    cars_by_fuel = {}
+    stored = {}
+    for row in rows:
+        if row.dimension == "source" and row.count > 0:
+            cars_by_source[row.key] = row.count
+        elif row.dimension == "fuel" and row.count > 0:
+            cars_by_fuel[row.key] = row.count
+        else:
+            stored[(row.dimension, row.key)] = row
+    
+    total = stored.get(("total", ""))
+    min_price = stored.get(("price", "min"))
+    max_price = stored.get(("price", "max"))
+    last = stored.get(("scraped_at", "max"))
+    
+    return StatsResponse(
+        total_cars=total.count if total else 0,
+        total_sources=len(cars_by_source),
+        last_update=last.timestamp if last else None,
+        cars_by_source=cars_by_source,
+        cars_by_fuel=cars_by_fuel,
+        price_range={
+            "min": (min_price.value if min_price else None) or 0,
+            "max": (max_price.value if max_price else None) or 0
+        }
+    )
+
+
+async def compute_stats(db: AsyncSession) -> List[InventoryStat]:
+    """Compute all stats rows from scratch with full-table aggregates"""
+    rows = []
+    
+    total_result = await db.execute(select(func.count(Car.id)).where(Car.is_active == True))
+    rows.append(InventoryStat(dimension="total", key="", count=total_result.scalar()))
+    
+    for dimension, column in (("source", Car.source), ("fuel", Car.fuel)):
+        result = await db.execute(
+            select(column, func.count(Car.id)).where(Car.is_active == True).group_by(column)
+        )
+        rows += [InventoryStat(dimension=dimension, key=key, count=count) for key, count in result.all()]
+    
+    price_result = await db.execute(
+        select(func.min(Car.price), func.max(Car.price)).where(Car.is_active == True)
+    )
+    min_price, max_price = price_result.one()
+    rows.append(InventoryStat(dimension="price", key="min", count=0, value=min_price))
+    rows.append(InventoryStat(dimension="price", key="max", count=0, value=max_price))
+    
+    last_result = await db.execute(select(func.max(Car.scraped_at)))
+    rows.append(InventoryStat(dimension="scraped_at", key="max", count=0, timestamp=last_result.scalar()))
+    
+    return rows
+
+
+async def rebuild_stats(db: AsyncSession) -> Dict[str, Tuple]:
+    """
+    Recompute the stats from scratch and replace the stored rows
+    
+    Returns:
+        Drift found, as {"dimension/key": (stored, actual)}
+    """
+    def snapshot(rows) -> Dict[Tuple[str, str], Tuple]:
+        # Zero counters are equivalent to missing ones
+        return {
+            (row.dimension, row.key): (row.count or 0, row.value, row.timestamp)
+            for row in rows
+            if row.count or row.dimension not in ("source", "fuel")
+        }
+    
+    result = await db.execute(select(InventoryStat))
+    stored = snapshot(result.scalars().all())
+    fresh = await compute_stats(db)
+    actual = snapshot(fresh)
+    
+    drift = {
+        f"{dimension}/{key}": (stored.get((dimension, key)), actual.get((dimension, key)))
+        for dimension, key in sorted(set(stored) | set(actual))
+        if stored.get((dimension, key)) != actual.get((dimension, key))
+    }
+    
+    await db.execute(delete(InventoryStat))
+    db.add_all(fresh)
+    await db.flush()
+    return drift
+
+
+async def ensure_stats(db: AsyncSession):
+    """Build the stats table the first time (e.g. on an existing database)"""
+    result = await db.execute(select(InventoryStat.dimension).limit(1))
+    if result.scalar() is None:
+        await rebuild_stats(db)
+        await db.commit()
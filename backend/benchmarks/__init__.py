@@ -0,0 +1 @@
+"""BusCar benchmarks and consistency checks (run with ``python -m benchmarks.<name>``)"""
@@ -0,0 +1,109 @@
+"""
+Shared helpers for the BusCar benchmarks
+
+Benchmarks run against a generated SQLite database (``bench.db`` by default,
+override with BENCH_DATABASE_URL) so they never touch ``buscar.db``. Import
+this module before anything from ``app``.
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+
+from sqlalchemy import insert, select, func, text
+
+from app.database import engine, async_session, init_db
+from app.models import Car
+
+engine.echo = False
+
+BRANDS = {
+    "Mercedes-Benz": ["Clase A", "Clase C", "Clase E", "GLC", "GLA"],
+    "BMW": ["Serie 1", "Serie 3", "Serie 5", "X1", "X3"],
+    "Audi": ["A1", "A3", "A4", "A6", "Q3", "Q5"],
+    "Volkswagen": ["Polo", "Golf", "Passat", "T-Roc", "Tiguan"],
+    "Toyota": ["Yaris", "Corolla", "C-HR", "RAV4"],
+    "Peugeot": ["208", "308", "2008", "3008", "5008"],
+    "Seat": ["Ibiza", "Leon", "Arona", "Ateca"],
+    "Ford": ["Fiesta", "Focus", "Puma", "Kuga"],
+    "Renault": ["Clio", "Megane", "Captur", "Kadjar"],
+    "Kia": ["Picanto", "Ceed", "Sportage", "Niro"],
+    "Hyundai": ["i20", "i30", "Tucson", "Kona"],
+    "Citroen": ["C3", "C4", "C5 Aircross", "Berlingo"],
+}
+FUELS = ["gasolina", "diesel", "hibrido", "electrico", "gas"]
+TRANSMISSIONS = ["manual", "automatico"]
+SOURCES = ["wallapop", "coches.net", "autoscout24", "milanuncios", "motor.es"]
+LOCATIONS = ["Madrid", "Barcelona", "Valencia", "Sevilla", "Zaragoza", "Málaga", "Murcia", "Bilbao", "Alicante"]
+BODY_TYPES = [None, "sedan", "suv", "hatchback", "familiar", "monovolumen"]
+SELLER_TYPES = ["particular", "profesional"]
+
+
+def generate_car(i: int, rng: random.Random, now: datetime) -> dict:
+    """One synthetic car row (column values for an INSERT)"""
+    brand = rng.choice(list(BRANDS))
+    model = rng.choice(BRANDS[brand])
+    source = rng.choice(SOURCES)
+    return {
+        "external_id": f"{source}-bench-{i}",
+        "source": source,
+        "url": f"https://www.{source}.com/anuncio/{i}",
+        "brand": brand,
+        "model": model,
+        "version": f"{model} {rng.choice(['1.0', '1.5', '2.0'])} {rng.choice(['TSI', 'TDI', 'Hybrid', ''])}".strip(),
+        "year": rng.randint(2000, 2025),
+        "price": float(rng.randrange(2000, 80000, 50)),
+        "km": rng.randrange(0, 300000, 500),
+        "fuel": rng.choice(FUELS),
+        "transmission": rng.choice(TRANSMISSIONS),
+        "body_type": rng.choice(BODY_TYPES),
+        "location": rng.choice(LOCATIONS),
+        "seller_type": rng.choice(SELLER_TYPES),
+        "description": f"{brand} {model} en buen estado, revisiones al día",
+        "image_url": f"https://images.example.com/{i}.jpg",
+        "negotiable": rng.random() < 0.3,
+        "warranty": rng.random() < 0.2,
+        "certified": False,
+        "is_active": rng.random() < 0.9,
+        "scraped_at": now - timedelta(seconds=rng.randint(0, 90 * 86400)),
+        "updated_at": now,
+    }
+
+
+async def build_dataset(size: int, seed: int = 42, batch: int = 5000):
+    """(Re)create the benchmark database with ``size`` generated cars"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Car.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS cars_fts"))
+    await init_db()
+    
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    async with async_session() as db:
+        for start in range(0, size, batch):
+            rows = [generate_car(i, rng, now) for i in range(start, min(start + batch, size))]
+            await db.execute(insert(Car), rows)
+        await db.commit()
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+
+
+async def dataset_size() -> int:
+    async with async_session() as db:
+        result = await db.execute(select(func.count(Car.id)))
+        return result.scalar()
+
+
+@contextmanager
+def timer():
+    """Context manager yielding a dict whose ``seconds`` is set on exit"""
+    elapsed = {}
+    start = time.perf_counter()
+    try:
+        yield elapsed
+    finally:
+        elapsed["seconds"] = time.perf_counter() - start
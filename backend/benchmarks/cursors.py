@@ -0,0 +1,81 @@
+"""
+Cursor pagination of /api/cars: every sort walked to the end
+
+Calls the API in process (httpx.ASGITransport) over a generated dataset
+and follows ``next_cursor`` for every sort, including relevance with and
+without a search term (without one it falls back to the newest first).
+Each walk must visit every matching car once, in the same order as the
+walk by page number.
+
+Fails (exit 1) if a walk repeats, skips or reorders cars.
+
+Usage (from backend/):
+    python -m benchmarks.cursors [--size 500] [--per-page 7]
+"""
+import argparse
+import asyncio
+import sys
+
+from benchmarks.common import build_dataset
+
+import httpx
+
+from app.main import app
+
+SORTS = [f"{field}-{direction}" for field in ("date", "price", "year", "km") for direction in ("desc", "asc")]
+WALKS = [(sort, {}) for sort in SORTS] + [
+    ("relevance", {}),
+    ("relevance", {"search": "golf"}),
+    ("price-asc", {"brand": "Seat"}),
+]
+
+
+async def walk_cursor(api: httpx.AsyncClient, params: dict, limit: int) -> list:
+    ids, cursor = [], None
+    for _ in range(limit):
+        page = (await api.get("/api/cars", params={**params, **({"cursor": cursor} if cursor else {})})).json()
+        ids += [car["id"] for car in page["cars"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+    return ids + [None]  # Still going: a loop
+
+
+async def walk_pages(api: httpx.AsyncClient, params: dict) -> list:
+    first = (await api.get("/api/cars", params=params)).json()
+    ids = [car["id"] for car in first["cars"]]
+    for page in range(2, first["pages"] + 1):
+        ids += [car["id"] for car in (await api.get("/api/cars", params={**params, "page": page})).json()["cars"]]
+    return ids
+
+
+async def main(size: int, per_page: int) -> int:
+    await build_dataset(size)
+    failures = []
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api.test") as api:
+        print(f"{'sort':<11} {'filters':<18} {'cars':>6} {'pages':>6}")
+        for sort, filters in WALKS:
+            params = {"sort": sort, "per_page": per_page, **filters}
+            by_page = await walk_pages(api, params)
+            by_cursor = await walk_cursor(api, params, limit=len(by_page) // per_page + 2)
+            name = f"{sort} {filters or ''}".strip()
+            if by_cursor != by_page:
+                failures.append(f"{name}: cursor walk {len(by_cursor)} rows, page walk {len(by_page)}")
+            elif len(set(by_cursor)) != len(by_cursor):
+                failures.append(f"{name}: cars repeated")
+            print(f"{sort:<11} {str(filters or ''):<18} {len(by_page):>6} {len(by_page) // per_page + 1:>6}")
+    
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        return 1
+    print("\n✅ Every cursor walk visits each car once, in page order")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--per-page", type=int, default=7)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.size, args.per_page)))
@@ -0,0 +1,248 @@
+"""
+Cross-source duplicate clustering (LSH + union-find) and collapsed listings
+
+Generates ``--size`` distinct cars; a share of them (``--copies``) is also
+listed on one or two other portals with slightly different price and km.
+Near misses are mixed in: same make/model/year/location with a different
+price, and identical twins on the same portal (a dealer's stock), which must
+stay apart. Everything goes through ingest_batch in shuffled batches, then:
+
+- clustering quality: pairwise precision and recall against the truth, and
+  no cluster with two listings of one portal (without photos a twin can't be
+  told from the car it copies, so twins are left out of precision/recall)
+- cost: seconds per batch at the start and at the end of the ingest (flat
+  means near-linear), candidate pairs from the band buckets vs all pairs
+- price changes: copies whose price moves past the tolerance leave their cluster
+- backfill: ensure_clusters on the same cars gives the same clusters
+- /api/cars?collapse=true: the total and the pages count each car once
+
+Fails (exit 1) if a check doesn't hold.
+
+Usage (from backend/):
+    python -m benchmarks.dedup [--size 20000] [--copies 0.3]
+"""
+import argparse
+import asyncio
+import random
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.common import BRANDS, LOCATIONS, build_dataset, timer
+
+from sqlalchemy import delete, func, select, update
+
+from app.config import settings
+from app.database import async_session
+from app.models import Car, CarBand
+from app.routers.cars import count_cars, query_page_sql
+from app.schemas import CarFilters
+from app.scrapers.base import ScrapedCar
+from app.services.dedup import band_keys, ensure_clusters
+from app.services.ingest import ingest_batch
+
+SOURCES = ["wallapop", "coches.net", "milanuncios", "autoscout24"]
+
+
+def listing(truth: int, copy: int, source: str, base: dict, rng: random.Random, jitter: bool) -> ScrapedCar:
+    price = base["price"] * (1 + rng.uniform(-0.01, 0.01)) if jitter else base["price"]
+    km = int(base["km"] * (1 + rng.uniform(-0.01, 0.01))) if jitter else base["km"]
+    return ScrapedCar(
+        external_id=f"{source}-dedup-{truth}-{copy}",
+        source=source,
+        url=f"https://www.{source}.com/anuncio/{truth}-{copy}",
+        brand=base["brand"], model=base["model"], year=base["year"],
+        price=round(price, -1), km=km,
+        fuel="diesel", transmission="manual", location=base["location"],
+    )
+
+
+def generate(size: int, copies: float, rng: random.Random) -> Tuple[List[ScrapedCar], Dict[str, int]]:
+    """Listings and external_id -> id of the real car it shows"""
+    cars, truth = [], {}
+    for i in range(size):
+        brand = rng.choice(list(BRANDS))
+        base = {
+            "brand": brand, "model": rng.choice(BRANDS[brand]), "year": rng.randint(2010, 2024),
+            "price": rng.randrange(3000, 60000, 100), "km": rng.randrange(5000, 250000, 1000),
+            "location": rng.choice(LOCATIONS),
+        }
+        sources = rng.sample(SOURCES, 3)
+        listed = [listing(i, 0, sources[0], base, rng, False)]
+        if rng.random() < copies:
+            listed += [listing(i, n, source, base, rng, True)
+                       for n, source in enumerate(sources[1:1 + rng.randint(1, 2)], start=1)]
+        for car in listed:
+            truth[car.external_id] = i
+        cars += listed
+        
+        if rng.random() < 0.05:
+            # Near miss: another car of the same kind, 15% cheaper, on another portal
+            near = dict(base, price=base["price"] * 0.85)
+            car = listing(size + i, 0, sources[1], near, rng, False)
+            truth[car.external_id] = size + i
+            cars.append(car)
+        if rng.random() < 0.02:
+            # Twin on the same portal: a dealer selling two identical cars
+            car = listing(2 * size + i, 0, sources[0], base, rng, False)
+            car.external_id += "-twin"
+            truth[car.external_id] = 2 * size + i
+            cars.append(car)
+    rng.shuffle(cars)
+    return cars, truth
+
+
+async def clusters(db) -> Dict[str, int]:
+    """external_id -> cluster (the car's own id when it has no copies)"""
+    result = await db.execute(select(Car.external_id, func.coalesce(Car.cluster_id, Car.id)))
+    return dict(result.all())
+
+
+async def candidate_pairs(db) -> int:
+    """Pairs of cars where one is stored under a probe key of the other"""
+    result = await db.execute(select(Car.id, Car.brand, Car.model, Car.year, Car.km, Car.price, Car.image_hash))
+    keys = {row.id: band_keys(row._mapping) for row in result}
+    stored = defaultdict(set)
+    for car_id, (own, _) in keys.items():
+        for key in own:
+            stored[key].add(car_id)
+    return len({
+        (min(car_id, other), max(car_id, other))
+        for car_id, (_, probes) in keys.items() for key in probes
+        for other in stored.get(key, ()) if other != car_id
+    })
+
+
+def same_portal_clusters(predicted: Dict[str, int], cars: List[ScrapedCar]) -> int:
+    """Clusters holding two listings of one portal"""
+    sources = {car.external_id: car.source for car in cars}
+    seen, clashes = set(), set()
+    for external_id, label in predicted.items():
+        if (label, sources[external_id]) in seen:
+            clashes.add(label)
+        seen.add((label, sources[external_id]))
+    return len(clashes)
+
+
+def pair_scores(predicted: Dict[str, int], truth: Dict[str, int]) -> Tuple[float, float, int]:
+    """(precision, recall, true pairs) over pairs of listings, twins left out"""
+    def pairs(labels: Dict[str, int]):
+        groups = defaultdict(list)
+        for external_id, label in labels.items():
+            groups[label].append(external_id)
+        return {(a, b) for group in groups.values() for a in group for b in group if a < b}
+    
+    predicted = {k: label for k, label in predicted.items() if not k.endswith("-twin")}
+    found, real = pairs(predicted), pairs({k: truth[k] for k in predicted})
+    precision = len(found & real) / len(found) if found else 1.0
+    recall = len(found & real) / len(real) if real else 1.0
+    return precision, recall, len(real)
+
+
+async def main(size: int, copies: float) -> int:
+    await build_dataset(0)
+    rng = random.Random(11)
+    cars, truth = generate(size, copies, rng)
+    batch_size = settings.ingest_batch_size
+    batches = [cars[i:i + batch_size] for i in range(0, len(cars), batch_size)]
+    failures = []
+    
+    batch_seconds = []
+    async with async_session() as db:
+        for batch in batches:
+            with timer() as elapsed:
+                await ingest_batch(db, batch)
+                await db.commit()
+            batch_seconds.append(elapsed["seconds"])
+        
+        predicted = await clusters(db)
+        precision, recall, real_pairs = pair_scores(predicted, truth)
+        candidates = await candidate_pairs(db)
+        band_rows = (await db.execute(select(func.count()).select_from(CarBand))).scalar()
+    
+    if precision < 0.99 or recall < 0.99:
+        failures.append(f"clustering precision {precision:.3f} / recall {recall:.3f}")
+    clashes = same_portal_clusters(predicted, cars)
+    if clashes:
+        failures.append(f"{clashes} clusters with two listings of one portal")
+    
+    # Price changes past the tolerance split copies off their cluster
+    moved = [car for car in cars if car.external_id.endswith("-1")][:50]
+    for car in moved:
+        car.price = round(car.price * 1.3, -1)
+    async with async_session() as db:
+        result = await ingest_batch(db, moved)
+        await db.commit()
+        after = await clusters(db)
+    split = [car for car in moved if sum(1 for label in after.values() if label == after[car.external_id]) > 1]
+    if split:
+        failures.append(f"{len(split)} repriced copies still clustered")
+    if result.updated != len(moved):
+        failures.append("repriced copies not updated")
+    for car in moved:
+        truth[car.external_id] = -truth[car.external_id] - 1  # A different car now
+    
+    # Backfill from scratch gives the same clusters
+    async with async_session() as db:
+        await db.execute(delete(CarBand))
+        await db.execute(update(Car).values(cluster_id=None))
+        await db.commit()
+        with timer() as elapsed:
+            backfilled = await ensure_clusters(db)
+        backfill_seconds = elapsed["seconds"]
+        rebuilt = await clusters(db)
+    backfill_precision, backfill_recall, _ = pair_scores(rebuilt, truth)
+    if backfill_precision < 0.99 or backfill_recall < 0.99 or backfilled != len(cars):
+        failures.append(f"backfill: {backfilled} cars, precision {backfill_precision:.3f} / "
+                        f"recall {backfill_recall:.3f}")
+    
+    # Collapsed listing: every real car once
+    distinct = len(set(rebuilt.values()))
+    async with async_session() as db:
+        total, _ = await count_cars(db, CarFilters(), collapse=True)
+        plain, _ = await count_cars(db, CarFilters())
+        seen, after_key, pages = set(), None, 0
+        with timer() as elapsed:
+            while True:
+                rows = await query_page_sql(db, CarFilters(), "price-asc", 0, 50, after_key, collapse=True)
+                if not rows:
+                    break
+                pages += 1
+                for car, value in rows:
+                    seen.add(car["cluster_id"] or car["id"])
+                after_key = (rows[-1][1], rows[-1][0]["id"])
+        walk_seconds = elapsed["seconds"]
+    if total != distinct or len(seen) != distinct:
+        failures.append(f"collapsed total {total} / pages {len(seen)} != {distinct} clusters")
+    
+    quarter = max(len(batch_seconds) // 4, 1)
+    first = sum(batch_seconds[:quarter]) / quarter
+    last = sum(batch_seconds[-quarter:]) / quarter
+    all_pairs = len(cars) * (len(cars) - 1) // 2
+    print(f"{len(cars)} listings of {size} cars ({real_pairs} true duplicate pairs), "
+          f"batches of {batch_size}\n")
+    print(f"Clustering:  precision {precision:.4f}, recall {recall:.4f}")
+    print(f"Ingest:      {sum(batch_seconds):.2f} s, {first * 1000:.1f} ms/batch first quarter, "
+          f"{last * 1000:.1f} ms/batch last quarter")
+    print(f"Candidates:  {candidates:,} pairs in band buckets vs {all_pairs:,} pairwise "
+          f"({band_rows:,} band rows)")
+    print(f"Repriced:    {len(moved)} copies left their cluster")
+    print(f"Backfill:    {backfilled} cars in {backfill_seconds:.2f} s "
+          f"(precision {backfill_precision:.4f}, recall {backfill_recall:.4f})")
+    print(f"/api/cars:   {plain} listings, {total} collapsed; {pages} collapsed pages in {walk_seconds:.2f} s")
+    
+    if last > first * 3:
+        failures.append("per-batch time grows with the inventory")
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        return 1
+    print("\n✅ Duplicates clustered and collapsed")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--copies", type=float, default=0.3, help="Share of cars listed on other portals too")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.size, args.copies)))
@@ -0,0 +1,208 @@
+"""
+Detail enrichment of new and changed listings (scrape_details)
+
+A mock Wallapop API (httpx.MockTransport, no network) serves ``--total``
+search results and their item pages, counting detail requests and how many
+are in flight at once. scrape_source runs full sweeps against the benchmark
+database:
+
+- first run: every listing is new, every detail page is fetched
+- unchanged: no detail page is fetched
+- price changes: ``--changed`` listings change, their detail pages come
+  from the detail cache
+- price changes, cold cache: only the changed listings are fetched
+
+Compared with the naive approach (every detail page, one at a time, on
+every run). Also checks de-duplication, the concurrency bound, that the
+detail fields are stored and that later search results don't revert them. Fails (exit 1) if a check doesn't hold.
+
+Usage (from backend/):
+    python -m benchmarks.enrichment [--total 1000] [--changed 25] [--latency 0.01]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import build_dataset
+
+import httpx
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database import async_session
+from app.models import Car
+from app.scrapers.detail_cache import detail_cache
+from app.scrapers.wallapop import WallapopScraper
+from app.services.scraping import scrape_source
+
+PAGE_SIZE = 40
+
+# The mock API never throttles; keep the per-host rate limiter out of the timings
+settings.scrape_rate_per_host = settings.scrape_rate_max = settings.scrape_rate_burst = 10000
+# Every run walks all the results, so unchanged listings are seen again
+settings.full_sweep_hours = 0
+settings.detail_max_per_run = 0
+
+
+class ItemsApi:
+    """Mock search API plus item pages, counting detail requests"""
+    
+    def __init__(self, total: int, latency: float):
+        self.latency = latency
+        self.listings = [self.item(i) for i in range(total)]
+        self.by_id = {item["id"]: item for item in self.listings}
+        self.detail_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def item(self, i: int) -> dict:
+        created = datetime(2026, 1, 1) + timedelta(minutes=i)
+        return {
+            "id": f"item{i}",
+            "title": f"Seat Ibiza {i}",
+            "price": 5000 + i,
+            "attributes": [{"title": "year", "value": "2018"}, {"title": "km", "value": f"{i * 100} km"}],
+            "location": {"city": "Madrid"},
+            "images": [],
+            "creation_date": int(created.timestamp() * 1000),
+        }
+    
+    def detail(self, item: dict) -> dict:
+        return {
+            **item,
+            "description": f"Único dueño, libro de revisiones ({item['id']})",
+            "extras": ["Climatizador", "Bluetooth"],
+            "attributes": item["attributes"] + [
+                {"title": "horse_power", "value": "110 CV"},
+                {"title": "num_doors", "value": "5"},
+                {"title": "color", "value": "Blanco"},
+                {"title": "version", "value": "1.0 TSI Style"},
+            ],
+            "user": {"micro_name": "Ana"},
+        }
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/api/v3/items/"):
+            self.detail_requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.latency)
+                item = self.by_id.get(request.url.path.rsplit("/", 1)[-1])
+                if item is None:
+                    return httpx.Response(404)
+                return httpx.Response(200, content=json.dumps(self.detail(item)).encode())
+            finally:
+                self.in_flight -= 1
+        
+        step = int(request.url.params.get("step", 0))
+        newest = self.listings[::-1]
+        items = newest[step * PAGE_SIZE:(step + 1) * PAGE_SIZE]
+        return httpx.Response(200, content=json.dumps({"search_objects": items}).encode())
+
+
+async def run(api: ItemsApi, max_cars: int) -> dict:
+    """One full sweep of the wallapop source"""
+    api.detail_requests = 0
+    scraper = WallapopScraper(transport=httpx.MockTransport(api.handler))
+    start = time.perf_counter()
+    await scrape_source("wallapop", max_cars, scraper=scraper)
+    return {"requests": api.detail_requests, "seconds": time.perf_counter() - start}
+
+
+def change_prices(api: ItemsApi, count: int, delta: int):
+    for item in api.listings[:count]:
+        item["price"] += delta
+
+
+def check(name: str, condition: bool, failures: list):
+    if not condition:
+        failures.append(name)
+
+
+async def main(total: int, changed: int, latency: float) -> int:
+    await build_dataset(0)
+    detail_cache.clear()
+    api = ItemsApi(total, latency)
+    max_cars = total * 2
+    failures = []
+    runs = []
+    
+    first = await run(api, max_cars)
+    runs.append(("first run (all new)", first))
+    check("first run fetched every detail page once", first["requests"] == total, failures)
+    check(f"at most {settings.detail_concurrency} detail pages in flight",
+          api.max_in_flight <= settings.detail_concurrency, failures)
+    
+    unchanged = await run(api, max_cars)
+    runs.append(("unchanged", unchanged))
+    check("unchanged run fetched no detail page", unchanged["requests"] == 0, failures)
+    
+    change_prices(api, changed, -100)
+    cached = await run(api, max_cars)
+    runs.append((f"{changed} changed (cached)", cached))
+    check("recently fetched detail pages came from the cache", cached["requests"] == 0, failures)
+    
+    detail_cache.clear()
+    change_prices(api, changed, -100)
+    cold = await run(api, max_cars)
+    runs.append((f"{changed} changed (cold cache)", cold))
+    check("cold cache fetched only the changed listings", cold["requests"] == changed, failures)
+    
+    # Duplicate URLs in one call are fetched once
+    detail_cache.clear()
+    api.detail_requests = 0
+    urls = [f"https://es.wallapop.com/item/item{i % 10}" for i in range(50)]
+    async with WallapopScraper(transport=httpx.MockTransport(api.handler)) as scraper:
+        details = await scraper.scrape_details(urls)
+    check("duplicate urls fetched once", api.detail_requests == 10 and len(details) == 10, failures)
+    
+    async with async_session() as db:
+        enriched = (await db.execute(
+            select(func.count(Car.id)).where(Car.description.isnot(None), Car.power == 110,
+                                             Car.doors == 5, Car.seller_name == "Ana")
+        )).scalar()
+    check("detail fields stored for every listing", enriched == total, failures)
+    
+    # Search results don't revert what the detail pages added
+    async with async_session() as db:
+        reverted = (await db.execute(
+            select(func.count(Car.id)).where(Car.version.is_(None) | (Car.version != "1.0 TSI Style"))
+        )).scalar()
+        changes = (await db.execute(
+            select(Car.changed_fields).where(Car.external_id.in_([f"wallapop-item{i}" for i in range(changed)]))
+        )).scalars().all()
+    check("detail version kept through the price changes", reverted == 0, failures)
+    check("price changes only change the price",
+          all(json.loads(fields) == ["price"] for fields in changes), failures)
+    
+    print(f"{total} listings, {changed} changed per run, {latency * 1000:.0f} ms per detail page, "
+          f"{settings.detail_concurrency} at a time\n")
+    print(f"{'run':<28} {'detail requests':>15} {'naive':>7} {'seconds':>8}")
+    for name, result in runs:
+        print(f"{name:<28} {result['requests']:>15} {total:>7} {result['seconds']:>8.2f}")
+    naive = total * len(runs)
+    done = sum(result["requests"] for _, result in runs)
+    print(f"\nDetail requests over {len(runs)} runs: {done} instead of {naive} "
+          f"(naive, sequential: ~{naive * latency:.1f} s of fetching)")
+    
+    if failures:
+        print("\n❌ Failed checks:")
+        for name in failures:
+            print(f"   {name}")
+        return 1
+    
+    print("\n✅ Detail enrichment checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--total", type=int, default=1000)
+    parser.add_argument("--changed", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.01, help="Simulated seconds per detail page")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.total, args.changed, args.latency)))
@@ -0,0 +1,165 @@
+"""
+HTML result-page parsing: in the event loop vs. the parse worker pool
+
+Generates coches.net-style result pages and parses them with BeautifulSoup
+and html5lib (what the HTML scrapers use), while a ticker task measures how
+late the event loop wakes up - the delay every API request would see:
+
+- inline: parse_page called directly in the event loop
+- pool: parse_in_pool with 1, 2, ... worker processes
+
+Checks that the pool returns the same cars as inline parsing.
+
+Usage (from backend/):
+    python -m benchmarks.html_parsing [--pages 40] [--workers 1 2 4]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+from bs4 import BeautifulSoup
+
+from app.config import settings
+from app.scrapers.base import BaseScraper, ScrapedCar, parse_pool
+
+LISTINGS_PER_PAGE = 40
+BRANDS = ["Seat Ibiza", "Volkswagen Golf", "Renault Clio", "Peugeot 208", "Toyota Corolla"]
+
+
+def generate_page(page: int) -> str:
+    """A result page with the markup noise of a real portal"""
+    rng = random.Random(page)
+    cards = []
+    for i in range(LISTINGS_PER_PAGE):
+        listing_id = page * LISTINGS_PER_PAGE + i
+        cards.append(f"""
+        <article class="mt-CardAd" data-id="{listing_id}">
+          <a class="mt-CardAd-link" href="/coches-segunda-mano/{listing_id}.htm">
+            <h2 class="mt-CardAd-title">{rng.choice(BRANDS)} 1.0 TSI Style</h2>
+          </a>
+          <div class="mt-CardAd-price"><span>{rng.randint(3, 60)}.{rng.randint(0, 999):03d} €</span></div>
+          <ul class="mt-CardAd-attributes">
+            <li>{rng.randint(2005, 2024)}</li>
+            <li>{rng.randint(0, 250)}.{rng.randint(0, 999):03d} km</li>
+            <li>{rng.choice(["Diésel", "Gasolina", "Híbrido"])}</li>
+            <li>{rng.choice(["Manual", "Automático"])}</li>
+          </ul>
+          <div class="mt-CardAd-location">Madrid</div>
+          <img src="https://img.example.com/{listing_id}.jpg" alt="">
+          {"".join(f'<span class="badge badge-{j}">Etiqueta {j}</span>' for j in range(8))}
+        </article>""")
+    scripts = "".join(f"<script>var tracking{j} = {{}};</script>" for j in range(20))
+    return f"<!DOCTYPE html><html><head><title>Coches</title>{scripts}</head><body><main>{''.join(cards)}</main></body></html>"
+
+
+class DemoHtmlScraper(BaseScraper):
+    """Parses the generated pages the way an HTML portal scraper would"""
+    
+    source_name = "demo-html"
+    base_url = "https://www.coches.example"
+    
+    def parse_page(self, body: str, url: str) -> List[ScrapedCar]:
+        soup = BeautifulSoup(body, "html5lib")
+        cars = []
+        for card in soup.select("article.mt-CardAd"):
+            title = card.select_one(".mt-CardAd-title").get_text(strip=True)
+            brand, model = title.split(" ", 1)
+            attrs = [li.get_text(strip=True) for li in card.select(".mt-CardAd-attributes li")]
+            cars.append(ScrapedCar(
+                external_id=f"demo-{card['data-id']}",
+                source=self.source_name,
+                url=self.base_url + card.select_one("a")["href"],
+                brand=brand,
+                model=model,
+                year=self.parse_year(attrs[0]),
+                price=self.parse_price(card.select_one(".mt-CardAd-price").get_text(strip=True)),
+                km=self.parse_km(attrs[1]),
+                fuel=self.normalize_fuel(attrs[2]),
+                transmission=self.normalize_transmission(attrs[3]),
+                location=card.select_one(".mt-CardAd-location").get_text(strip=True),
+                image_url=card.select_one("img")["src"],
+            ))
+        return cars
+    
+    async def iter_cars(self, max_cars: int = 100, since=None, **filters):
+        raise NotImplementedError
+        yield
+    
+    async def scrape_detail(self, url: str) -> Optional[ScrapedCar]:
+        return None
+
+
+async def ticker(lags: list, stop: asyncio.Event, interval: float = 0.005):
+    """Record how late each wake-up of the event loop is"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+
+async def measure(parse, pages: List[str]):
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    results = await parse(pages)
+    seconds = time.perf_counter() - start
+    stop.set()
+    await tick
+    lags.sort()
+    return results, seconds, lags[int(len(lags) * 0.99)] if lags else 0.0, lags[-1] if lags else 0.0
+
+
+async def main(page_count: int, worker_counts: List[int]) -> int:
+    pages = [generate_page(page) for page in range(page_count)]
+    scraper = DemoHtmlScraper()
+    url = scraper.base_url + "/search"
+    
+    async def inline(pages):
+        results = []
+        for body in pages:
+            results.append(scraper.parse_page(body, url))
+            await asyncio.sleep(0)  # Yield between pages, as a scraper loop would
+        return results
+    
+    async def pooled(pages):
+        return await asyncio.gather(*(scraper.parse_in_pool(body, url) for body in pages))
+    
+    print(f"{page_count} pages of {LISTINGS_PER_PAGE} listings, {os.cpu_count()} CPU cores\n")
+    print(f"{'mode':<12} {'seconds':>8} {'pages/s':>8} {'loop lag p99':>13} {'max lag':>9}")
+    
+    expected, seconds, p99, worst = await measure(inline, pages)
+    print(f"{'inline':<12} {seconds:>8.2f} {page_count / seconds:>8.1f} {p99 * 1000:>10.1f} ms {worst * 1000:>6.1f} ms")
+    
+    failures = []
+    for workers in worker_counts:
+        parse_pool.shutdown()
+        settings.parse_workers = workers
+        # Start the workers before timing (spawned processes import the app)
+        await asyncio.gather(*(scraper.parse_in_pool(pages[0], url) for _ in range(workers)))
+        
+        results, seconds, p99, worst = await measure(pooled, pages)
+        print(f"{f'pool x{workers}':<12} {seconds:>8.2f} {page_count / seconds:>8.1f} "
+              f"{p99 * 1000:>10.1f} ms {worst * 1000:>6.1f} ms")
+        if results != expected:
+            failures.append(f"pool x{workers}: cars differ from inline parsing")
+    parse_pool.shutdown()
+    
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        return 1
+    print("\n✅ Same cars from the worker pool as from inline parsing")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.pages, args.workers)))
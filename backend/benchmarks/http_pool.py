@@ -0,0 +1,107 @@
+"""
+Connections opened by scraping runs, with and without the shared HTTP pool
+
+Serves Wallapop-shaped search pages from a local keep-alive HTTP server
+that counts accepted connections (each one a TCP + TLS handshake against a
+real portal), then runs several scheduled-style scrapes:
+
+- private: every run opens and closes its own client (the old setup())
+- pooled: runs borrow the process-wide client from app.services.http_pool
+
+Usage (from backend/):
+    python -m benchmarks.http_pool [--runs 5] [--pages 10]
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+
+from app.services.http_pool import client_options, http_pool
+from app.scrapers.wallapop import WallapopScraper
+
+PAGE_SIZE = 40
+
+
+class CountingServer:
+    """Minimal HTTP/1.1 keep-alive server returning search pages with next-page tokens"""
+    
+    def __init__(self, pages: int):
+        self.pages = pages
+        self.connections = 0
+        self.requests = 0
+        self.server = None
+    
+    def body(self, target: str) -> bytes:
+        page = int(target.split("next_page=")[1].split("&")[0]) if "next_page=" in target else 0
+        items = [
+            {"id": f"{page}-{i}", "title": "Seat Ibiza", "price": 9000, "attributes": [],
+             "location": {"city": "Madrid"}, "images": []}
+            for i in range(PAGE_SIZE)
+        ]
+        meta = {"next_page": str(page + 1) if page + 1 < self.pages else None}
+        return json.dumps({"search_objects": items, "meta": meta}).encode()
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                target = request.split(b" ", 2)[1].decode()
+                body = self.body(target)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+    
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+
+class PrivateClientScraper(WallapopScraper):
+    """WallapopScraper with the old per-run client"""
+    
+    async def setup(self):
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(**client_options())
+    
+    async def cleanup(self):
+        if self.http_client:
+            await self.http_client.aclose()
+        self.http_client = None
+
+
+async def scheduled_runs(scraper_class, base_url: str, runs: int, max_cars: int):
+    for _ in range(runs):
+        scraper = scraper_class()
+        scraper.base_url = base_url
+        async with scraper:
+            async for _ in scraper.iter_cars(max_cars=max_cars):
+                pass
+
+
+async def main(runs: int, pages: int):
+    print(f"{runs} runs of {pages} pages each")
+    for name, scraper_class in (("private", PrivateClientScraper), ("pooled", WallapopScraper)):
+        server = CountingServer(pages)
+        base_url = await server.start()
+        await scheduled_runs(scraper_class, base_url, runs, pages * PAGE_SIZE)
+        await http_pool.close()
+        server.server.close()
+        print(f"{name:<8} {server.requests:>4} requests over {server.connections:>3} connections")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.pages))
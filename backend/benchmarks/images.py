@@ -0,0 +1,246 @@
+"""
+Image proxy: thumbnail page weight, cache hits and eviction
+
+A mock image host (httpx.MockTransport, no network) stands in for the
+portals' CDNs: it serves a generated ``--width`` px JPEG per URL, with
+``--latency`` per request, and counts the requests. The API is called in
+process (httpx.ASGITransport) over a generated listing:
+
+- a list page links every photo to a signed /api/images thumbnail
+- cold page: the page's thumbnails fetched at once (each original fetched
+  and resized once, off the event loop) vs the originals' weight
+- warm page: served from the disk cache (read off the event loop), no
+  request to the image host
+- concurrent misses of one photo share a fetch; the other sizes come from
+  the same fetch; the same photo under another URL is stored once
+- 304 for a matching ETag, 403 for a bad signature, 502 for a broken original
+- without ``image_proxy_key`` the proxy is off and the originals are listed
+- a small cache stays under its size limit and keeps the recently used files
+- the photo's perceptual hash is stored on its car (for the dedup service)
+
+Fails (exit 1) if a check doesn't hold.
+
+Usage (from backend/):
+    python -m benchmarks.images [--per-page 12] [--width 1600] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import io
+import random
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.common import build_dataset, timer
+
+import httpx
+from PIL import Image, ImageDraw
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database import async_session
+from app.main import app
+from app.models import Car
+from app.services.images import ImageCache, image_proxy
+
+CACHE_MB = 50
+
+
+class ImageHost:
+    """Mock image CDN: one generated photo per URL, counting requests"""
+    
+    def __init__(self, width: int, latency: float):
+        self.width = width
+        self.latency = latency
+        self.requests = 0
+        self.served_bytes = 0
+        self._photos = {}
+    
+    def photo(self, number: int) -> bytes:
+        """A 4:3 JPEG that compresses like a photo (shapes, gradients and grain)"""
+        if number not in self._photos:
+            rng = random.Random(number)
+            width, height = self.width, self.width * 3 // 4
+            image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+            draw = ImageDraw.Draw(image)
+            for _ in range(40):
+                x, y = rng.randrange(width), rng.randrange(height)
+                size = rng.randrange(20, width // 3)
+                color = tuple(rng.randrange(256) for _ in range(3))
+                draw.ellipse((x, y, x + size, y + size // 2), fill=color)
+            grain = Image.effect_noise((width, height), 24).convert("RGB")
+            image = Image.blend(image, grain, 0.15)
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=90)
+            self._photos[number] = buffer.getvalue()
+        return self._photos[number]
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        name = request.url.path.rsplit("/", 1)[-1]
+        if not name.endswith(".jpg"):
+            return httpx.Response(200, content=b"<html>not an image</html>")
+        body = self.photo(int(name[:-4]))
+        self.served_bytes += len(body)
+        return httpx.Response(200, content=body, headers={"Content-Type": "image/jpeg"})
+
+
+class LoopLag:
+    """Longest the event loop went without running a 1 ms ticker"""
+    
+    async def __aenter__(self):
+        self.worst = 0.0
+        self._running = True
+        self._task = asyncio.ensure_future(self._tick())
+        return self
+    
+    async def _tick(self):
+        while self._running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            self.worst = max(self.worst, time.perf_counter() - start - 0.001)
+    
+    async def __aexit__(self, *exc):
+        self._running = False
+        await self._task
+
+
+async def fetch_all(api: httpx.AsyncClient, urls: list, headers: dict = None) -> list:
+    return await asyncio.gather(*(api.get(url, headers=headers) for url in urls))
+
+
+def check(name: str, condition: bool, failures: list):
+    if not condition:
+        failures.append(name)
+
+
+async def main(per_page: int, width: int, latency: float) -> int:
+    await build_dataset(200)
+    host = ImageHost(width, latency)
+    image_proxy.transport = httpx.MockTransport(host.handler)
+    cache_dir = tempfile.TemporaryDirectory()
+    image_proxy.cache = ImageCache(cache_dir.name, CACHE_MB * 1024 * 1024)
+    failures = []
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api.test") as api:
+        # Without a key of its own the proxy stays off (it would fetch any URL)
+        settings.image_proxy_key = ""
+        unsigned = (await api.get("/api/cars", params={"per_page": per_page})).json()["cars"]
+        check("no key: original URLs listed",
+              not any("/api/images/" in (car["image_url"] or "") for car in unsigned), failures)
+        check("no key: /api/images refused",
+              (await api.get(f"/api/images/card/x?src={unsigned[0]['image_url']}")).status_code == 404, failures)
+        settings.image_proxy_key = "benchmark-key"
+        
+        listing = (await api.get("/api/cars", params={"per_page": per_page})).json()["cars"]
+        urls = [car["image_url"] for car in listing]
+        check("list page links to /api/images/card",
+              all(url.startswith("http://api.test/api/images/card/") for url in urls), failures)
+        
+        # Cold page: every original fetched and resized once (the mock host's
+        # photos are generated beforehand, off the clock)
+        for url in urls:
+            host.photo(int(parse_qs(urlsplit(url).query)["src"][0].rsplit("/", 1)[-1][:-4]))
+        async with LoopLag() as lag:
+            with timer() as elapsed:
+                cold = await fetch_all(api, urls)
+        cold_seconds = elapsed["seconds"]
+        check("cold page served", all(r.status_code == 200 for r in cold), failures)
+        check("one host request per photo", host.requests == len(urls), failures)
+        thumb_bytes = sum(len(r.content) for r in cold)
+        original_bytes = host.served_bytes
+        
+        # Warm page: all from the disk cache (read in threads)
+        async with LoopLag() as warm_lag:
+            with timer() as elapsed:
+                warm = await fetch_all(api, urls)
+        warm_seconds = elapsed["seconds"]
+        check("warm page from the cache", host.requests == len(urls), failures)
+        check("warm page identical", [r.content for r in warm] == [r.content for r in cold], failures)
+        check("immutable cache headers",
+              all("immutable" in r.headers["cache-control"] for r in warm), failures)
+        
+        revalidated = await api.get(urls[0], headers={"If-None-Match": warm[0].headers["etag"]})
+        check("304 for a matching ETag", revalidated.status_code == 304, failures)
+        
+        # Other sizes come from the same fetch
+        requests = host.requests
+        for size in ("thumb", "large"):
+            other = await fetch_all(api, [url.replace("/images/card/", f"/images/{size}/") for url in urls])
+            check(f"{size} served", all(r.status_code == 200 for r in other), failures)
+        check("other sizes without fetching again", host.requests == requests, failures)
+        
+        # Concurrent misses of one photo share a fetch
+        requests = host.requests
+        new_url = image_proxy.url("https://images.example.com/100000.jpg", None, "http://api.test")
+        burst = await fetch_all(api, [new_url] * 20)
+        check("20 concurrent misses, one fetch",
+              host.requests == requests + 1 and all(r.status_code == 200 for r in burst), failures)
+        
+        # Same photo under another URL: stored once
+        objects = len(list(image_proxy.cache.root.glob("objects/*/*")))
+        mirror = image_proxy.url("https://mirror.example.com/100000.jpg", None, "http://api.test")
+        mirrored = await api.get(mirror)
+        check("same photo stored once", mirrored.content == burst[0].content and
+              len(list(image_proxy.cache.root.glob("objects/*/*"))) == objects, failures)
+        
+        # Refused links and broken originals
+        tampered = urls[0].replace("src=", "src=https%3A%2F%2Fevil.example.com%2F1.jpg&x=")
+        check("403 for a tampered link", (await api.get(tampered)).status_code == 403, failures)
+        check("403 for a bad signature",
+              (await api.get(urls[0].replace("/card/", "/card/x"))).status_code == 403, failures)
+        broken = image_proxy.url("https://images.example.com/broken.html", None, "http://api.test")
+        check("502 for a broken original", (await api.get(broken)).status_code == 502, failures)
+        
+        # A small cache stays under its limit and keeps what was just used
+        small_limit = 1024 * 1024
+        image_proxy.cache = ImageCache(tempfile.mkdtemp(dir=cache_dir.name), small_limit)
+        many = [image_proxy.url(f"https://images.example.com/{200000 + i}.jpg", None, "http://api.test")
+                for i in range(40)]
+        for url in many:
+            await api.get(url)
+            await api.get(many[0])  # Kept warm
+        requests = host.requests
+        await api.get(many[0])
+        on_disk = sum(path.stat().st_size for path in image_proxy.cache.root.glob("*/*/*"))
+        check(f"small cache under {small_limit // 1024} KB (on disk {on_disk // 1024} KB)",
+              on_disk <= small_limit and image_proxy.cache.size <= small_limit, failures)
+        check("recently used photo kept", host.requests == requests, failures)
+        await api.get(many[1])
+        check("evicted photo fetched again", host.requests == requests + 1, failures)
+    
+    car_ids = [int(parse_qs(urlsplit(url).query)["car"][0]) for url in urls]
+    async with async_session() as db:
+        hashed = (await db.execute(
+            select(func.count(Car.id)).where(Car.id.in_(car_ids), Car.image_hash.isnot(None))
+        )).scalar()
+    check("image hash stored on the listed cars", hashed == len(car_ids), failures)
+    await image_proxy.close()
+    cache_dir.cleanup()
+    
+    print(f"Page of {per_page} cards, {width}x{width * 3 // 4} originals, "
+          f"{latency * 1000:.0f} ms per image request\n")
+    print(f"Originals:   {original_bytes / 1024:>8.0f} KB")
+    print(f"Thumbnails:  {thumb_bytes / 1024:>8.0f} KB ({thumb_bytes / original_bytes:.1%} of the originals)")
+    print(f"Cold page:   {cold_seconds * 1000:>8.0f} ms (event loop stalled {lag.worst * 1000:.1f} ms at most)")
+    print(f"Warm page:   {warm_seconds * 1000:>8.1f} ms ({warm_seconds / per_page * 1000:.2f} ms per image, "
+          f"event loop stalled {warm_lag.worst * 1000:.1f} ms at most)")
+    
+    if failures:
+        print("\n❌ Failed checks:")
+        for name in failures:
+            print(f"   {name}")
+        return 1
+    print("\n✅ Image proxy checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--per-page", type=int, default=12)
+    parser.add_argument("--width", type=int, default=1600, help="Width of the originals")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per image request")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.per_page, args.width, args.latency)))
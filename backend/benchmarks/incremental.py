@@ -0,0 +1,199 @@
+"""
+Incremental scraping with per-source high-water marks, and stale listings
+
+A mock Wallapop API (httpx.MockTransport, no network) lists ``--total``
+cars newest first, with an ETag on the first page. scrape_source runs
+against the benchmark database through a series of scheduled-style runs:
+
+- first run: full sweep, every listing is new
+- new listings: an incremental run stops at the known ones
+- nothing new: the first page comes back 304 Not Modified
+- full sweep: picks up a price change on an old listing
+- sold listings: ``--sold`` listings disappear and are deactivated once
+  ``stale_after_runs`` complete sweeps missed them; one relisted comes back
+
+Each run's requests and time are compared with a full walk of the results,
+and the stats are checked for drift at the end.
+
+Usage (from backend/):
+    python -m benchmarks.incremental [--total 2000] [--new 50] [--sold 30] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import build_dataset
+
+import httpx
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database import async_session
+from app.models import Car, ScrapeLog, SourceState
+from app.scrapers.wallapop import WallapopScraper
+from app.services.scraping import scrape_source
+from app.services.stats import rebuild_stats
+
+PAGE_SIZE = 40
+
+# The mock API never throttles; keep the per-host rate limiter out of the timings
+settings.scrape_rate_per_host = settings.scrape_rate_max = settings.scrape_rate_burst = 10000
+# Runs are seconds apart here, so last_seen_at must be exact
+settings.last_seen_granularity_minutes = 0
+# Search pages only (detail enrichment has its own benchmark)
+settings.detail_enrichment_enabled = False
+
+
+class NewestFirstApi:
+    """Mock search API sorted by newest, with an ETag on the first page"""
+    
+    def __init__(self, total: int, latency: float):
+        self.latency = latency
+        self.listings = [self.item(i) for i in range(total)]  # Oldest first
+        self.requests = 0
+    
+    def item(self, i: int) -> dict:
+        created = datetime(2026, 1, 1) + timedelta(minutes=i)
+        return {
+            "id": f"item{i}",
+            "title": f"Seat Ibiza {i}",
+            "price": 5000 + i,
+            "attributes": [{"title": "year", "value": "2018"}, {"title": "km", "value": f"{i * 100} km"}],
+            "location": {"city": "Madrid"},
+            "images": [],
+            "creation_date": int(created.timestamp() * 1000),
+        }
+    
+    def publish(self, count: int):
+        start = len(self.listings)
+        self.listings.extend(self.item(i) for i in range(start, start + count))
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        
+        step = int(request.url.params.get("step", 0))
+        newest = self.listings[::-1]
+        items = newest[step * PAGE_SIZE:(step + 1) * PAGE_SIZE]
+        body = json.dumps({"search_objects": items}).encode()
+        
+        headers = {}
+        if step == 0:
+            headers["ETag"] = f'"{hashlib.md5(body).hexdigest()}"'
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                return httpx.Response(304, headers=headers)
+        return httpx.Response(200, content=body, headers=headers)
+
+
+async def run(api: NewestFirstApi, max_cars: int) -> dict:
+    """One scheduled-style run of the wallapop source"""
+    api.requests = 0
+    scraper = WallapopScraper(transport=httpx.MockTransport(api.handler))
+    start = time.perf_counter()
+    log_id = await scrape_source("wallapop", max_cars, scraper=scraper)
+    seconds = time.perf_counter() - start
+    async with async_session() as db:
+        log = await db.get(ScrapeLog, log_id)
+        return {"requests": api.requests, "seconds": seconds, "found": log.cars_found,
+                "added": log.cars_added, "updated": log.cars_updated,
+                "deactivated": log.cars_deactivated, "status": log.status}
+
+
+async def force_full_sweep():
+    async with async_session() as db:
+        state = await db.get(SourceState, "wallapop")
+        state.last_full_sweep_at -= timedelta(hours=settings.full_sweep_hours)
+        await db.commit()
+
+
+def check(name: str, condition: bool, failures: list):
+    if not condition:
+        failures.append(name)
+
+
+async def main(total: int, new: int, sold: int, latency: float) -> int:
+    await build_dataset(0)
+    api = NewestFirstApi(total, latency)
+    max_cars = total * 2
+    failures = []
+    runs = []
+    
+    first = await run(api, max_cars)
+    runs.append(("first run (full sweep)", first))
+    check("first run added every listing", first["added"] == total, failures)
+    
+    api.publish(new)
+    incremental = await run(api, max_cars)
+    runs.append((f"{new} new listings", incremental))
+    check("incremental run added the new listings", incremental["added"] == new, failures)
+    check("incremental run stopped early", incremental["found"] <= new + settings.incremental_overlap + 1, failures)
+    
+    unchanged = await run(api, max_cars)
+    runs.append(("nothing new (304)", unchanged))
+    check("unchanged run made one request", unchanged["requests"] == 1 and unchanged["found"] == 0, failures)
+    
+    api.listings[0]["price"] = 1234
+    await force_full_sweep()
+    sweep = await run(api, max_cars)
+    runs.append(("full sweep", sweep))
+    check("full sweep updated the old price", sweep["updated"] >= 1, failures)
+    
+    # Sold listings: missing from the next stale_after_runs complete sweeps
+    sold_listings = api.listings[100:100 + sold]
+    del api.listings[100:100 + sold]
+    deactivated = 0
+    for i in range(settings.stale_after_runs):
+        await force_full_sweep()
+        result = await run(api, max_cars)
+        runs.append((f"sold, sweep {i + 1}", result))
+        deactivated += result["deactivated"]
+    check("sold listings deactivated after the last sweep", deactivated == sold == result["deactivated"], failures)
+    
+    api.listings.insert(100, sold_listings[0])
+    await force_full_sweep()
+    relisted = await run(api, max_cars)
+    runs.append(("one relisted", relisted))
+    check("relisted listing reactivated", relisted["updated"] == 1, failures)
+    
+    async with async_session() as db:
+        stored = (await db.execute(select(func.count(Car.id)))).scalar()
+        active = (await db.execute(select(func.count(Car.id)).where(Car.is_active == True))).scalar()
+        old_price = (await db.execute(select(Car.price).where(Car.external_id == "wallapop-item0"))).scalar()
+        drift = await rebuild_stats(db)
+    check("every listing stored once", stored == total + new, failures)
+    check("active listings match the portal", active == len(api.listings), failures)
+    check("old listing has the new price", old_price == 1234, failures)
+    check("every run succeeded", all(result["status"] == "success" for _, result in runs), failures)
+    check(f"stats without drift {drift}", not drift, failures)
+    
+    full_requests = sweep["requests"]
+    print(f"{total + new} listings, {PAGE_SIZE} per page, {latency * 1000:.0f} ms per request\n")
+    print(f"{'run':<24} {'requests':>8} {'cars':>6} {'new':>5} {'updated':>7} {'gone':>5} {'seconds':>8}")
+    for name, result in runs:
+        print(f"{name:<24} {result['requests']:>8} {result['found']:>6} {result['added']:>5} "
+              f"{result['updated']:>7} {result['deactivated']:>5} {result['seconds']:>8.2f}")
+    print(f"\nIncremental run: {incremental['requests']} requests instead of {full_requests} "
+          f"({incremental['seconds']:.2f} s vs {sweep['seconds']:.2f} s)")
+    
+    if failures:
+        print("\n❌ Failed checks:")
+        for name in failures:
+            print(f"   {name}")
+        return 1
+    
+    print("\n✅ Incremental scraping and deactivation checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--total", type=int, default=2000)
+    parser.add_argument("--new", type=int, default=50)
+    parser.add_argument("--sold", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per page request")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.total, args.new, args.sold, args.latency)))
@@ -0,0 +1,145 @@
+"""
+Compare the two ways of writing a scrape to the database
+
+- per-car: SELECT by external_id, then update the ORM object or add a new
+  Car and flush for its id, one listing at a time (what run_scraping used
+  to do)
+- batched: ingest_batch (IN lookup with content fingerprints, INSERT ...
+  ON CONFLICT DO UPDATE with RETURNING, UPDATE of the changed rows only,
+  bulk price history)
+
+Each is timed on a first scrape (all listings new), a re-scrape of the same
+listings with a fifth of the prices changed, and a repeat of that re-scrape
+(nothing changed). Rows written per scrape come from SQLite's
+``total_changes()``.
+
+Usage (from backend/):
+    python -m benchmarks.ingest [--size 10000]
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime
+from typing import Tuple
+
+from benchmarks.common import build_dataset, generate_car, timer
+
+from sqlalchemy import select, delete, func, text
+
+from app.database import async_session
+from app.models import Car, PriceHistory
+from app.scrapers.base import ScrapedCar
+from app.services.ingest import CAR_FIELDS, ingest_batch
+from app.services.stats import StatsDelta, apply_stats_delta, rebuild_stats
+
+
+def scraped_cars(size: int, seed: int, price_change: float = 0.0):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    cars = []
+    for i in range(size):
+        row = generate_car(i, rng, now)
+        car = ScrapedCar(**{name: row.get(name) for name in CAR_FIELDS if name in row})
+        car.external_id = f"bench-ingest-{i}"
+        cars.append(car)
+    changer = random.Random(seed + 1)
+    for car in cars:
+        if changer.random() < price_change:
+            car.price += 500
+    return cars
+
+
+async def per_car(db, cars):
+    """The old run_scraping loop"""
+    stats_delta = StatsDelta()
+    for s_car in cars:
+        result = await db.execute(select(Car).where(Car.external_id == s_car.external_id))
+        existing_car = result.scalar_one_or_none()
+        if existing_car:
+            if existing_car.price != s_car.price:
+                db.add(PriceHistory(car_id=existing_car.id, price=s_car.price))
+                if existing_car.is_active:
+                    stats_delta.change_price(existing_car.price, s_car.price)
+                existing_car.price = s_car.price
+            existing_car.km = s_car.km
+            existing_car.updated_at = datetime.utcnow()
+        else:
+            new_car = Car(**{name: getattr(s_car, name) for name in CAR_FIELDS})
+            db.add(new_car)
+            await db.flush()
+            db.add(PriceHistory(car_id=new_car.id, price=s_car.price))
+            stats_delta.add_car(new_car.source, new_car.fuel, new_car.price, new_car.scraped_at)
+    await apply_stats_delta(db, stats_delta)
+
+
+async def batched(db, cars):
+    await ingest_batch(db, cars)
+
+
+async def run(ingest, cars) -> Tuple[float, int]:
+    """Seconds taken and rows written"""
+    async with async_session() as db:
+        before = (await db.execute(text("SELECT total_changes()"))).scalar()
+        with timer() as elapsed:
+            await ingest(db, cars)
+            writes = (await db.execute(text("SELECT total_changes()"))).scalar() - before
+            await db.commit()
+    return elapsed["seconds"], writes
+
+
+async def reset():
+    async with async_session() as db:
+        await db.execute(delete(PriceHistory))
+        await db.execute(delete(Car).where(Car.external_id.like("bench-ingest-%")))
+        await rebuild_stats(db)
+        await db.commit()
+
+
+async def check():
+    """Both paths must leave the same rows behind"""
+    async with async_session() as db:
+        cars = await db.execute(
+            select(func.count(Car.id), func.sum(Car.price)).where(Car.external_id.like("bench-ingest-%"))
+        )
+        history = await db.execute(select(func.count(PriceHistory.id)))
+        drift = await rebuild_stats(db)
+        await db.rollback()
+    return tuple(cars.one()), history.scalar(), drift
+
+
+async def main(size: int, base: int):
+    print(f"Building dataset ({base} existing cars)...")
+    await build_dataset(base)
+    
+    first = scraped_cars(size, seed=7)
+    again = scraped_cars(size, seed=7, price_change=0.2)
+    
+    results = {}
+    for name, ingest in (("per-car", per_car), ("batched", batched)):
+        await reset()
+        first_run = await run(ingest, first)
+        again_run = await run(ingest, again)
+        repeat_run = await run(ingest, again)
+        results[name] = (first_run, again_run, repeat_run, await check())
+    
+    print(f"{'path':<10} {'first scrape':>22} {'re-scrape':>22} {'unchanged':>22}")
+    for name, runs in results.items():
+        cells = [f"{seconds:>6.2f} s {writes:>7} writes" for seconds, writes in runs[:3]]
+        print(f"{name:<10} " + " ".join(f"{cell:>22}" for cell in cells))
+    
+    old, new = results["per-car"], results["batched"]
+    print(f"Speedup: {old[0][0] / new[0][0]:.1f}x first scrape, {old[1][0] / new[1][0]:.1f}x re-scrape, "
+          f"{old[2][0] / new[2][0]:.1f}x unchanged")
+    
+    if old[3] != new[3] or new[3][2]:
+        print(f"❌ Results differ: per-car {old[3]}, batched {new[3]}")
+        return
+    print("✅ Same cars, price history and stats from both paths")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000, help="Listings per scrape")
+    parser.add_argument("--base", type=int, default=50000, help="Cars already in the database")
+    args = parser.parse_args()
+    asyncio.run(main(args.size, args.base))
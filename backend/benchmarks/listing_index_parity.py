@@ -0,0 +1,179 @@
+"""
+Check the in-memory listing index against the SQL path
+
+Runs random filter/sort/page combinations through ``query_page_sql`` and
+``query_page_index`` and fails on any difference in ids or totals, then
+patches the index after random inserts/updates/deactivations and checks
+again. Last, the same kind of changes are committed the way another process
+would (rows + ``dataset_state`` bump, no ``inventory_changed``): the index
+must stop answering until ``catch_up`` has reloaded it.
+
+Usage (from backend/):
+    python -m benchmarks.listing_index_parity [--size 20000] [--queries 300]
+"""
+import argparse
+import asyncio
+import random
+import sys
+
+from benchmarks.common import build_dataset, generate_car, timer, BRANDS, FUELS, TRANSMISSIONS, SOURCES, LOCATIONS
+
+from datetime import datetime
+from sqlalchemy import insert, update, select
+
+from app.config import settings
+from app.database import async_session
+from app.models import Car, DatasetState
+from app.routers.cars import query_page_sql, query_page_index, count_cars, SORT_COLUMNS
+from app.schemas import CarFilters
+from app.services.dataset import dataset_version, inventory_changed
+from app.services.listing_index import listing_index
+
+SORTS = [f"{field}-{direction}" for field in SORT_COLUMNS for direction in ("asc", "desc")]
+
+
+def random_filters(rng: random.Random) -> CarFilters:
+    filters = {}
+    if rng.random() < 0.3:
+        filters["brand"] = rng.choice(list(BRANDS))
+        if rng.random() < 0.5:
+            filters["model"] = rng.choice(BRANDS[filters["brand"]])
+    if rng.random() < 0.3:
+        filters["fuel"] = sorted(rng.sample(FUELS, rng.randint(1, 3)))
+    if rng.random() < 0.2:
+        filters["transmission"] = [rng.choice(TRANSMISSIONS)]
+    if rng.random() < 0.2:
+        filters["sources"] = sorted(rng.sample(SOURCES, rng.randint(1, 3)))
+    if rng.random() < 0.2:
+        filters["location"] = rng.choice(LOCATIONS)
+    if rng.random() < 0.3:
+        filters["min_price"] = float(rng.randrange(2000, 40000, 1000))
+    if rng.random() < 0.3:
+        filters["max_price"] = float(rng.randrange(10000, 80000, 1000))
+    if rng.random() < 0.3:
+        filters["min_year"] = rng.randint(2000, 2020)
+    if rng.random() < 0.2:
+        filters["max_km"] = rng.randrange(20000, 300000, 10000)
+    return CarFilters(**filters)
+
+
+async def compare(db, filters: CarFilters, sort: str, per_page: int = 24) -> list:
+    """Walk a few pages (by offset and by cursor) on both paths; return mismatches"""
+    errors = []
+    total_sql, _ = await count_cars(db, filters)
+    
+    for page in (1, 3):
+        offset = (page - 1) * per_page
+        sql_rows = await query_page_sql(db, filters, sort, offset, per_page)
+        index_rows, total_index = await query_page_index(db, filters, sort, offset, per_page)
+        if [car["id"] for car, _ in sql_rows] != [car["id"] for car, _ in index_rows] or total_sql != total_index:
+            errors.append(f"page {page} {sort} {filters.signature()}")
+    
+    after = None
+    for _ in range(3):
+        sql_rows = await query_page_sql(db, filters, sort, 0, per_page, after)
+        index_rows, _ = await query_page_index(db, filters, sort, 0, per_page, after)
+        if [car["id"] for car, _ in sql_rows] != [car["id"] for car, _ in index_rows]:
+            errors.append(f"cursor {after} {sort} {filters.signature()}")
+            break
+        if not sql_rows:
+            break
+        last_car, last_value = sql_rows[-1]
+        after = (last_value, last_car["id"])
+    
+    return errors
+
+
+async def check(rng: random.Random, queries: int) -> list:
+    errors = []
+    async with async_session() as db:
+        for _ in range(queries):
+            errors += await compare(db, random_filters(rng), rng.choice(SORTS))
+    return errors
+
+
+async def mutate(rng: random.Random, size: int, changes: int, foreign: bool = False) -> float:
+    """
+    Insert, reprice and deactivate random cars, then patch the index
+    
+    With ``foreign`` the changes are published like another process does:
+    only the ``dataset_state`` row is bumped.
+    """
+    now = datetime.utcnow()
+    async with async_session() as db:
+        ids = list((await db.execute(select(Car.id))).scalars().all())
+        changed = rng.sample(ids, changes)
+        for car_id in changed[: changes // 2]:
+            await db.execute(
+                update(Car).where(Car.id == car_id)
+                .values(price=float(rng.randrange(2000, 80000, 50)), scraped_at=now)
+            )
+        await db.execute(update(Car).where(Car.id.in_(changed[changes // 2:])).values(is_active=False))
+        
+        rows = [generate_car(size + i, rng, now) for i in range(changes)]
+        result = await db.execute(insert(Car).returning(Car.id), rows)
+        changed += list(result.scalars().all())
+        await db.commit()
+        
+        if foreign:
+            await db.execute(
+                update(DatasetState).where(DatasetState.id == 1)
+                .values(version=DatasetState.version + 1, updated_at=now)
+            )
+            await db.commit()
+            return 0.0
+        
+        with timer() as elapsed:
+            await inventory_changed(db, changed)
+        return elapsed["seconds"]
+
+
+async def main(size: int, queries: int):
+    settings.listing_index_enabled = True
+    settings.dataset_version_poll_seconds = 0  # See the foreign bump at once
+    rng = random.Random(7)
+    
+    print(f"Building dataset ({size} cars)...")
+    await build_dataset(size)
+    
+    async with async_session() as db:
+        with timer() as elapsed:
+            await listing_index.load(db)
+    print(f"Index loaded in {elapsed['seconds'] * 1000:.0f} ms")
+    
+    errors = await check(rng, queries)
+    print(f"Initial load: {queries} queries, {len(errors)} mismatches")
+    
+    patch_seconds = await mutate(rng, size, changes=500)
+    print(f"Patched 1000 changed/new cars in {patch_seconds * 1000:.1f} ms")
+    
+    patch_errors = await check(rng, queries)
+    if not listing_index.supports(CarFilters(), "date-desc"):
+        patch_errors.append("index not current after its own bump")
+    print(f"After patch: {queries} queries, {len(patch_errors)} mismatches")
+    
+    await mutate(rng, size + 500, changes=500, foreign=True)
+    await dataset_version.refresh()
+    stale_served = listing_index.supports(CarFilters(), "date-desc")
+    async with async_session() as db:
+        with timer() as elapsed:
+            await listing_index.catch_up(db)
+    print(f"Outside bump: index {'still answered' if stale_served else 'fell back to SQL'}, "
+          f"reloaded in {elapsed['seconds'] * 1000:.0f} ms")
+    
+    reload_errors = await check(rng, queries)
+    if stale_served or not listing_index.supports(CarFilters(), "date-desc"):
+        reload_errors.append("index not current after an outside bump")
+    print(f"After reload: {queries} queries, {len(reload_errors)} mismatches")
+    
+    for error in (errors + patch_errors + reload_errors)[:20]:
+        print("  MISMATCH", error)
+    return 1 if errors or patch_errors or reload_errors else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.size, args.queries)))
@@ -0,0 +1,200 @@
+"""
+Normalization of scraped fields: previous helpers vs app.scrapers.normalize
+
+Generates ``--size`` raw listings the way portals write them (brand
+spellings like "VW" or "MERCEDES BENZ", accents, versions in the title,
+"12.500 €", "Diésel"...) and normalizes them:
+
+- previous: the per-field helpers BaseScraper had (``re`` imported and the
+  year pattern compiled per call, substring chains) and the title split on
+  the first space
+- per value: the normalize functions one value at a time, cold caches
+- batch: the batch functions a page at a time, cold caches
+
+Reports records per second and how many distinct brands and brand/model
+pairs each approach stores (facet and index size). Fails (exit 1) if a
+generated listing doesn't get its canonical brand, model or fuel.
+
+Usage (from backend/):
+    python -m benchmarks.normalization [--size 50000]
+"""
+import argparse
+import random
+import sys
+from typing import Dict, List
+
+from benchmarks.common import BRANDS, timer
+
+from app.scrapers import normalize
+
+PAGE_SIZE = 40
+
+# Ways titles spell the canonical makes
+SPELLINGS = {
+    "Mercedes-Benz": ["Mercedes-Benz", "Mercedes", "MERCEDES BENZ", "mercedes-benz"],
+    "Volkswagen": ["Volkswagen", "VW", "volkswagen", "VOLKSWAGEN"],
+    "Citroen": ["Citroen", "Citroën", "CITROEN"],
+}
+FUEL_SPELLINGS = {
+    "diesel": ["Diésel", "diesel", "Gasóleo", "DIESEL"],
+    "gasolina": ["Gasolina", "gasolina", "GASOLINA"],
+    "hibrido": ["Híbrido", "Hibrido", "Híbrido enchufable", "Hybrid"],
+    "electrico": ["Eléctrico", "Electrico", "eléctrico"],
+    "gas": ["GLP", "Gas natural (GNC)"],
+}
+VERSIONS = ["1.0 TSI", "2.0 TDI 150CV", "Hybrid Style", "1.5 dCi Business", "GT Line", ""]
+
+
+def generate(size: int, rng: random.Random) -> List[Dict[str, str]]:
+    """Raw listings with the canonical values they should normalize to"""
+    records = []
+    for _ in range(size):
+        brand = rng.choice(list(BRANDS))
+        model = rng.choice(BRANDS[brand])
+        fuel = rng.choice(list(FUEL_SPELLINGS))
+        spelled_model = model.upper() if rng.random() < 0.2 else model
+        title = f"{rng.choice(SPELLINGS.get(brand, [brand]))} {spelled_model} {rng.choice(VERSIONS)}".strip()
+        records.append({
+            "title": title,
+            "price": f"{rng.randrange(2000, 60000, 50):,} €".replace(",", "."),
+            "km": f"{rng.randint(0, 250)}.{rng.randint(0, 999):03d} km",
+            "year": str(rng.randint(2000, 2024)),
+            "fuel": rng.choice(FUEL_SPELLINGS[fuel]),
+            "gearbox": rng.choice(["Manual", "Automático", "automatica"]),
+            "expected": (brand, model, fuel),
+        })
+    return records
+
+
+# The helpers as they were, for the baseline
+
+def previous_parse_price(price_text: str) -> float:
+    cleaned = price_text.replace("€", "").replace(".", "").replace(",", ".").strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        return 0.0
+
+
+def previous_parse_km(km_text: str) -> int:
+    cleaned = km_text.lower().replace("km", "").replace(".", "").replace(",", "").strip()
+    try:
+        return int(cleaned)
+    except ValueError:
+        return 0
+
+
+def previous_parse_year(year_text: str) -> int:
+    import re
+    match = re.search(r"(19|20)\d{2}", year_text)
+    if match:
+        return int(match.group())
+    return 0
+
+
+def previous_normalize_fuel(fuel_text: str) -> str:
+    fuel_lower = fuel_text.lower()
+    if "electr" in fuel_lower:
+        return "electrico"
+    elif "hibrid" in fuel_lower:
+        return "hibrido"
+    elif "diesel" in fuel_lower or "diésel" in fuel_lower:
+        return "diesel"
+    elif "gasolina" in fuel_lower or "benzin" in fuel_lower:
+        return "gasolina"
+    elif "gas" in fuel_lower:
+        return "gas"
+    return "otro"
+
+
+def previous_normalize_transmission(trans_text: str) -> str:
+    trans_lower = trans_text.lower()
+    if "auto" in trans_lower or "automát" in trans_lower:
+        return "automatico"
+    return "manual"
+
+
+def previous_title(title: str):
+    parts = title.split(" ", 1)
+    return parts[0] if parts else "Desconocido", parts[1] if len(parts) > 1 else "Desconocido", None
+
+
+def run_previous(records: List[dict]) -> list:
+    return [(
+        previous_title(r["title"]), previous_parse_price(r["price"]), previous_parse_km(r["km"]),
+        previous_parse_year(r["year"]), previous_normalize_fuel(r["fuel"]),
+        previous_normalize_transmission(r["gearbox"]),
+    ) for r in records]
+
+
+def clear_caches():
+    for function in (normalize.parse_title, normalize.parse_price, normalize.parse_km, normalize.parse_year,
+                     normalize.normalize_fuel, normalize.normalize_transmission):
+        function.cache_clear()
+
+
+def run_per_value(records: List[dict]) -> list:
+    return [(
+        normalize.parse_title(r["title"]), normalize.parse_price(r["price"]), normalize.parse_km(r["km"]),
+        normalize.parse_year(r["year"]), normalize.normalize_fuel(r["fuel"]),
+        normalize.normalize_transmission(r["gearbox"]),
+    ) for r in records]
+
+
+def run_batch(records: List[dict]) -> list:
+    results = []
+    for start in range(0, len(records), PAGE_SIZE):
+        page = records[start:start + PAGE_SIZE]
+        results += zip(
+            normalize.parse_titles(r["title"] for r in page),
+            normalize.parse_prices(r["price"] for r in page),
+            normalize.parse_kms(r["km"] for r in page),
+            normalize.parse_years(r["year"] for r in page),
+            normalize.normalize_fuels(r["fuel"] for r in page),
+            normalize.normalize_transmissions(r["gearbox"] for r in page),
+        )
+    return results
+
+
+def main(size: int) -> int:
+    records = generate(size, random.Random(7))
+    rows = []
+    outputs = {}
+    for name, function in (("previous", run_previous), ("per value", run_per_value), ("batch", run_batch)):
+        clear_caches()
+        with timer() as elapsed:
+            outputs[name] = function(records)
+        brands = {title[0] for title, *_ in outputs[name]}
+        models = {title[:2] for title, *_ in outputs[name]}
+        rows.append((name, elapsed["seconds"], len(brands), len(models)))
+    
+    failures = []
+    if outputs["batch"] != outputs["per value"]:
+        failures.append("batch and per-value results differ")
+    wrong = [
+        (r["title"], r["fuel"], title[:2], fuel)
+        for r, (title, _, _, _, fuel, _) in zip(records, outputs["batch"])
+        if (title[0], title[1], fuel) != r["expected"]
+    ]
+    if wrong:
+        failures.append(f"{len(wrong)} listings without their canonical values, e.g. {wrong[:3]}")
+    
+    expected_models = {r["expected"][:2] for r in records}
+    print(f"{size} listings, {len({r['title'] for r in records})} distinct titles, "
+          f"{len(expected_models)} real brand/model pairs\n")
+    print(f"{'approach':<12} {'seconds':>8} {'records/s':>12} {'brands':>7} {'brand/model':>12}")
+    for name, seconds, brands, models in rows:
+        print(f"{name:<12} {seconds:>8.3f} {size / seconds:>12,.0f} {brands:>7} {models:>12}")
+    
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        return 1
+    print("\n✅ Every listing normalized to its canonical brand, model and fuel")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=50000)
+    args = parser.parse_args()
+    sys.exit(main(args.size))
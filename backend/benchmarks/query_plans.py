@@ -0,0 +1,193 @@
+"""
+Query plans and timings of the /api/cars listing queries
+
+Runs the real page query (``build_page_query``) for each filter/sort
+combination over a generated dataset, prints its EXPLAIN QUERY PLAN and
+timing, and exits with status 1 when a common path sorts with a temporary
+B-tree (filesort) or scans the cars table without an index.
+
+The common paths are checked with ``collapse=true`` (one row per car listed
+on several portals) too, and at every ``--size`` given: SQLite chooses
+plans from the table statistics, so a plan that holds at one size may not
+hold at another.
+
+Also compares a deep OFFSET page with the equivalent cursor page and times
+the uncached COUNT for a few filter sets.
+
+Usage (from backend/):
+    python -m benchmarks.query_plans [--size 20000 100000] [--iterations 50]
+"""
+import argparse
+import asyncio
+import re
+import sys
+
+from benchmarks.common import build_dataset, dataset_size, timer
+
+from sqlalchemy import event, select, func, and_
+
+from app.database import engine, async_session
+from app.models import Car
+from app.routers.cars import build_page_query, filter_conditions
+from app.schemas import CarFilters
+
+SORTS = [f"{field}-{direction}" for field in ("date", "price", "year", "km") for direction in ("desc", "asc")]
+
+# (name, filters, common): plans of common paths must not filesort or full scan
+FILTER_SETS = [
+    ("all", CarFilters(), True),
+    ("brand", CarFilters(brand="Volkswagen"), True),
+    ("brand+model", CarFilters(brand="Volkswagen", model="Golf"), True),
+    ("fuel", CarFilters(fuel=["diesel", "hibrido"]), True),
+    ("max price", CarFilters(max_price=15000), True),
+    ("price range", CarFilters(min_price=10000, max_price=20000), True),
+    # Worst case of checking the price while walking the sort index (0.1% match);
+    # SQLite walks it for a one-sided filter like this with or without price + 0
+    ("narrow price", CarFilters(min_price=79900), False),
+    ("brand+year+km", CarFilters(brand="Seat", min_year=2018, max_km=100000), False),
+    ("source+location", CarFilters(sources=["wallapop"], location="Madrid"), False),
+]
+
+# brand+model is only common with the default sort
+COMMON_SORTS = {"brand+model": {"date-desc", "date-asc"}}
+
+DEEP_PAGE = 500
+PER_PAGE = 12
+
+_BAD_PLAN = (
+    re.compile(r"USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY"),
+    re.compile(r"^SCAN cars$"),
+)
+
+
+class StatementCapture:
+    """Records the SQL and parameters of the last statement sent to the database"""
+    
+    def __init__(self):
+        self.statement = None
+        self.parameters = None
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statement = statement
+        self.parameters = parameters
+
+
+capture = StatementCapture()
+
+
+async def explain(db, query) -> list:
+    """Run ``query`` once and return the plan details SQLite uses for it"""
+    await db.execute(query)
+    conn = await db.connection()
+    result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {capture.statement}", capture.parameters)
+    return [row[-1] for row in result.all()]
+
+
+def plan_problems(plan: list) -> list:
+    return [detail for detail in plan if any(pattern.search(detail) for pattern in _BAD_PLAN)]
+
+
+async def time_query(db, query, iterations: int) -> float:
+    with timer() as elapsed:
+        for _ in range(iterations):
+            result = await db.execute(query)
+            result.all()
+    return elapsed["seconds"] / iterations * 1000
+
+
+async def check_size(size: int, iterations: int, rebuild: bool) -> list:
+    """Plans and timings over ``size`` cars; returns the common paths that failed"""
+    if rebuild or await _needs_dataset(size):
+        print(f"Building dataset ({size} cars)...")
+        await build_dataset(size)
+    
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    failures = []
+    
+    async with async_session() as db:
+        print(f"{'filters':<18} {'sort':<11} {'ms':>7}  plan")
+        for name, filters, common in FILTER_SETS:
+            for sort in SORTS:
+                query = build_page_query(filters, sort, 0, PER_PAGE + 1)
+                plan = await explain(db, query)
+                ms = await time_query(db, query, iterations)
+                
+                is_common = common and sort in COMMON_SORTS.get(name, sort)
+                problems = plan_problems(plan) if is_common else []
+                if problems:
+                    failures.append((name, sort, problems))
+                flag = "FAIL" if problems else ("    " if is_common else "  · ")
+                print(f"{name:<18} {sort:<11} {ms:>7.2f}  {flag} {' | '.join(plan)}")
+        
+        print("\nCollapsed (collapse=true)")
+        for name, filters, common in FILTER_SETS:
+            if not common:
+                continue
+            for sort in COMMON_SORTS.get(name, SORTS):
+                query = build_page_query(filters, sort, 0, PER_PAGE + 1, collapse=True)
+                plan = await explain(db, query)
+                ms = await time_query(db, query, iterations)
+                problems = plan_problems(plan)
+                if problems:
+                    failures.append((f"{name} (collapsed)", sort, problems))
+                flag = "FAIL" if problems else "    "
+                print(f"{name:<18} {sort:<11} {ms:>7.2f}  {flag} {' | '.join(plan)}")
+        
+        print(f"\nDeep page ({DEEP_PAGE}), offset vs cursor")
+        for sort in ("date-desc", "price-asc"):
+            offset_query = build_page_query(CarFilters(), sort, DEEP_PAGE * PER_PAGE, PER_PAGE + 1)
+            rows = (await db.execute(offset_query)).all()
+            if not rows:
+                continue
+            # The cursor of the page before the deep one points at its last row
+            previous = (await db.execute(
+                build_page_query(CarFilters(), sort, DEEP_PAGE * PER_PAGE - 1, 1)
+            )).one()
+            cursor_query = build_page_query(CarFilters(), sort, 0, PER_PAGE + 1,
+                                            after=(previous.sort_value, previous.id))
+            offset_ms = await time_query(db, offset_query, iterations)
+            cursor_ms = await time_query(db, cursor_query, iterations)
+            print(f"{sort:<11} offset {offset_ms:>7.2f} ms   cursor {cursor_ms:>7.2f} ms")
+        
+        print("\nCOUNT (uncached)")
+        for name, filters, _ in FILTER_SETS:
+            query = select(func.count(Car.id)).where(and_(*filter_conditions(filters)))
+            plan = await explain(db, query)
+            ms = await time_query(db, query, iterations)
+            print(f"{name:<18} {ms:>7.2f} ms  {' | '.join(plan)}")
+    
+    event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    return failures
+
+
+async def main(sizes: list, iterations: int, rebuild: bool) -> int:
+    failures = []
+    for size in sizes:
+        print(f"\n=== {size} cars\n")
+        failures += [(size, *failure) for failure in await check_size(size, iterations, rebuild)]
+    
+    if failures:
+        print("\n❌ Filesort or full scan in a common path:")
+        for size, name, sort, problems in failures:
+            print(f"   {size} cars, {name} / {sort}: {', '.join(problems)}")
+        return 1
+    
+    print(f"\n✅ Common paths use an index for both filtering and ordering ({', '.join(map(str, sizes))} cars)")
+    return 0
+
+
+async def _needs_dataset(size: int) -> bool:
+    try:
+        return await dataset_size() != size
+    except Exception:
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    # SQLite picks plans from the ANALYZE statistics, so a plan can change with the size
+    parser.add_argument("--size", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the dataset")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.size, args.iterations, args.rebuild)))
@@ -0,0 +1,91 @@
+"""
+Scraping a throttling portal with the per-host rate limiter
+
+A mock Wallapop API (httpx.MockTransport, no network) accepts ``--capacity``
+requests per second and answers 429 with Retry-After above that, plus a
+share of random 503s. The scraper pages through it with retries and the
+adaptive rate; the script reports how many pages got through, how many
+requests were throttled or failed, and the rate the limiter settled on.
+
+Usage (from backend/):
+    python -m benchmarks.rate_limit [--capacity 20] [--pages 60] [--error-rate 0.05]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import httpx
+
+from app.config import settings
+from app.scrapers.rate_limit import rate_limiters
+from app.scrapers.wallapop import WallapopScraper
+
+PAGE_SIZE = 40
+
+
+class ThrottlingApi:
+    """Search API allowing ``capacity`` requests per rolling second"""
+    
+    def __init__(self, capacity: int, pages: int, error_rate: float):
+        self.capacity = capacity
+        self.pages = pages
+        self.error_rate = error_rate
+        self.rng = random.Random(1)
+        self.recent = []
+        self.ok = self.throttled = self.errors = 0
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        now = time.monotonic()
+        self.recent = [t for t in self.recent if now - t < 1.0]
+        if len(self.recent) >= self.capacity:
+            self.throttled += 1
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        self.recent.append(now)
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(503)
+        
+        self.ok += 1
+        step = int(request.url.params.get("step", 0))
+        items = [
+            {"id": f"{step}-{i}", "title": "Seat Ibiza", "price": 9000, "attributes": [],
+             "location": {"city": "Madrid"}, "images": []}
+            for i in range(PAGE_SIZE if step < self.pages else 0)
+        ]
+        return httpx.Response(200, json={"search_objects": items})
+
+
+async def main(capacity: int, pages: int, error_rate: float) -> int:
+    settings.scrape_page_concurrency = 8
+    settings.scrape_backoff_base = 0.1
+    api = ThrottlingApi(capacity, pages, error_rate)
+    scraper = WallapopScraper(transport=httpx.MockTransport(api.handler))
+    
+    start = time.perf_counter()
+    cars = [car async for car in scraper.iter_cars(max_cars=pages * PAGE_SIZE)]
+    seconds = time.perf_counter() - start
+    limiter = rate_limiters.for_url(scraper.base_url)
+    
+    print(f"Portal capacity {capacity} req/s, {error_rate:.0%} random 503s")
+    print(f"{len(cars)} / {pages * PAGE_SIZE} cars in {seconds:.2f} s")
+    print(f"Requests: {api.ok} ok, {api.throttled} throttled (429), {api.errors} failed (503)")
+    print(f"Limiter rate at the end: {limiter.rate:.1f} req/s "
+          f"(started at {settings.scrape_rate_per_host}, max {settings.scrape_rate_max})")
+    
+    if len(cars) != pages * PAGE_SIZE:
+        print("❌ Some pages were lost")
+        return 1
+    print("✅ Every page made it through")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.capacity, args.pages, args.error_rate)))
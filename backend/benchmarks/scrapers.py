@@ -0,0 +1,228 @@
+"""
+Scraper throughput from recorded fixtures (no network)
+
+Replays a cassette (app.scrapers.replay) of Wallapop search pages - a
+generated one by default, or one recorded with ``--record`` - and reports
+listings per second for each stage separately:
+
+- fetch: every page through BaseScraper.fetch (rate limiter, httpx, JSON)
+- parse: WallapopScraper._parse_items page by page (and _parse_item one by
+  one), and the helpers parse_price, parse_km, parse_year and
+  normalize_fuel on the raw attribute strings
+- ingest: ingest_batch into the benchmark database, first scrape and an
+  unchanged re-scrape
+- end to end: scrape_source with the replayed scraper
+
+Fails (exit 1) if a request misses the cassette or listings get lost.
+
+Usage (from backend/):
+    python -m benchmarks.scrapers [--pages 50] [--repeat 5]
+    python -m benchmarks.scrapers --cassette fixtures/wallapop.json
+    python -m benchmarks.scrapers --record wallapop --cassette fixtures/wallapop.json  # needs network
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import List
+
+from benchmarks.common import BRANDS, build_dataset, timer
+
+import httpx
+
+from app.config import settings
+from app.database import async_session
+from app.scrapers.replay import Cassette, record_source
+from app.scrapers.wallapop import WallapopScraper
+from app.services.ingest import ingest_batch
+from app.services.scraping import scrape_source
+
+PAGE_SIZE = 40
+SEARCH_PATH = "/api/v3/general/search"
+
+# Replayed responses are instant; keep the per-host rate limiter out of the timings
+settings.scrape_rate_per_host = settings.scrape_rate_max = settings.scrape_rate_burst = 10000
+# Search pages only (detail enrichment has its own benchmark)
+settings.detail_enrichment_enabled = False
+
+
+def generated_item(i: int, rng: random.Random) -> dict:
+    """A search result shaped like Wallapop's, with the attribute strings of a real listing"""
+    brand = rng.choice(list(BRANDS))
+    created = datetime(2026, 1, 1) + timedelta(minutes=i)
+    return {
+        "id": f"gen{i}",
+        "title": f"{brand} {rng.choice(BRANDS[brand])} {rng.choice(['1.0 TSI', '2.0 TDI', 'Hybrid'])}",
+        "price": rng.randrange(2000, 60000, 50),
+        "attributes": [
+            {"title": "year", "value": str(rng.randint(2005, 2024))},
+            {"title": "km", "value": f"{rng.randint(0, 250)}.{rng.randint(0, 999):03d} km"},
+            {"title": "fuel", "value": rng.choice(["Diésel", "Gasolina", "Híbrido", "Eléctrico", "GLP"])},
+            {"title": "gearbox", "value": rng.choice(["Manual", "Automático"])},
+        ],
+        "location": {"city": rng.choice(["Madrid", "Barcelona", "Valencia", "Sevilla"])},
+        "images": [{"medium": f"https://cdn.example.com/{i}/m.jpg", "original": f"https://cdn.example.com/{i}.jpg"}],
+        "flags": {"negotiable": rng.random() < 0.3},
+        "creation_date": int(created.timestamp() * 1000),
+    }
+
+
+def generate_cassette(pages: int) -> Cassette:
+    """Search pages by step, newest first, ending with an empty page"""
+    rng = random.Random(42)
+    scraper = WallapopScraper()
+    params = scraper._search_params({})
+    total = pages * PAGE_SIZE
+    cassette = Cassette()
+    for step in range(pages + 1):
+        items = [generated_item(total - 1 - i, rng)
+                 for i in range(step * PAGE_SIZE, min((step + 1) * PAGE_SIZE, total))]
+        url = httpx.URL(scraper.base_url + SEARCH_PATH, params={**params, "step": step})
+        cassette.add("GET", str(url), body=json.dumps({"search_objects": items}),
+                     headers={"content-type": "application/json"})
+    return cassette
+
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:>12,.0f} /s" if seconds else f"{'-':>12}   "
+
+
+async def fetch_pages(cassette: Cassette):
+    """All search pages, one after the other, as WallapopScraper requests them"""
+    transport = cassette.replay()
+    scraper = WallapopScraper(transport=transport)
+    first_params = params = scraper._search_params({})
+    items = []
+    step = 0
+    by_token = False
+    async with scraper:
+        while True:
+            page, next_params = await scraper._fetch_page(params)
+            if not page:
+                break
+            items.extend(page)
+            # Next-page tokens when the API sends them, plain steps otherwise
+            by_token = by_token or next_params is not None
+            if by_token:
+                if next_params is None:
+                    break
+                params = next_params
+            else:
+                step += 1
+                params = {**first_params, "step": step}
+    return items, transport
+
+
+def parse_stage(items: List[dict], repeat: int):
+    """Timings of _parse_items, _parse_item and the parse helpers over the fetched items"""
+    scraper = WallapopScraper()
+    attrs = [{a["title"]: a["value"] for a in item.get("attributes", [])} for item in items]
+    prices = [f"{item.get('price', 0):,} €".replace(",", ".") for item in items]
+    helpers = [
+        ("parse_price", scraper.parse_price, prices),
+        ("parse_km", scraper.parse_km, [a.get("km", "0") for a in attrs]),
+        ("parse_year", scraper.parse_year, [a.get("year", "2020") for a in attrs]),
+        ("normalize_fuel", scraper.normalize_fuel, [a.get("fuel", "gasolina") for a in attrs]),
+    ]
+    
+    results = []
+    pages = [items[i:i + PAGE_SIZE] for i in range(0, len(items), PAGE_SIZE)]
+    with timer() as elapsed:
+        for _ in range(repeat):
+            cars = [car for page in pages for car in scraper._parse_items(page)]
+    results.append(("_parse_items (pages)", len(items) * repeat, elapsed["seconds"]))
+    
+    with timer() as elapsed:
+        for _ in range(repeat):
+            for item in items:
+                scraper._parse_item(item)
+    results.append(("_parse_item", len(items) * repeat, elapsed["seconds"]))
+    
+    for name, helper, inputs in helpers:
+        with timer() as elapsed:
+            for _ in range(repeat):
+                for value in inputs:
+                    helper(value)
+        results.append((name, len(inputs) * repeat, elapsed["seconds"]))
+    return cars, results
+
+
+async def ingest_stage(cars) -> list:
+    """ingest_batch in ingest_batch_size batches, committed one by one"""
+    batches = [cars[i:i + settings.ingest_batch_size] for i in range(0, len(cars), settings.ingest_batch_size)]
+    results = []
+    async with async_session() as db:
+        for name in ("first scrape", "unchanged"):
+            added = 0
+            with timer() as elapsed:
+                for batch in batches:
+                    added += (await ingest_batch(db, batch)).added
+                    await db.commit()
+            results.append((name, len(cars), elapsed["seconds"], added))
+    return results
+
+
+async def main(pages: int, repeat: int, cassette_path: str, record: str) -> int:
+    if record:
+        count = await record_source(record, cassette_path, max_cars=pages * PAGE_SIZE)
+        print(f"Recorded {count} {record} listings to {cassette_path}")
+        return 0
+    
+    cassette = Cassette.load(cassette_path) if cassette_path else generate_cassette(pages)
+    print(f"Cassette: {len(cassette.interactions)} responses "
+          f"({cassette_path or f'generated, {pages} pages of {PAGE_SIZE}'})\n")
+    failures = []
+    
+    with timer() as elapsed:
+        items, transport = await fetch_pages(cassette)
+    fetch_seconds = elapsed["seconds"]
+    if transport.misses:
+        failures.append(f"requests missing from the cassette: {transport.misses[:3]}")
+    
+    cars, parse_results = parse_stage(items, repeat)
+    if len(cars) != len(items):
+        failures.append(f"{len(items) - len(cars)} listings failed to parse")
+    
+    await build_dataset(0)
+    ingest_results = await ingest_stage(cars)
+    if ingest_results[0][3] != len({car.external_id for car in cars}):
+        failures.append("first ingest didn't add every listing")
+    
+    await build_dataset(0)
+    e2e_transport = cassette.replay()
+    with timer() as elapsed:
+        log_id = await scrape_source("wallapop", len(items) or 1,
+                                     scraper=WallapopScraper(transport=e2e_transport))
+    e2e_seconds = elapsed["seconds"]
+    if e2e_transport.misses:
+        failures.append(f"end to end: requests missing from the cassette: {e2e_transport.misses[:3]}")
+    
+    print(f"{'stage':<28} {'listings':>9} {'seconds':>8} {'throughput':>15}")
+    print(f"{'fetch (' + str(transport.requests) + ' requests)':<28} {len(items):>9} "
+          f"{fetch_seconds:>8.3f} {rate(len(items), fetch_seconds)}")
+    for name, count, seconds in parse_results:
+        print(f"{'parse: ' + name:<28} {count:>9} {seconds:>8.3f} {rate(count, seconds)}")
+    for name, count, seconds, _ in ingest_results:
+        print(f"{'ingest: ' + name:<28} {count:>9} {seconds:>8.3f} {rate(count, seconds)}")
+    print(f"{'end to end (scrape_source)':<28} {len(items):>9} {e2e_seconds:>8.3f} {rate(len(items), e2e_seconds)}")
+    print(f"(ScrapeLog {log_id})")
+    
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        return 1
+    print("\n✅ Every listing fetched, parsed and ingested from the cassette")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=50, help="Pages in the generated cassette")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the items in the parse timings")
+    parser.add_argument("--cassette", help="Replay this cassette (or record to it with --record)")
+    parser.add_argument("--record", metavar="SOURCE", help="Record a live run of SOURCE to --cassette")
+    args = parser.parse_args()
+    if args.record and not args.cassette:
+        parser.error("--record needs --cassette")
+    sys.exit(asyncio.run(main(args.pages, args.repeat, args.cassette, args.record)))
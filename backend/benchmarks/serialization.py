@@ -0,0 +1,97 @@
+"""
+Compare the two ways of building a /api/cars page
+
+- orm: load full Car objects, CarResponse.model_validate each one, then
+  serialise CarListResponse (what get_cars used to do)
+- fast: select only the CarResponse columns as plain rows and encode the
+  page straight to JSON bytes (what get_cars does now)
+
+Counts are left out on purpose: they are served from the count cache.
+
+Usage (from backend/):
+    python -m benchmarks.serialization [--size 50000] [--iterations 200]
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import build_dataset, dataset_size, timer
+
+from sqlalchemy import select
+
+from app.database import async_session
+from app.models import Car
+from app.routers.cars import query_page_sql
+from app.schemas import CarFilters, CarResponse, CarListResponse
+from app.services.serialization import dumps, orjson
+
+CASES = [
+    ("date-desc", 12, CarFilters()),
+    ("date-desc", 50, CarFilters()),
+    ("price-asc", 50, CarFilters(fuel=["diesel", "gasolina"], min_year=2015)),
+]
+
+
+async def orm_page(db, filters: CarFilters, sort: str, per_page: int) -> bytes:
+    column = {"date": Car.scraped_at, "price": Car.price}[sort.split("-")[0]]
+    order = column.desc() if sort.endswith("desc") else column.asc()
+    query = select(Car).where(Car.is_active == True)
+    if filters.fuel:
+        query = query.where(Car.fuel.in_(filters.fuel))
+    if filters.min_year:
+        query = query.where(Car.year >= filters.min_year)
+    result = await db.execute(query.order_by(order, Car.id).limit(per_page))
+    cars = result.scalars().all()
+    response = CarListResponse(
+        cars=[CarResponse.model_validate(car) for car in cars],
+        total=0, page=1, per_page=per_page, pages=0
+    )
+    return response.model_dump_json().encode()
+
+
+async def fast_page(db, filters: CarFilters, sort: str, per_page: int) -> bytes:
+    rows = await query_page_sql(db, filters, sort, 0, per_page)
+    return dumps({
+        "cars": [row[0] for row in rows], "total": 0, "page": 1, "per_page": per_page,
+        "pages": 0, "next_cursor": None, "total_is_estimate": False
+    })
+
+
+async def measure(func, filters, sort, per_page, iterations) -> float:
+    async with async_session() as db:
+        await func(db, filters, sort, per_page)  # Warm up
+        with timer() as elapsed:
+            for _ in range(iterations):
+                await func(db, filters, sort, per_page)
+            # Drop identity-map state between runs like a fresh request would
+            db.expunge_all()
+    return elapsed["seconds"] / iterations * 1000
+
+
+async def main(size: int, iterations: int, rebuild: bool):
+    if rebuild or await _needs_dataset(size):
+        print(f"Building dataset ({size} cars)...")
+        await build_dataset(size)
+    
+    print(f"JSON encoder: {'orjson' if orjson else 'json (install orjson for the fast path)'}")
+    print(f"{'case':<48} {'orm ms':>8} {'fast ms':>8} {'speedup':>8}")
+    for sort, per_page, filters in CASES:
+        orm_ms = await measure(orm_page, filters, sort, per_page, iterations)
+        fast_ms = await measure(fast_page, filters, sort, per_page, iterations)
+        name = f"{sort} per_page={per_page} {filters.signature()}"
+        print(f"{name:<48} {orm_ms:>8.2f} {fast_ms:>8.2f} {orm_ms / fast_ms:>7.1f}x")
+
+
+async def _needs_dataset(size: int) -> bool:
+    try:
+        return await dataset_size() != size
+    except Exception:
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the dataset")
+    args = parser.parse_args()
+    asyncio.run(main(args.size, args.iterations, args.rebuild))
@@ -0,0 +1,147 @@
+"""
+Offline checks of WallapopScraper pagination
+
+Serves Wallapop-shaped search pages from an httpx.MockTransport (no
+network) in the three pagination styles the scraper follows - X-NextPage
+header, meta.next_page token and plain step - and checks that:
+
+- every listing is returned once and in order, up to max_cars
+- no more pages are requested than needed
+- at most scrape_page_concurrency pages are in flight
+- the time budget stops a slow scrape
+
+Timings compare one page at a time with concurrent pages.
+
+Usage (from backend/):
+    python -m benchmarks.wallapop_pagination [--latency 0.05]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from urllib.parse import urlencode
+
+import httpx
+
+from app.config import settings
+from app.scrapers.wallapop import WallapopScraper
+
+PAGE_SIZE = 40
+
+# The mock API never throttles; keep the per-host rate limiter out of the timings
+settings.scrape_rate_per_host = settings.scrape_rate_max = settings.scrape_rate_burst = 10000
+
+
+class FakeWallapop:
+    """Mock search API with ``total`` listings, answering after ``latency`` seconds"""
+    
+    def __init__(self, style: str, total: int, latency: float):
+        self.style = style
+        self.total = total
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def item(self, i: int) -> dict:
+        return {
+            "id": f"item{i}",
+            "title": f"Seat Ibiza {i}",
+            "price": 5000 + i,
+            "attributes": [{"title": "year", "value": "2018"}, {"title": "km", "value": f"{i * 100} km"}],
+            "location": {"city": "Madrid"},
+            "images": [],
+            "flags": {"negotiable": False},
+        }
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        
+        query = dict(request.url.params)
+        if "next_page" in query:
+            page = int(query["next_page"].removeprefix("token-"))
+        else:
+            page = int(query.get("step", 0))
+        
+        start = page * PAGE_SIZE
+        items = [self.item(i) for i in range(start, min(start + PAGE_SIZE, self.total))]
+        has_next = start + PAGE_SIZE < self.total
+        
+        body, headers = {"search_objects": items}, {}
+        if self.style == "header" and has_next:
+            headers["X-NextPage"] = urlencode({**query, "step": page + 1})
+        elif self.style == "token":
+            body["meta"] = {"next_page": f"token-{page + 1}" if has_next else None}
+        return httpx.Response(200, json=body, headers=headers)
+
+
+async def scrape(style: str, total: int, max_cars: int, latency: float):
+    api = FakeWallapop(style, total, latency)
+    scraper = WallapopScraper(transport=httpx.MockTransport(api.handler))
+    start = time.perf_counter()
+    cars = [car async for car in scraper.iter_cars(max_cars=max_cars)]
+    return cars, api, time.perf_counter() - start
+
+
+def check(name: str, condition: bool, failures: list):
+    if not condition:
+        failures.append(name)
+
+
+async def main(latency: float) -> int:
+    failures = []
+    concurrency = settings.scrape_page_concurrency
+    
+    print(f"{'style':<7} {'total':>6} {'max_cars':>8} {'cars':>6} {'requests':>8} {'in flight':>9} {'seconds':>8}")
+    for style in ("header", "token", "step"):
+        for total, max_cars in ((1000, 300), (100, 300), (0, 50), (400, 400)):
+            cars, api, seconds = await scrape(style, total, max_cars, latency)
+            expected = min(total, max_cars)
+            ids = [car.external_id for car in cars]
+            
+            name = f"{style} total={total} max_cars={max_cars}"
+            check(f"{name}: car count", len(cars) == expected, failures)
+            check(f"{name}: order", ids == [f"wallapop-item{i}" for i in range(expected)], failures)
+            # Needed pages, plus at most the extra step pages in flight when the end is hit
+            needed = max(1, -(-expected // PAGE_SIZE))
+            check(f"{name}: requests", api.requests <= needed + (concurrency if style == "step" else 1), failures)
+            check(f"{name}: concurrency", api.max_in_flight <= max(concurrency, 1), failures)
+            print(f"{style:<7} {total:>6} {max_cars:>8} {len(cars):>6} {api.requests:>8} "
+                  f"{api.max_in_flight:>9} {seconds:>8.2f}")
+    
+    # Step pages are fetched concurrently; token pages are pipelined one ahead
+    settings.scrape_page_concurrency = 1
+    _, _, sequential = await scrape("step", 2000, 1000, latency)
+    settings.scrape_page_concurrency = concurrency
+    _, _, concurrent = await scrape("step", 2000, 1000, latency)
+    print(f"\n1000 cars by step: {sequential:.2f} s one page at a time, "
+          f"{concurrent:.2f} s with {concurrency} pages in flight")
+    
+    budget = settings.scrape_time_budget_seconds
+    settings.scrape_time_budget_seconds = latency * 3.5
+    cars, _, seconds = await scrape("token", 10000, 10000, latency)
+    settings.scrape_time_budget_seconds = budget
+    check("time budget", len(cars) < 10000 and seconds < latency * 6, failures)
+    print(f"Time budget of {latency * 3.5:.2f} s: stopped after {len(cars)} cars in {seconds:.2f} s")
+    
+    if failures:
+        print("\n❌ Failed checks:")
+        for name in failures:
+            print(f"   {name}")
+        return 1
+    
+    print("\n✅ Pagination checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per page request")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.latency)))
@@ -0,0 +1,27 @@
+"""
+BusCar Stats Rebuild - Recompute /api/stats from scratch and report drift
+"""
+import asyncio
+from app.database import async_session, init_db
+from app.services.stats import rebuild_stats
+
+
+async def main():
+    print("📊 Rebuilding inventory stats...")
+    await init_db()
+    
+    async with async_session() as db:
+        drift = await rebuild_stats(db)
+        await db.commit()
+    
+    if not drift:
+        print("✅ Stored stats matched the cars table (no drift)")
+        return
+    
+    print(f"⚠️  Fixed {len(drift)} drifted values:")
+    for name, (stored, actual) in drift.items():
+        print(f"  - {name}: stored={stored} actual={actual}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
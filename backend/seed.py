@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import async_session, init_db
 from app.models import Car, PriceHistory
+from app.services.dataset import dataset_version
+from app.services.stats import rebuild_stats
 
 
 async def seed_data():
@@ -20,7 +22,7 @@ async def seed_data():
         if result.scalar() > 0:
             print("✨ Database already has data. Skipping seed.")
             return
-
+        
         brands = {
             "Mercedes-Benz": ["Clase C", "Clase E", "GLC", "A 200"],
             "BMW": ["Serie 3", "Serie 5", "X3", "Serie 1"],
@@ -80,7 +82,7 @@ async def seed_data():
             )
             db.add(car)
             cars_to_add.append(car)
-            
+        
         await db.flush()
         
         # Add price history for some cars
@@ -97,6 +99,11 @@ async def seed_data():
                     recorded_at=car.scraped_at - timedelta(days=5)
                 ))
         
+        # Materialise /api/stats for the new inventory
+        await rebuild_stats(db)
+        # Running servers drop their caches and validators
+        await dataset_version.bump(db)
+        
         await db.commit()
         print(f"✅ Successfully seeded {len(cars_to_add)} cars")
 